@@ -0,0 +1,130 @@
+import json
+import logging
+import queue
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class AlertDispatcher:
+    """飞书警报异步发送器
+
+    submit() 只把警报放入有界队列，不做任何网络请求；后台线程把同一时间窗口
+    （默认1秒）内的警报合并成一条消息，用复用连接的会话发送，带超时和重试。
+    队列满时丢弃新警报并计数。
+    """
+
+    def __init__(self, webhook_url, maxsize=1000, batch_window=1.0, max_batch=50,
+                 timeout=10, max_retries=3):
+        self.webhook_url = webhook_url
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.submitted = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self.batches = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def backlog(self):
+        return self.queue.qsize()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, message):
+        """提交警报（非阻塞），队列已满时返回False"""
+        try:
+            self.queue.put_nowait(message)
+            self.submitted += 1
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"警报队列已满，丢弃警报（累计丢弃 {self.dropped}）")
+            return False
+
+    def _collect_batch(self):
+        """取出一个时间窗口内的所有警报"""
+        try:
+            first = self.queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.time() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _post(self, text):
+        """发送一条消息，失败时按指数退避重试"""
+        payload = {
+            "msg_type": "text",
+            "content": {"text": text}
+        }
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        for attempt in range(self.max_retries):
+            try:
+                response = self.session.post(self.webhook_url, headers=headers, data=data, timeout=self.timeout)
+                if response.status_code == 200:
+                    return True
+                logger.warning(f"发送警报返回状态码 {response.status_code} (尝试 {attempt + 1}/{self.max_retries})")
+                if response.status_code == 429:
+                    retry_after = response.headers.get('Retry-After')
+                    if retry_after and retry_after.isdigit():
+                        self._stop_event.wait(int(retry_after))
+                        continue
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"发送警报失败 (尝试 {attempt + 1}/{self.max_retries}): {e}")
+            if attempt < self.max_retries - 1:
+                self._stop_event.wait(2 ** attempt)
+        return False
+
+    def _run(self):
+        while not (self._stop_event.is_set() and self.queue.empty()):
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            self.batches += 1
+            if self._post("\n\n".join(batch)):
+                self.sent += len(batch)
+            else:
+                self.failed += len(batch)
+                logger.error(f"发送警报失败，丢弃 {len(batch)} 条警报")
+
+    def stats(self):
+        return {
+            'submitted': self.submitted,
+            'sent': self.sent,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'batches': self.batches,
+            'backlog': self.backlog
+        }
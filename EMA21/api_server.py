@@ -1,13 +1,17 @@
-from flask import Flask, jsonify, send_from_directory
+from flask import Flask, Response, send_from_directory
 from flask_cors import CORS
 import threading
 import json
 import os
+from collections import deque
 from datetime import datetime
 
 app = Flask(__name__)
 CORS(app)
 
+STREAM_HISTORY = 120  # 保留的增量消息数量，落后更多的客户端直接重发全量
+KEEPALIVE_INTERVAL = 15  # 无更新时发送心跳的间隔（秒）
+
 # 全局状态存储
 monitoring_status = {
     'status': {
@@ -19,34 +23,107 @@ monitoring_status = {
     'pairs': []
 }
 
+# 推送状态：每次更新时预先序列化好，所有客户端共享
+_pairs = {}  # 币种 -> 最新一行数据
+_version = 0
+_status_json = json.dumps(monitoring_status, ensure_ascii=False)
+_snapshot_event = ''
+_history = deque(maxlen=STREAM_HISTORY)  # (版本号, 预序列化的增量消息)
+_condition = threading.Condition()
+
+def _format_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
 @app.route('/')
 def index():
     """提供监控页面"""
-    return send_from_directory('.', 'monitor.html')
+    return send_from_directory(os.path.dirname(os.path.abspath(__file__)), 'monitor.html')
 
 @app.route('/api/status')
 def get_status():
-    return jsonify(monitoring_status)
-
-def update_status(kline_data, position_records):
-    """更新监控状态"""
-    global monitoring_status
-    pairs = []
-    
-    for symbol in kline_data:
-        if symbol in position_records:
-            df = kline_data[symbol]
-            pairs.append({
-                'symbol': symbol,
-                'price': float(df['close'].iloc[-1]),
-                'ema21': float(df['EMA21'].iloc[-1]),
-                'deviation': round(((float(df['close'].iloc[-1]) / float(df['EMA21'].iloc[-1]) - 1) * 100), 2),
-                'position': position_records[symbol]
-            })
-    
-    monitoring_status['pairs'] = pairs
-    monitoring_status['status']['active_symbols'] = len(pairs)
+    return Response(_status_json, mimetype='application/json')
+
+@app.route('/api/stream')
+def stream():
+    """Server-Sent Events推送：先发全量快照，之后只发增量"""
+    def generate():
+        with _condition:
+            version = _version
+            snapshot = _snapshot_event
+        yield f"retry: 3000\n{snapshot}" if snapshot else "retry: 3000\n\n"
+        while True:
+            with _condition:
+                if _version == version:
+                    _condition.wait(KEEPALIVE_INTERVAL)
+                if _version == version:
+                    events = None
+                elif _history and _history[0][0] <= version + 1:
+                    events = [payload for v, payload in _history if v > version]
+                else:
+                    events = [_snapshot_event]  # 落后太多，重发全量
+                version = _version
+            if events is None:
+                yield ": ping\n\n"
+            else:
+                yield ''.join(events)
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(generate(), mimetype='text/event-stream', headers=headers)
+
+def update_status(pairs, status=None):
+    """更新监控状态
+
+    pairs: 当前所有币种的数据行（含symbol字段）
+    status: 需要覆盖的系统状态字段
+    只有发生变化的币种会进入增量消息；序列化在这里完成一次，供所有客户端复用。
+    """
+    global _version, _status_json, _snapshot_event
+    updated = []
+    seen = set()
+    for pair in pairs:
+        symbol = pair['symbol']
+        seen.add(symbol)
+        if _pairs.get(symbol) != pair:
+            _pairs[symbol] = pair
+            updated.append(pair)
+    removed = [symbol for symbol in _pairs if symbol not in seen]
+    for symbol in removed:
+        del _pairs[symbol]
+
+    status_changed = False
+    if status:
+        for key, value in status.items():
+            if monitoring_status['status'].get(key) != value:
+                monitoring_status['status'][key] = value
+                status_changed = True
+    if monitoring_status['status']['active_symbols'] != len(_pairs):
+        monitoring_status['status']['active_symbols'] = len(_pairs)
+        status_changed = True
+
+    if not updated and not removed and not status_changed:
+        return
+
     monitoring_status['status']['last_update'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    monitoring_status['pairs'] = list(_pairs.values())
+    status_json = json.dumps(monitoring_status, ensure_ascii=False)
+
+    with _condition:
+        _version += 1
+        _status_json = status_json
+        _snapshot_event = f"event: snapshot\ndata: {status_json}\n\n"
+        _history.append((_version, _format_event('delta', {
+            'version': _version,
+            'status': monitoring_status['status'],
+            'updated': updated,
+            'removed': removed
+        })))
+        _condition.notify_all()
+
+def run_api_server(host='0.0.0.0', port=5000):
+    app.run(host=host, port=port, threaded=True)
 
-def run_api_server():
-    app.run(host='0.0.0.0', port=5000) 
\ No newline at end of file
+def start_api_server(host='0.0.0.0', port=5000):
+    """在后台线程中启动API服务"""
+    thread = threading.Thread(target=run_api_server, args=(host, port), name="api-server", daemon=True)
+    thread.start()
+    return thread
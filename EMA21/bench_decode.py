@@ -0,0 +1,56 @@
+"""WebSocket消息解码基准测试
+
+用法:
+    python bench_decode.py [frames.txt] [轮数]
+
+frames.txt 为录制的原始WebSocket消息，每行一条；不提供时使用内置的示例消息。
+分别测试每个可用解析器完整解析和预过滤+结构体解码的每秒消息数。
+"""
+import sys
+import time
+
+import fast_decode
+from fast_decode import DECODERS, MessageDecoder, use_decoder
+
+SAMPLE_FRAMES = [
+    '{"result":null,"id":1}',
+    '{"e":"kline","E":1712044800123,"s":"BTCUSDT","k":{"t":1712041200000,"T":1712044799999,"s":"BTCUSDT","i":"1h","f":4785412001,"L":4785498874,"o":"65823.40","c":"66012.10","h":"66120.00","l":"65790.20","v":"8123.412","n":86874,"x":false,"q":"535812345.12345","V":"4120.118","Q":"271823456.12345","B":"0"}}',
+    '{"e":"aggTrade","E":1712044800125,"a":2017123456,"s":"BTCUSDT","p":"66012.10","q":"0.012","f":4785498870,"l":4785498874,"T":1712044800120,"m":true}',
+    '{"e":"aggTrade","E":1712044800131,"a":2017123457,"s":"ETHUSDT","p":"3312.45","q":"1.250","f":3125498870,"l":3125498871,"T":1712044800128,"m":false}',
+    '{"e":"bookTicker","u":4012345678901,"s":"BTCUSDT","b":"66012.00","B":"3.120","a":"66012.10","A":"0.512","T":1712044800120,"E":1712044800125}',
+]
+
+
+def load_frames(path):
+    with open(path, encoding='utf-8') as f:
+        return [line.rstrip('\n') for line in f if line.strip()]
+
+
+def measure(func, frames, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for frame in frames:
+            func(frame)
+    elapsed = time.perf_counter() - start
+    return len(frames) * rounds / elapsed
+
+
+def main():
+    frames = load_frames(sys.argv[1]) if len(sys.argv) > 1 else SAMPLE_FRAMES
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else max(1, 200000 // len(frames))
+    print(f"消息数: {len(frames)} x {rounds} 轮")
+    print(f"{'解析器':<10}{'完整解析(条/秒)':>18}{'预过滤+结构体(条/秒)':>24}")
+
+    for name, loads in DECODERS.items():
+        use_decoder(name)
+        full_rate = measure(loads, frames, rounds)
+        kline_only = MessageDecoder(['kline'])
+        filtered_rate = measure(kline_only.decode, frames, rounds)
+        print(f"{name:<10}{full_rate:>18,.0f}{filtered_rate:>24,.0f}")
+
+    use_decoder(next(iter(DECODERS)))
+    print(f"默认解析器: {fast_decode.DECODER_NAME}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,22 @@
+import os
 import time
 import pandas as pd
 import numpy as np
 import requests
-import websocket
 import json
 import logging
 from datetime import datetime
 import threading
-from queue import Queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import urllib3
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-from websocket import WebSocketConnectionClosedException
-import ssl
-import socket
+from ema_engine import IncrementalEMA, TimeframeAggregator
+from kline_store import KlineStore, LatestPriceSlots
+from ws_shards import ShardedSubscriber
+from alert_dispatcher import AlertDispatcher
+from evaluator import CrossoverEvaluator, ABOVE
+from fast_decode import MessageDecoder, KlineEvent, TradeEvent, BookTickerEvent
 
 # 配置日志
 logging.basicConfig(
@@ -26,29 +29,73 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# API配置
-REST_URL = "https://fapi.binance.com"
-WS_URL = "wss://fstream.binance.com/ws"
-WS_KLINE_URL = "wss://fstream.binance.com/ws"  # WebSocket K线订阅
+# API配置：可用环境变量指向本地回放服务（replay_server.py）做压测和复现
+REST_URL = os.environ.get('BINANCE_REST_URL', "https://fapi.binance.com")
+WS_BASE_URL = os.environ.get('BINANCE_WS_URL', "wss://fstream.binance.com")
+WS_URL = WS_BASE_URL + "/ws"
+WS_KLINE_URL = WS_BASE_URL + "/ws"  # WebSocket K线订阅
 KLINE_URL = REST_URL + "/fapi/v1/klines"
 EXCHANGE_INFO_URL = REST_URL + "/fapi/v1/exchangeInfo"
 
+# 价格来源配置
+# kline: 只订阅K线，用K线推送的收盘价评估（默认，推送量最小）
+# aggTrade: 额外订阅逐笔成交，成交价写入最新价槽位，按固定节奏采样评估
+# bookTicker: 额外订阅最优挂单，用买一卖一中间价，按固定节奏采样评估
+PRICE_SOURCE_KLINE = 'kline'
+PRICE_SOURCE_AGGTRADE = 'aggTrade'
+PRICE_SOURCE_BOOKTICKER = 'bookTicker'
+PRICE_SOURCE = PRICE_SOURCE_KLINE
+PRICE_SAMPLE_INTERVAL = 1.0  # 最新价槽位采样间隔（秒）
+
+# 评估模式配置
+# inline: 在消息处理（或价格采样）时逐个币种评估穿越
+# vectorized: 消息处理只写入数组，定时对所有币种做一次向量化评估
+EVALUATION_INLINE = 'inline'
+EVALUATION_VECTORIZED = 'vectorized'
+EVALUATION_MODE = EVALUATION_INLINE
+EVALUATION_INTERVAL = 0.25  # 向量化评估间隔（秒）
+
+# 周期配置：由1小时K线推送增量合成的高周期，警报使用ALERT_TIMEFRAME的EMA21
+TIMEFRAMES = ('3h',)  # 可加入 '4h'、'1d'
+ALERT_TIMEFRAME = '3h'  # '1h' 或 TIMEFRAMES 中的周期
+
+# 监控页面API配置（需要安装flask和flask-cors）
+ENABLE_API_SERVER = True
+API_HOST = '0.0.0.0'
+API_PORT = 5000
+STATUS_PUBLISH_INTERVAL = 1.0  # 向监控页面推送状态的最小间隔（秒）
+
 # 飞书机器人配置
-FEISHU_WEBHOOK = 'https://www.feishu.cn/flow/api/trigger-webhook/2fb4a9b848c591d77bcf57bfcee1b37a'
+FEISHU_WEBHOOK = os.environ.get('FEISHU_WEBHOOK', 'https://www.feishu.cn/flow/api/trigger-webhook/2fb4a9b848c591d77bcf57bfcee1b37a')
 
 # 全局变量
-price_queue = Queue()
+alert_dispatcher = AlertDispatcher(FEISHU_WEBHOOK)  # 警报发送队列（后台线程合并发送）
 position_records = {}  # 记录每个币种的位置
 last_alert_times = {}  # 记录每个币种的最后警报时间
 alert_cooldown = 3600  # 警报冷却时（秒）
-kline_data = {}  # 存储每个币种的K线数据
+kline_data = KlineStore(capacity=300)  # 存储每个币种的K线数据（环形缓冲区）
+ema_engines = {}  # 每个币种的增量EMA计算器
+timeframe_aggregators = {}  # 每个币种各高周期的增量K线合成器
+crossover_evaluator = None  # 向量化模式下的穿越评估器，启动时按币种列表创建
+alert_stats = {'date': None, 'count': 0}  # 当日警报数
+latest_prices = LatestPriceSlots()  # aggTrade/bookTicker模式下每个币种的最新价格
+# 消息解码器：只完整解析已订阅的事件类型，订阅确认等控制消息直接丢弃
+message_decoder = MessageDecoder(['kline'] if PRICE_SOURCE == PRICE_SOURCE_KLINE else ['kline', PRICE_SOURCE])
+
+# 请求权重配置（币安合约REST每分钟2400权重，limit=300的K线请求权重为2）
+REQUEST_WEIGHT_LIMIT = 2400
+KLINE_REQUEST_WEIGHT = 2
+BOOTSTRAP_WORKERS = 10  # 预加载并发数
+STATS_INTERVAL = 60  # 分片状态日志间隔（秒）
 
 # 配置请求会话
+# 429不在自动重试的状态码中：交给RequestWeightTracker按Retry-After暂停，
+# 否则urllib3会在内部重试，跟踪器看不到429
 session = requests.Session()
 retry_strategy = Retry(
     total=5,
     backoff_factor=1,
-    status_forcelist=[429, 500, 502, 503, 504],
+    status_forcelist=[500, 502, 503, 504],
 )
 adapter = HTTPAdapter(max_retries=retry_strategy, pool_maxsize=100)
 session.mount("http://", adapter)
@@ -57,10 +104,63 @@ session.mount("https://", adapter)
 # 禁用SSL警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-def get_initial_data(symbol, max_retries=5):
+class RequestWeightTracker:
+    """币安请求权重跟踪器
+
+    按分钟窗口累计已用权重，超出预算时阻塞到下一分钟；
+    用响应头X-MBX-USED-WEIGHT-1M校准，遇到429/418时按Retry-After暂停。
+    """
+
+    def __init__(self, limit=REQUEST_WEIGHT_LIMIT, safety=0.8):
+        self.budget = int(limit * safety)
+        self.used = 0
+        self.window = int(time.time() // 60)
+        self.blocked_until = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, weight=1):
+        """申请权重，预算不足时等待"""
+        while True:
+            with self.lock:
+                now = time.time()
+                window = int(now // 60)
+                if window != self.window:
+                    self.window = window
+                    self.used = 0
+                if now >= self.blocked_until and self.used + weight <= self.budget:
+                    self.used += weight
+                    return
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                else:
+                    wait = (window + 1) * 60 - now
+            time.sleep(min(max(wait, 0.05), 5))
+
+    def observe(self, response):
+        """根据响应头更新已用权重"""
+        used = response.headers.get('X-MBX-USED-WEIGHT-1M')
+        with self.lock:
+            if used is not None:
+                try:
+                    self.used = max(self.used, int(used))
+                except ValueError:
+                    pass
+            if response.status_code in (418, 429):
+                retry_after = response.headers.get('Retry-After')
+                try:
+                    pause = float(retry_after) if retry_after else 60
+                except ValueError:
+                    pause = 60
+                self.blocked_until = max(self.blocked_until, time.time() + pause)
+
+weight_tracker = RequestWeightTracker()
+
+def get_initial_data(symbol, max_retries=5, tracker=None):
     """获取初始K线数据，添加重试机制"""
     for attempt in range(max_retries):
         try:
+            if tracker is not None:
+                tracker.acquire(KLINE_REQUEST_WEIGHT)
             params = {
                 'symbol': symbol,
                 'interval': '1h',
@@ -77,6 +177,8 @@ def get_initial_data(symbol, max_retries=5):
                     'Accept-Encoding': 'gzip, deflate'
                 }
             )
+            if tracker is not None:
+                tracker.observe(response)
             
             if response.status_code == 200:
                 klines = response.json()
@@ -97,10 +199,78 @@ def get_initial_data(symbol, max_retries=5):
                 logger.error(f"获取{symbol}数据失败: {e}")
                 return None
         
-        time.sleep(2 ** attempt)
+        if attempt < max_retries - 1:
+            time.sleep(2 ** attempt)
     
     return None
 
+def load_symbol_history(symbol, df):
+    """将历史K线载入存储，并重置该币种的EMA状态"""
+    kline_data.load_dataframe(symbol, df)
+    ema_engines.pop(symbol, None)
+    timeframe_aggregators.pop(symbol, None)
+
+def bootstrap_kline_data(symbols, max_workers=BOOTSTRAP_WORKERS):
+    """并发预加载所有币种的K线历史，返回加载失败的币种列表"""
+    symbols = [symbol for symbol in symbols if symbol not in kline_data]
+    if not symbols:
+        return []
+    kline_data.reserve(len(kline_data) + len(symbols))
+    
+    total = len(symbols)
+    failed = []
+    start_time = time.time()
+    logger.info(f"开始预加载 {total} 个币种的K线数据（并发 {max_workers}）")
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # 单次尝试，失败的币种交给后台重试，不阻塞启动
+        futures = {
+            executor.submit(get_initial_data, symbol, 1, weight_tracker): symbol
+            for symbol in symbols
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            symbol = futures[future]
+            df = future.result()
+            if df is None or df.empty:
+                failed.append(symbol)
+            else:
+                load_symbol_history(symbol, df)
+            
+            if done % 50 == 0 or done == total:
+                logger.info(f"预加载进度: {done}/{total}，失败 {len(failed)}，耗时 {time.time() - start_time:.1f}秒")
+    
+    if failed:
+        logger.warning(f"{len(failed)} 个币种预加载失败: {', '.join(failed)}")
+    return failed
+
+def retry_failed_symbols(symbols, max_rounds=6):
+    """后台重试预加载失败的币种"""
+    pending = list(symbols)
+    for round_index in range(max_rounds):
+        if not pending:
+            break
+        time.sleep(min(5 * 2 ** round_index, 120))
+        still_failed = []
+        for symbol in pending:
+            df = get_initial_data(symbol, max_retries=2, tracker=weight_tracker)
+            if df is None or df.empty:
+                still_failed.append(symbol)
+            else:
+                load_symbol_history(symbol, df)
+        logger.info(f"后台重试第 {round_index + 1} 轮: 成功 {len(pending) - len(still_failed)}，剩余 {len(still_failed)}")
+        pending = still_failed
+    
+    if pending:
+        logger.error(f"以下币种多次重试后仍加载失败: {', '.join(pending)}")
+
+def start_bootstrap():
+    """订阅前预加载K线历史，失败的币种在后台线程继续重试"""
+    symbols = get_all_symbols()
+    failed = bootstrap_kline_data(symbols)
+    if failed:
+        threading.Thread(target=retry_failed_symbols, args=(failed,), daemon=True).start()
+    return symbols
+
 def calculate_3h_klines(df_1h):
     """将1小时K线转换为3小时K线"""
     try:
@@ -155,13 +325,48 @@ def calculate_ema(df, period=21):
     except Exception:
         return None
 
+def get_ema_engine(symbol, closes, period=21):
+    """获取币种的增量EMA计算器，首次使用时用历史收盘价初始化"""
+    ema = ema_engines.get(symbol)
+    if ema is None:
+        if closes is None or len(closes) < period:
+            return None
+        ema = IncrementalEMA.from_closes(closes, period=period)
+        ema_engines[symbol] = ema
+    return ema
+
+def get_timeframe_aggregators(symbol, period=21):
+    """获取币种各高周期的K线合成器，首次使用时用1小时历史K线初始化"""
+    aggregators = timeframe_aggregators.get(symbol)
+    if aggregators is None:
+        if kline_data.length(symbol) == 0:
+            return {}
+        bars = [kline_data.view(symbol, field) for field in ('timestamp', 'open', 'high', 'low', 'close', 'volume')]
+        aggregators = {
+            timeframe: TimeframeAggregator.from_bars(timeframe, *bars, period=period)
+            for timeframe in TIMEFRAMES
+        }
+        timeframe_aggregators[symbol] = aggregators
+    return aggregators
+
+def get_alert_ema(symbol):
+    """警报周期的EMA计算器，数据不足时返回None"""
+    if ALERT_TIMEFRAME == '1h':
+        ema = ema_engines.get(symbol)
+    else:
+        aggregator = timeframe_aggregators.get(symbol, {}).get(ALERT_TIMEFRAME)
+        ema = aggregator.ema if aggregator is not None else None
+    if ema is None or not ema.ready:
+        return None
+    return ema
+
 def format_alert_message(symbol, price, ema, cross_type):
     """格式化警报消息为JSON格式"""
     deviation = ((price/ema - 1) * 100)
     icon = "🔴" if cross_type == "下破" else "🟢"
     alert_data = {
         "symbol": symbol,
-        "alert_type": f"价格{cross_type}3h EMA21警报",
+        "alert_type": f"价格{cross_type}{ALERT_TIMEFRAME} EMA21警报",
         "icon": icon,
         "price": round(price, 4),
         "ema21": round(ema, 4),
@@ -171,151 +376,220 @@ def format_alert_message(symbol, price, ema, cross_type):
     return json.dumps(alert_data, ensure_ascii=False, indent=4)
 
 def send_feishu_alert(message):
-    """发送飞书警报"""
-    try:
-        headers = {'Content-Type': 'application/json'}
-        payload = {
-            "msg_type": "text",
-            "content": {"text": message}  # 直接发送JSON格式的消息
-        }
-        requests.post(FEISHU_WEBHOOK, headers=headers, data=json.dumps(payload, ensure_ascii=False))
-    except Exception as e:
-        logger.error(f"发送警报失败: {e}")
+    """发送飞书警报（只入队，不阻塞消息处理）"""
+    alert_dispatcher.submit(message)
 
-def subscribe_klines(ws):
-    """订阅K线数据"""
-    symbols = get_all_symbols()
-    subscribe_message = {
-        "method": "SUBSCRIBE",
-        "params": [
-            f"{symbol.lower()}@kline_1h" for symbol in symbols  # 订阅1小时K线
-        ],
-        "id": 1
-    }
-    ws.send(json.dumps(subscribe_message))
+def symbol_streams(symbol):
+    """单个币种需要订阅的stream（取决于价格来源）"""
+    symbol_lower = symbol.lower()
+    streams = [f"{symbol_lower}@kline_1h"]  # 1小时K线
+    if PRICE_SOURCE == PRICE_SOURCE_AGGTRADE:
+        streams.append(f"{symbol_lower}@aggTrade")  # 实时成交
+    elif PRICE_SOURCE == PRICE_SOURCE_BOOKTICKER:
+        streams.append(f"{symbol_lower}@bookTicker")  # 最优挂单
+    return streams
+
+def check_crossover(symbol, current_price, current_ema):
+    """检查价格是否穿越EMA21，满足冷却条件时发送警报"""
+    current_position = "above" if current_price > current_ema else "below"
+    
+    # 检查是否发生穿越
+    if symbol in position_records and current_position != position_records[symbol]:
+        current_time = time.time()
+        last_alert_time = last_alert_times.get(symbol, 0)
+        
+        if current_time - last_alert_time > alert_cooldown:
+            send_cross_alert(symbol, current_price, current_ema, current_position)
+            last_alert_times[symbol] = current_time
+    
+    # 更新位置记录
+    position_records[symbol] = current_position
+
+def send_cross_alert(symbol, current_price, current_ema, current_position):
+    """发送穿越警报"""
+    cross_type = "上破" if current_position == "above" else "下破"
+    message = format_alert_message(symbol, current_price, current_ema, cross_type)
+    send_feishu_alert(message)
+    logger.info(f"{symbol} {cross_type}EMA21")
+    
+    today = datetime.now().date()
+    if alert_stats['date'] != today:
+        alert_stats['date'] = today
+        alert_stats['count'] = 0
+    alert_stats['count'] += 1
 
 def on_message(ws, message):
     """处理WebSocket消息"""
     try:
-        data = json.loads(message)
+        event = message_decoder.decode(message)
+        if event is None:
+            return
         
         # 处理K线数据
-        if 'e' in data and data['e'] == 'kline':
-            symbol = data['s']
-            kline = data['k']
+        if isinstance(event, KlineEvent):
+            symbol = event.symbol
             
             # 更新K线数据
             if symbol in kline_data:
-                df = kline_data[symbol]
-                if df is not None:
-                    # 更新最新K线
-                    df.loc[df.index[-1], 'close'] = float(kline['c'])
-                    df.loc[df.index[-1], 'high'] = max(float(kline['h']), df.loc[df.index[-1], 'high'])
-                    df.loc[df.index[-1], 'low'] = min(float(kline['l']), df.loc[df.index[-1], 'low'])
-                    df.loc[df.index[-1], 'volume'] = float(kline['v'])
-                    
-                    # 计算EMA
-                    df = calculate_ema(df)
-                    if df is not None:
-                        current_price = float(kline['c'])
-                        current_ema = float(df['EMA21'].iloc[-1])
-                        current_position = "above" if current_price > current_ema else "below"
-                        
-                        # 检查是否发生穿越
-                        if symbol in position_records and current_position != position_records[symbol]:
-                            current_time = time.time()
-                            last_alert_time = last_alert_times.get(symbol, 0)
-                            
-                            if current_time - last_alert_time > alert_cooldown:
-                                cross_type = "上破" if current_position == "above" else "下破"
-                                message = format_alert_message(symbol, current_price, current_ema, cross_type)
-                                send_feishu_alert(message)
-                                last_alert_times[symbol] = current_time
-                                logger.info(f"{symbol} {cross_type}EMA21")
-                        
-                        # 更新位置记录
-                        position_records[symbol] = current_position
+                # 在追加新K线之前取EMA计算器，首次初始化时不把新K线当作历史
+                ema = get_ema_engine(symbol, kline_data.view(symbol, 'close'))
+                
+                # 原地更新最新K线，开盘时间更晚时追加新K线
+                new_bar = kline_data.update_bar(symbol, event.open_time, event.open, event.high,
+                                                event.low, event.close, event.volume)
+                
+                # 增量计算1小时EMA，K线收盘时滚动；上一根K线漏掉收盘推送时先补滚
+                if ema is not None:
+                    if new_bar:
+                        ema.roll()
+                    ema.update(event.close, closed=event.closed)
+                
+                # 增量合成高周期K线并更新对应EMA
+                for aggregator in get_timeframe_aggregators(symbol).values():
+                    aggregator.update(event.open_time, event.open, event.high, event.low,
+                                      event.close, event.volume, closed=event.closed)
+                
+                # 采样模式下由采样线程统一评估，向量化模式下由评估线程统一评估
+                alert_ema = get_alert_ema(symbol)
+                if alert_ema is not None:
+                    if crossover_evaluator is not None:
+                        crossover_evaluator.update(symbol, price=event.close, prev_ema=alert_ema.prev_ema)
+                    elif PRICE_SOURCE == PRICE_SOURCE_KLINE:
+                        check_crossover(symbol, event.close, alert_ema.value)
         
-        # 处理实时成交数据
-        elif 'e' in data and data['e'] == 'aggTrade':
-            symbol = data['s']
-            price = float(data['p'])
-            # 更新最新价格
-            if symbol in kline_data:
-                df = kline_data[symbol]
-                if df is not None:
-                    df.loc[df.index[-1], 'close'] = price
+        # 处理实时成交数据：只覆盖最新价槽位，由采样线程评估
+        elif isinstance(event, TradeEvent):
+            if crossover_evaluator is not None:
+                crossover_evaluator.update(event.symbol, price=event.price)
+            else:
+                latest_prices.put(event.symbol, event.price)
+        
+        # 处理最优挂单数据：取买一卖一中间价
+        elif isinstance(event, BookTickerEvent):
+            if crossover_evaluator is not None:
+                crossover_evaluator.update(event.symbol, price=event.mid)
+            else:
+                latest_prices.put(event.symbol, event.mid)
                     
     except Exception as e:
         logger.error(f"处理WebSocket消息失败: {e}")
 
-def on_error(ws, error):
-    logger.error(f"WebSocket错误: {error}")
+def evaluate_latest_prices():
+    """评估所有最新价有更新的币种"""
+    for symbol, price in latest_prices.drain():
+        if symbol not in kline_data:
+            continue
+        kline_data.set_close(symbol, price)
+        ema = get_alert_ema(symbol)
+        if ema is None:
+            continue
+        check_crossover(symbol, price, ema.peek(price))
 
-def on_close(ws, close_status_code, close_msg):
-    logger.info("WebSocket连接关闭")
+def run_price_sampler(stop_event):
+    """按固定节奏采样最新价槽位"""
+    while not stop_event.wait(PRICE_SAMPLE_INTERVAL):
+        try:
+            evaluate_latest_prices()
+        except Exception as e:
+            logger.error(f"评估最新价格失败: {e}")
 
-def on_open(ws):
-    logger.info("WebSocket连接建立")
-    # 订阅K线和实时成交数据
-    subscribe_message = {
-        "method": "SUBSCRIBE",
-        "params": [],
-        "id": 1
-    }
-    
-    symbols = get_all_symbols()
-    for symbol in symbols:
-        symbol_lower = symbol.lower()
-        subscribe_message["params"].extend([
-            f"{symbol_lower}@kline_1h",  # 1小时K线
-            f"{symbol_lower}@aggTrade"   # 实时成交
-        ])
-    
-    ws.send(json.dumps(subscribe_message))
-    logger.info("已订阅所有交易对的K线和实时成交数据")
+def evaluate_all_symbols():
+    """对所有币种做一次向量化评估，同步位置记录并发送警报"""
+    alerts, changes = crossover_evaluator.evaluate()
+    for symbol, position in changes:
+        position_records[symbol] = "above" if position == ABOVE else "below"
+    for symbol, price, ema, position in alerts:
+        send_cross_alert(symbol, price, ema, "above" if position == ABOVE else "below")
+        last_alert_times[symbol] = time.time()
+
+def run_evaluator(stop_event):
+    """按固定节奏运行向量化评估"""
+    while not stop_event.wait(EVALUATION_INTERVAL):
+        try:
+            evaluate_all_symbols()
+        except Exception as e:
+            logger.error(f"向量化评估失败: {e}")
+
+def collect_status_pairs():
+    """汇总所有币种的当前价格、EMA和位置，供监控页面使用"""
+    pairs = []
+    for symbol, position in list(position_records.items()):
+        ema = get_alert_ema(symbol)
+        price = kline_data.last(symbol) if symbol in kline_data else None
+        if ema is None or not price:
+            continue
+        current_ema = ema.peek(price)
+        pairs.append({
+            'symbol': symbol,
+            'price': price,
+            'ema21': round(current_ema, 8),
+            'deviation': round((price / current_ema - 1) * 100, 2),
+            'position': position
+        })
+    return pairs
+
+def run_status_publisher(stop_event, subscriber):
+    """按固定节奏把监控状态推送给API服务，API只向页面发送有变化的币种"""
+    import api_server
+    while not stop_event.wait(STATUS_PUBLISH_INTERVAL):
+        try:
+            stats = subscriber.stats()
+            connected = sum(1 for s in stats if s['connected'])
+            today = datetime.now().date()
+            api_server.update_status(collect_status_pairs(), status={
+                'connection': f"已连接 {connected}/{len(stats)}",
+                'alerts_today': alert_stats['count'] if alert_stats['date'] == today else 0
+            })
+        except Exception as e:
+            logger.error(f"推送监控状态失败: {e}")
+
+def start_api_server(stop_event, subscriber):
+    """启动监控页面API服务和状态推送线程"""
+    try:
+        import api_server
+    except ImportError as e:
+        logger.warning(f"未安装flask，监控页面API未启动: {e}")
+        return
+    api_server.start_api_server(API_HOST, API_PORT)
+    threading.Thread(target=run_status_publisher, args=(stop_event, subscriber),
+                     name="status-publisher", daemon=True).start()
+    logger.info(f"监控页面API已启动: http://{API_HOST}:{API_PORT}/")
 
 def main():
     """主函数"""
-    retry_count = 0
-    max_retries = 10
+    global crossover_evaluator
+    # 订阅前先预加载K线历史，否则on_message会忽略所有推送
+    symbols = start_bootstrap()
+    if not symbols:
+        logger.error("未获取到任何交易对，稍后重试")
+        return
     
-    while True:
-        try:
-            # 初始化WebSocket连接
-            websocket.enableTrace(True)
-            ws = websocket.WebSocketApp(
-                WS_URL,
-                on_message=on_message,
-                on_error=on_error,
-                on_close=on_close,
-                on_open=on_open
-            )
-            
-            # WebSocket连接设置
-            ws.run_forever(
-                ping_interval=20,
-                ping_timeout=10,
-                reconnect=3,
-                sslopt={"cert_reqs": ssl.CERT_NONE},
-                sockopt=((socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),)
-            )
-            
-        except WebSocketConnectionClosedException:
-            retry_count += 1
-            wait_time = min(retry_count * 5, 60)
-            logger.warning(f"WebSocket连接断开，{wait_time}秒后重试... (尝试 {retry_count}/{max_retries})")
-            time.sleep(wait_time)
-            
-            if retry_count >= max_retries:
-                logger.error("达到最大重试次数，重启程序...")
-                return
-                
-        except Exception as e:
-            logger.error(f"WebSocket错误: {e}")
-            time.sleep(10)
-            
-        logger.info("正在尝试重新连接...")
+    alert_dispatcher.start()
+    
+    stop_event = threading.Event()
+    if EVALUATION_MODE == EVALUATION_VECTORIZED:
+        crossover_evaluator = CrossoverEvaluator(symbols, cooldown=alert_cooldown)
+        threading.Thread(target=run_evaluator, args=(stop_event,), name="crossover-evaluator", daemon=True).start()
+        logger.info(f"向量化评估模式，每 {EVALUATION_INTERVAL} 秒评估 {len(symbols)} 个币种")
+    elif PRICE_SOURCE != PRICE_SOURCE_KLINE:
+        threading.Thread(target=run_price_sampler, args=(stop_event,), name="price-sampler", daemon=True).start()
+        logger.info(f"价格来源: {PRICE_SOURCE}，每 {PRICE_SAMPLE_INTERVAL} 秒采样评估")
+    
+    # 按单连接stream上限拆分为多个连接，每个分片独立读取、处理和重连
+    subscriber = ShardedSubscriber(WS_URL, symbols, on_message, streams_for=symbol_streams)
+    subscriber.start()
+    if ENABLE_API_SERVER:
+        start_api_server(stop_event, subscriber)
+    try:
+        while True:
+            time.sleep(STATS_INTERVAL)
+            subscriber.log_stats()
+            stats = alert_dispatcher.stats()
+            logger.info(f"警报队列: 已发送 {stats['sent']}，失败 {stats['failed']}，丢弃 {stats['dropped']}，积压 {stats['backlog']}")
+    finally:
+        stop_event.set()
+        subscriber.stop()
+        alert_dispatcher.stop()
 
 if __name__ == "__main__":
     while True:
@@ -0,0 +1,152 @@
+import math
+
+
+class IncrementalEMA:
+    """增量EMA计算器
+
+    保存上一根已收盘K线的EMA，未收盘K线的实时EMA由最新收盘价O(1)推导；
+    只有在K线收盘(k['x'])时才向前滚动；漏掉收盘推送时由roll()按最后价格补滚。结果与
+    df['close'].ewm(span=period, adjust=False).mean() 一致。
+    """
+
+    __slots__ = ('period', 'alpha', 'prev_ema', 'value', 'count', 'has_live', 'close')
+
+    def __init__(self, period=21):
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self.prev_ema = None  # 上一根已收盘K线的EMA
+        self.value = None     # 含未收盘K线的实时EMA
+        self.count = 0        # 已收盘K线数量
+        self.has_live = False  # 是否存在未收盘K线
+        self.close = None      # 未收盘K线的最新价格
+
+    @classmethod
+    def from_closes(cls, closes, period=21, last_closed=False):
+        """用历史收盘价初始化
+
+        closes: 收盘价序列（按时间升序）
+        last_closed: 最后一根K线是否已收盘；REST返回的最后一根通常是未收盘K线
+        """
+        ema = cls(period)
+        closes = [float(c) for c in closes]
+        if not closes:
+            return ema
+        history = closes if last_closed else closes[:-1]
+        for close in history:
+            ema.push(close)
+        if not last_closed:
+            ema.update(closes[-1])
+        return ema
+
+    @property
+    def ready(self):
+        """数据量是否足够（与calculate_ema的最小长度要求保持一致）"""
+        return self.count + int(self.has_live) >= self.period
+
+    def push(self, close):
+        """追加一根已收盘K线"""
+        self.value = self._step(close)
+        self.prev_ema = self.value
+        self.count += 1
+        self.has_live = False
+        return self.value
+
+    def update(self, close, closed=False):
+        """用未收盘K线的最新价格更新实时EMA，closed为True时滚动到下一根K线"""
+        if closed:
+            return self.push(close)
+        self.value = self._step(close)
+        self.close = float(close)
+        self.has_live = True
+        return self.value
+
+    def roll(self):
+        """新K线开盘时调用：上一根K线没有收到收盘推送（如断线重连）时，按其最后价格滚动"""
+        if self.has_live:
+            self.push(self.close)
+        return self.value
+
+    def peek(self, close):
+        """以close作为未收盘K线价格计算实时EMA，不修改状态"""
+        return self._step(close)
+
+    def _step(self, close):
+        close = float(close)
+        if self.prev_ema is None or math.isnan(self.prev_ema):
+            return close
+        return self.alpha * close + (1 - self.alpha) * self.prev_ema
+
+
+HOUR_MS = 3600 * 1000
+TIMEFRAME_MS = {
+    '3h': 3 * HOUR_MS,
+    '4h': 4 * HOUR_MS,
+    '1d': 24 * HOUR_MS,
+}
+
+
+class TimeframeAggregator:
+    """把1小时K线推送增量合成为更高周期K线，并维护该周期的增量EMA
+
+    高周期K线按币安UTC边界对齐（开盘时间为周期长度的整数倍）。
+    已收盘的1小时K线累加到高周期K线中，未收盘的1小时K线只参与实时值，
+    因此每次更新都是O(1)；高周期最后一根1小时K线收盘时EMA向前滚动。
+    """
+
+    __slots__ = ('interval', 'base', 'ema', 'bucket', 'open', 'high', 'low', 'close', 'volume',
+                 '_high', '_low', '_volume', '_rolled')
+
+    def __init__(self, interval, base=HOUR_MS, period=21):
+        self.interval = TIMEFRAME_MS.get(interval, interval)
+        self.base = base
+        self.ema = IncrementalEMA(period)
+        self.bucket = None  # 当前高周期K线的开盘时间（毫秒）
+        self.open = self.high = self.low = self.close = None
+        self.volume = 0.0
+        self._high = float('-inf')  # 本周期已收盘1小时K线的聚合值
+        self._low = float('inf')
+        self._volume = 0.0
+        self._rolled = False
+
+    @classmethod
+    def from_bars(cls, interval, timestamps, open_, high, low, close, volume,
+                  base=HOUR_MS, period=21, last_closed=False):
+        """用1小时历史K线初始化，跳过开头不完整的高周期K线"""
+        aggregator = cls(interval, base=base, period=period)
+        n = len(timestamps)
+        start = 0
+        while start < n and int(timestamps[start]) % aggregator.interval != 0:
+            start += 1
+        for i in range(start, n):
+            closed = last_closed or i < n - 1
+            aggregator.update(int(timestamps[i]), open_[i], high[i], low[i], close[i], volume[i], closed=closed)
+        return aggregator
+
+    def update(self, open_time, open_, high, low, close, volume, closed=False):
+        """用1小时K线更新，返回高周期的实时EMA"""
+        open_time = int(open_time)
+        bucket = open_time - open_time % self.interval
+        if self.bucket is None or bucket > self.bucket:
+            # 上一根高周期K线没有收到收盘推送（如断线），先按最后价格滚动
+            if self.bucket is not None and not self._rolled:
+                self.ema.push(self.close)
+            self.bucket = bucket
+            self.open = float(open_)
+            self._high = float('-inf')
+            self._low = float('inf')
+            self._volume = 0.0
+            self._rolled = False
+        elif bucket < self.bucket or self._rolled:
+            return self.ema.value  # 过期或重复推送
+
+        self.high = max(self._high, float(high))
+        self.low = min(self._low, float(low))
+        self.volume = self._volume + float(volume)
+        self.close = float(close)
+
+        if closed:
+            self._high, self._low, self._volume = self.high, self.low, self.volume
+            if open_time + self.base >= bucket + self.interval:
+                self._rolled = True
+                return self.ema.update(self.close, closed=True)
+        return self.ema.update(self.close)
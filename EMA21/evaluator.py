@@ -0,0 +1,64 @@
+import time
+
+import numpy as np
+
+ABOVE = 1
+BELOW = -1
+
+
+class CrossoverEvaluator:
+    """向量化的EMA穿越评估器
+
+    所有币种的最新价格和上一根已收盘K线的EMA保存在连续的NumPy数组中，
+    消息处理只做O(1)的数组写入；定时调用evaluate()时一次性计算所有币种的
+    实时EMA、上下方位置、穿越和冷却条件，评估开销与消息速率无关。
+    """
+
+    def __init__(self, symbols, period=21, cooldown=3600):
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.alpha = 2.0 / (period + 1)
+        self.cooldown = cooldown
+        n = len(self.symbols)
+        self.price = np.full(n, np.nan)      # 最新价格
+        self.prev_ema = np.full(n, np.nan)   # 上一根已收盘K线的EMA
+        self.position = np.zeros(n, dtype=np.int8)  # 1上方 / -1下方 / 0未知
+        self.last_alert = np.zeros(n)        # 最后警报时间
+        self.evaluations = 0
+
+    def update(self, symbol, price=None, prev_ema=None):
+        """写入最新价格和/或已收盘EMA"""
+        i = self.index.get(symbol)
+        if i is None:
+            return
+        if price is not None:
+            self.price[i] = price
+        if prev_ema is not None:
+            self.prev_ema[i] = prev_ema
+
+    def evaluate(self, now=None):
+        """评估所有币种
+
+        返回 (alerts, changes)：
+        alerts: 满足冷却条件的穿越 [(币种, 价格, EMA, 位置)]
+        changes: 位置发生变化的币种（含首次确定位置） [(币种, 位置)]
+        """
+        now = time.time() if now is None else now
+        # 先取快照，避免评估过程中被消息处理线程改写
+        price = self.price.copy()
+        ema = self.alpha * price + (1 - self.alpha) * self.prev_ema
+        valid = ~np.isnan(ema)
+        new_position = np.where(price > ema, ABOVE, BELOW).astype(np.int8)
+
+        changed = valid & (new_position != self.position)
+        crossed = changed & (self.position != 0)
+        alerted = crossed & (now - self.last_alert > self.cooldown)
+
+        self.last_alert[alerted] = now
+        self.position[changed] = new_position[changed]
+        self.evaluations += 1
+
+        alerts = [(self.symbols[i], float(price[i]), float(ema[i]), int(new_position[i]))
+                  for i in np.flatnonzero(alerted)]
+        changes = [(self.symbols[i], int(new_position[i])) for i in np.flatnonzero(changed)]
+        return alerts, changes
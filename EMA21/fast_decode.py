@@ -0,0 +1,128 @@
+import json
+
+# 可选的高性能JSON解析库，未安装时回退到标准库
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _available_decoders():
+    decoders = {}
+    if orjson is not None:
+        decoders['orjson'] = orjson.loads
+    if msgspec is not None:
+        decoders['msgspec'] = msgspec.json.Decoder().decode
+    decoders['json'] = json.loads
+    return decoders
+
+
+DECODERS = _available_decoders()
+DECODER_NAME = next(iter(DECODERS))  # 优先级: orjson > msgspec > json
+loads = DECODERS[DECODER_NAME]
+
+
+def use_decoder(name):
+    """切换全局使用的JSON解析器"""
+    global loads, DECODER_NAME
+    if name not in DECODERS:
+        raise ValueError(f"解析器 {name} 不可用，可选: {', '.join(DECODERS)}")
+    DECODER_NAME = name
+    loads = DECODERS[name]
+
+
+class KlineEvent:
+    """K线推送"""
+
+    __slots__ = ('symbol', 'open_time', 'open', 'high', 'low', 'close', 'volume', 'closed')
+
+    def __init__(self, data):
+        k = data['k']
+        self.symbol = data['s']
+        self.open_time = int(k['t'])
+        self.open = float(k['o'])
+        self.high = float(k['h'])
+        self.low = float(k['l'])
+        self.close = float(k['c'])
+        self.volume = float(k['v'])
+        self.closed = bool(k['x'])
+
+
+class TradeEvent:
+    """逐笔成交推送"""
+
+    __slots__ = ('symbol', 'price', 'quantity', 'trade_time')
+
+    def __init__(self, data):
+        self.symbol = data['s']
+        self.price = float(data['p'])
+        self.quantity = float(data['q'])
+        self.trade_time = int(data['T'])
+
+
+class BookTickerEvent:
+    """最优挂单推送"""
+
+    __slots__ = ('symbol', 'bid', 'ask')
+
+    def __init__(self, data):
+        self.symbol = data['s']
+        self.bid = float(data['b'])
+        self.ask = float(data['a'])
+
+    @property
+    def mid(self):
+        return (self.bid + self.ask) / 2
+
+
+EVENT_TYPES = {
+    'kline': KlineEvent,
+    'aggTrade': TradeEvent,
+    'bookTicker': BookTickerEvent,
+}
+
+
+def peek_event_type(message):
+    """不解析整条消息，直接从原始文本中取出事件类型 "e"
+
+    订阅确认等控制消息（如 {"result":null,"id":1}）没有事件类型，返回None。
+    """
+    if isinstance(message, (bytes, bytearray)):
+        message = message.decode('utf-8', 'replace')
+    start = message.find('"e":')
+    if start < 0:
+        return None
+    start = message.find('"', start + 4)
+    if start < 0:
+        return None
+    end = message.find('"', start + 1)
+    return message[start + 1:end] if end > 0 else None
+
+
+class MessageDecoder:
+    """WebSocket消息解码器：先按事件类型预过滤，再完整解析为结构体"""
+
+    __slots__ = ('accepted', 'decoded', 'filtered')
+
+    def __init__(self, accepted=None):
+        self.accepted = frozenset(accepted or EVENT_TYPES)
+        self.decoded = 0   # 完整解析的消息数
+        self.filtered = 0  # 预过滤丢弃的消息数
+
+    def decode(self, message):
+        """返回事件结构体，控制消息或未订阅的事件类型返回None"""
+        event_type = peek_event_type(message)
+        if event_type not in self.accepted:
+            self.filtered += 1
+            return None
+        data = loads(message)
+        self.decoded += 1
+        # 组合stream格式 {"stream": ..., "data": {...}}
+        if 'data' in data and 'e' not in data:
+            data = data['data']
+        return EVENT_TYPES[data['e']](data)
@@ -0,0 +1,215 @@
+import threading
+
+import numpy as np
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class KlineStore:
+    """基于NumPy环形缓冲区的K线存储
+
+    所有币种共用一块二维数组（行=币种，列=K线），每个字段一块。
+    每根K线同时写入位置 i 和 i+capacity（镜像写入），因此最近 n 根K线
+    始终是连续内存，view() 可以零拷贝返回给指标计算。
+    更新未收盘K线、追加新K线都是O(1)。
+    """
+
+    def __init__(self, capacity=300, initial_symbols=64):
+        self.capacity = capacity
+        self._index = {}  # 币种 -> 行号
+        rows = max(initial_symbols, 1)
+        width = capacity * 2
+        self._data = {field: np.full((rows, width), np.nan) for field in FIELDS}
+        self._timestamp = np.zeros((rows, width), dtype=np.int64)
+        self._head = np.full(rows, -1, dtype=np.int64)   # 最新K线所在槽位
+        self._length = np.zeros(rows, dtype=np.int64)    # 已存储K线数量
+        self._lock = threading.Lock()  # 保护币种注册和扩容
+
+    def __contains__(self, symbol):
+        return symbol in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return iter(self._index)
+
+    @property
+    def symbols(self):
+        return list(self._index)
+
+    @property
+    def nbytes(self):
+        """占用内存（字节）"""
+        return sum(arr.nbytes for arr in self._data.values()) + self._timestamp.nbytes
+
+    def _grow(self, rows_needed):
+        """扩容到至少rows_needed行（扩容后之前返回的视图不再更新）"""
+        rows = self._head.shape[0]
+        new_rows = max(rows * 2, rows_needed)
+        for field, arr in self._data.items():
+            grown = np.full((new_rows, arr.shape[1]), np.nan)
+            grown[:rows] = arr
+            self._data[field] = grown
+        grown_ts = np.zeros((new_rows, self._timestamp.shape[1]), dtype=np.int64)
+        grown_ts[:rows] = self._timestamp
+        self._timestamp = grown_ts
+        self._head = np.concatenate([self._head, np.full(new_rows - rows, -1, dtype=np.int64)])
+        self._length = np.concatenate([self._length, np.zeros(new_rows - rows, dtype=np.int64)])
+
+    def reserve(self, n_symbols):
+        """预分配行数，避免在推送处理期间扩容"""
+        with self._lock:
+            if n_symbols > self._head.shape[0]:
+                self._grow(n_symbols)
+
+    def add_symbol(self, symbol):
+        """注册币种，返回行号"""
+        row = self._index.get(symbol)
+        if row is None:
+            with self._lock:
+                row = self._index.get(symbol)
+                if row is None:
+                    row = len(self._index)
+                    if row >= self._head.shape[0]:
+                        self._grow(row + 1)
+                    self._index[symbol] = row
+        return row
+
+    def remove_symbol(self, symbol):
+        """清空币种数据（行号保留以复用）"""
+        row = self._index.get(symbol)
+        if row is not None:
+            self._head[row] = -1
+            self._length[row] = 0
+
+    def load(self, symbol, timestamps, open_, high, low, close, volume):
+        """批量载入历史K线（按时间升序，超出容量时只保留最近的部分）"""
+        row = self.add_symbol(symbol)
+        n = min(len(timestamps), self.capacity)
+        columns = {'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}
+        for field, values in columns.items():
+            values = np.asarray(values, dtype=np.float64)[-n:]
+            self._data[field][row, :n] = values
+            self._data[field][row, self.capacity:self.capacity + n] = values
+        ts = np.asarray(timestamps, dtype=np.int64)[-n:]
+        self._timestamp[row, :n] = ts
+        self._timestamp[row, self.capacity:self.capacity + n] = ts
+        self._head[row] = n - 1
+        self._length[row] = n
+
+    def load_dataframe(self, symbol, df):
+        """从get_initial_data返回的DataFrame载入"""
+        timestamps = df['timestamp'].values.astype('datetime64[ms]').astype(np.int64)
+        self.load(symbol, timestamps, df['open'].values, df['high'].values,
+                  df['low'].values, df['close'].values, df['volume'].values)
+
+    def _write(self, row, slot, open_time, open_, high, low, close, volume):
+        mirror = slot + self.capacity
+        for field, value in (('open', open_), ('high', high), ('low', low),
+                             ('close', close), ('volume', volume)):
+            arr = self._data[field]
+            arr[row, slot] = value
+            arr[row, mirror] = value
+        self._timestamp[row, slot] = open_time
+        self._timestamp[row, mirror] = open_time
+
+    def update_bar(self, symbol, open_time, open_, high, low, close, volume):
+        """用K线推送更新最新K线
+
+        open_time与最新K线相同时原地更新，更晚时追加新K线（覆盖最旧的一根）。
+        返回True表示追加了新K线。
+        """
+        row = self._index.get(symbol)
+        if row is None:
+            return False
+        open_time = int(open_time)
+        head = self._head[row]
+        if head >= 0 and self._timestamp[row, head] == open_time:
+            high = max(float(high), self._data['high'][row, head])
+            low = min(float(low), self._data['low'][row, head])
+            self._write(row, head, open_time, float(open_), high, low, float(close), float(volume))
+            return False
+        if head >= 0 and open_time < self._timestamp[row, head]:
+            return False  # 过期数据
+        slot = (head + 1) % self.capacity
+        self._write(row, slot, open_time, float(open_), float(high), float(low),
+                    float(close), float(volume))
+        self._head[row] = slot
+        self._length[row] = min(self._length[row] + 1, self.capacity)
+        return True
+
+    def set_close(self, symbol, price):
+        """只更新最新K线的收盘价（成交推送）"""
+        row = self._index.get(symbol)
+        if row is None or self._head[row] < 0:
+            return
+        head = self._head[row]
+        price = float(price)
+        for slot in (head, head + self.capacity):
+            self._data['close'][row, slot] = price
+            if price > self._data['high'][row, slot]:
+                self._data['high'][row, slot] = price
+            if price < self._data['low'][row, slot]:
+                self._data['low'][row, slot] = price
+
+    def length(self, symbol):
+        row = self._index.get(symbol)
+        return 0 if row is None else int(self._length[row])
+
+    def _window(self, row, n):
+        length = int(self._length[row])
+        n = length if n is None else min(n, length)
+        end = int(self._head[row]) + self.capacity + 1
+        return end - n, end
+
+    def view(self, symbol, field='close', n=None):
+        """返回最近n根K线某字段的只读零拷贝视图（按时间升序）"""
+        row = self._index[symbol]
+        start, end = self._window(row, n)
+        arr = self._timestamp if field == 'timestamp' else self._data[field]
+        window = arr[row, start:end]
+        window.flags.writeable = False
+        return window
+
+    def last(self, symbol, field='close'):
+        """最新K线某字段的值"""
+        row = self._index[symbol]
+        head = self._head[row]
+        if head < 0:
+            return None
+        if field == 'timestamp':
+            return int(self._timestamp[row, head])
+        return float(self._data[field][row, head])
+
+
+class LatestPriceSlots:
+    """每个币种一个最新价格槽位
+
+    高频成交推送只覆盖槽位并标记为已更新，评估线程按固定节奏取出
+    上次取出后有更新的币种，多次推送被合并为一次评估。
+    """
+
+    def __init__(self):
+        self._prices = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self.updates = 0  # 累计写入次数
+        self.samples = 0  # 累计被评估的次数
+
+    def put(self, symbol, price):
+        with self._lock:
+            self._prices[symbol] = price
+            self._dirty.add(symbol)
+            self.updates += 1
+
+    def get(self, symbol):
+        return self._prices.get(symbol)
+
+    def drain(self):
+        """取出上次调用后有更新的 (币种, 最新价格) 列表"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            items = [(symbol, self._prices[symbol]) for symbol in dirty]
+        self.samples += len(items)
+        return items
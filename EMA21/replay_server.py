@@ -0,0 +1,398 @@
+"""币安/飞书/CoinGecko 本地回放服务
+
+用于压测和复现性能问题：各脚本通过环境变量把接口地址指向本服务，
+    BINANCE_REST_URL=http://127.0.0.1:8765
+    BINANCE_WS_URL=ws://127.0.0.1:8765
+    FEISHU_WEBHOOK=http://127.0.0.1:8765/webhook/feishu
+    COINGECKO_BASE_URL=http://127.0.0.1:8765/api/v3
+
+- WebSocket：按录制时间间隔以1倍、10倍或最快速度回放K线/aggTrade等消息，
+  支持 /ws（SUBSCRIBE订阅，binance_monitor.py）和 /stream?streams=...（组合流，vwap_daemon.py）
+- REST：返回录制的响应，可配置延迟和429注入；--upstream 时未录制的请求转发到真实接口并录制
+- Webhook：所有POST请求都记录下来（内存 + 可选的JSON Lines文件），返回成功
+
+用法:
+    python replay_server.py record --streams btcusdt@kline_1h,btcusdt@aggTrade --seconds 600 -o frames.jsonl
+    python replay_server.py serve --frames frames.jsonl --speed 10 --rest rest.jsonl --latency 50 --throttle-every 20
+
+统计信息: GET /__replay/stats，收到的Webhook: GET /__replay/webhooks
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+from aiohttp import ClientSession, WSMsgType, web
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+RECORD_URL = os.environ.get('BINANCE_WS_URL', "wss://fstream.binance.com") + "/stream"
+MAX_SPEED_YIELD = 256  # 最快速度回放时每发送多少条让出一次事件循环
+# 录制的REST响应按参数匹配时，这些参数必须一致（其余参数如startTime取最接近的录制）
+IDENTITY_PARAMS = ('symbol', 'interval', 'vs_currency', 'page', 'per_page')
+
+
+def stream_name(payload):
+    """由消息内容推出stream名，如 btcusdt@kline_1h、btcusdt@aggTrade；控制消息返回None"""
+    event = payload.get('e')
+    symbol = str(payload.get('s', '')).lower()
+    if not event or not symbol:
+        return None
+    if event == 'kline':
+        return f"{symbol}@kline_{payload['k']['i']}"
+    return f"{symbol}@{event}"
+
+
+def load_frames(path):
+    """
+    读取录制的WebSocket消息，按时间排序
+
+    每行为 {"t": 接收时间毫秒, "frame": 原始消息}（record命令的输出），
+    或者直接是原始消息（bench_decode.py的frames.txt格式，时间取消息的E字段）
+    返回 [(时间毫秒, stream名, 单流消息, 组合流消息)]
+    """
+    frames = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            raw, received = line, None
+            record = json.loads(line)
+            if isinstance(record, dict) and 'frame' in record:
+                received = record.get('t')
+                raw = record['frame']
+                record = json.loads(raw)
+            if not isinstance(record, dict):
+                continue
+            if 'stream' in record and 'data' in record:  # 录制的是组合流
+                name, payload = record['stream'], record['data']
+                raw = json.dumps(payload, separators=(',', ':'))
+            else:
+                name, payload = stream_name(record), record
+            if name is None:
+                continue
+            wrapped = json.dumps({'stream': name, 'data': payload}, separators=(',', ':'))
+            frames.append((int(received if received is not None else payload.get('E', 0)), name, raw, wrapped))
+    frames.sort(key=lambda frame: frame[0])
+    return frames
+
+
+def query_key(query):
+    return tuple(sorted(query.items()))
+
+
+class RestRecordings:
+    """
+    录制的REST响应
+
+    文件每行为 {"method", "path", "query", "status", "body"}；
+    先按路径+参数精确匹配，否则取同一路径下IDENTITY_PARAMS一致且相同参数最多的录制
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}  # (method, path) -> [(query, status, body)]
+        self.exact = {}    # (method, path, query_key) -> (status, body)
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.add(entry['method'], entry['path'], entry.get('query', {}),
+                                 entry.get('status', 200), entry['body'])
+        if path:
+            logger.info(f"已加载 {len(self.exact)} 条REST录制")
+
+    def add(self, method, path, query, status, body):
+        self.entries.setdefault((method, path), []).append((query, status, body))
+        self.exact[(method, path, query_key(query))] = (status, body)
+
+    def record(self, method, path, query, status, body):
+        """保存新录制的响应，同时追加到录制文件"""
+        self.add(method, path, query, status, body)
+        if self.path:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'method': method, 'path': path, 'query': query,
+                                    'status': status, 'body': body}, ensure_ascii=False) + '\n')
+
+    def match(self, method, path, query):
+        """返回 (status, body)，没有可用的录制时返回None"""
+        found = self.exact.get((method, path, query_key(query)))
+        if found is not None:
+            return found
+        best, best_score = None, -1
+        for recorded, status, body in self.entries.get((method, path), []):
+            if any(recorded.get(p) != query.get(p) for p in IDENTITY_PARAMS if p in recorded or p in query):
+                continue
+            score = sum(recorded.get(k) == v for k, v in query.items())
+            if score > best_score:
+                best, best_score = (status, body), score
+        return best
+
+
+class ReplayServer:
+    """回放服务：WebSocket回放、REST回放和Webhook记录共用一个aiohttp应用"""
+
+    def __init__(self, frames=(), speed=1.0, repeat=1, rest=None, upstream=None, latency=0.0, jitter=0.0,
+                 throttle_every=0, throttle_rate=0.0, retry_after=1, capture=None, seed=0):
+        self.frames = list(frames)
+        self.speed = speed  # 0表示最快速度
+        self.repeat = repeat
+        self.rest = rest or RestRecordings()
+        self.upstream = upstream.rstrip('/') if upstream else None
+        self.latency = latency / 1000
+        self.jitter = jitter / 1000
+        self.throttle_every = throttle_every
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.capture = capture
+        self.random = random.Random(seed)  # 固定种子，延迟和429注入可复现
+        self.webhooks = []
+        self.client = None
+        self.weight_window = 0
+        self.weight_used = 0
+        self.stats = {
+            'ws_connections': 0, 'ws_active': 0, 'frames_sent': 0,
+            'rest_requests': 0, 'rest_throttled': 0, 'rest_missing': 0, 'rest_proxied': 0,
+            'webhooks': 0,
+        }
+
+    def build_app(self):
+        app = web.Application()
+        app.router.add_get('/__replay/stats', self.handle_stats)
+        app.router.add_get('/__replay/webhooks', self.handle_webhooks)
+        app.router.add_get('/ws', self.handle_ws)
+        app.router.add_get('/ws/{streams:.*}', self.handle_ws)
+        app.router.add_get('/stream', self.handle_ws)
+        app.router.add_get('/{tail:.*}', self.handle_rest)
+        app.router.add_post('/{tail:.*}', self.handle_webhook)
+        app.on_cleanup.append(self._close_client)
+        return app
+
+    async def _close_client(self, app):
+        if self.client is not None:
+            await self.client.close()
+
+    # ---------- WebSocket ----------
+
+    async def handle_ws(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        combined = request.path.startswith('/stream')
+        streams = request.query.get('streams') or request.match_info.get('streams') or ''
+        subscribed = set(s for s in streams.split('/') if s)
+        self.stats['ws_connections'] += 1
+        self.stats['ws_active'] += 1
+        conn_id = self.stats['ws_connections']
+        task = asyncio.ensure_future(self._replay(ws, subscribed, combined, conn_id)) if subscribed else None
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    command = json.loads(msg.data)
+                except ValueError:
+                    continue
+                params = command.get('params') or []
+                if command.get('method') == 'SUBSCRIBE':
+                    subscribed.update(params)
+                elif command.get('method') == 'UNSUBSCRIBE':
+                    subscribed.difference_update(params)
+                await ws.send_str(json.dumps({'result': None, 'id': command.get('id')}))
+                if task is None and subscribed:
+                    task = asyncio.ensure_future(self._replay(ws, subscribed, combined, conn_id))
+        finally:
+            if task is not None:
+                task.cancel()
+            self.stats['ws_active'] -= 1
+        return ws
+
+    async def _replay(self, ws, subscribed, combined, conn_id):
+        """按录制时间间隔发送已订阅stream的消息；回放结束后连接保持打开，避免客户端反复重连"""
+        loop = asyncio.get_event_loop()
+        sent = 0
+        started = loop.time()
+        try:
+            for _ in range(self.repeat):
+                if not self.frames:
+                    break
+                base_time = self.frames[0][0]
+                round_start = loop.time()
+                for received, name, raw, wrapped in self.frames:
+                    if name not in subscribed:
+                        continue
+                    if self.speed:
+                        delay = round_start + (received - base_time) / 1000 / self.speed - loop.time()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                    elif sent % MAX_SPEED_YIELD == 0:
+                        await asyncio.sleep(0)
+                    if ws.closed:
+                        return
+                    await ws.send_str(wrapped if combined else raw)
+                    sent += 1
+                    self.stats['frames_sent'] += 1
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            elapsed = loop.time() - started
+            logger.info(f"连接 {conn_id}: 回放 {sent} 条消息，用时 {elapsed:.2f} 秒，"
+                        f"{sent / elapsed if elapsed > 0 else 0:.0f} 条/秒")
+
+    # ---------- REST ----------
+
+    def _throttled(self):
+        n = self.stats['rest_requests']
+        if self.throttle_every and n % self.throttle_every == 0:
+            return True
+        return self.throttle_rate > 0 and self.random.random() < self.throttle_rate
+
+    def _used_weight(self):
+        """模拟币安的X-MBX-USED-WEIGHT-1M响应头：本分钟内的请求数"""
+        window = int(time.time() // 60)
+        if window != self.weight_window:
+            self.weight_window, self.weight_used = window, 0
+        self.weight_used += 1
+        return self.weight_used
+
+    async def handle_rest(self, request):
+        self.stats['rest_requests'] += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+        headers = {'X-MBX-USED-WEIGHT-1M': str(self._used_weight())}
+        if self._throttled():
+            self.stats['rest_throttled'] += 1
+            headers['Retry-After'] = str(self.retry_after)
+            return web.json_response({'code': -1003, 'msg': 'Too many requests (replay)'}, status=429, headers=headers)
+
+        query = dict(request.query)
+        found = self.rest.match(request.method, request.path, query)
+        if found is None and self.upstream:
+            found = await self._proxy(request, query)
+        if found is None:
+            self.stats['rest_missing'] += 1
+            logger.warning(f"没有录制的响应: {request.path_qs}")
+            return web.json_response({'code': -1, 'msg': f'no recording for {request.path}'}, status=404,
+                                     headers=headers)
+        status, body = found
+        return web.Response(text=body, status=status, content_type='application/json', headers=headers)
+
+    async def _proxy(self, request, query):
+        """转发到真实接口并录制响应（429不录制）"""
+        if self.client is None:
+            self.client = ClientSession()
+        async with self.client.get(f"{self.upstream}{request.path}", params=query) as response:
+            body = await response.text()
+            status = response.status
+        self.stats['rest_proxied'] += 1
+        if status == 429:
+            return status, body
+        self.rest.record(request.method, request.path, query, status, body)
+        return status, body
+
+    # ---------- Webhook ----------
+
+    async def handle_webhook(self, request):
+        body = await request.text()
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = body
+        record = {'time': time.time(), 'path': request.path, 'payload': payload}
+        self.webhooks.append(record)
+        self.stats['webhooks'] += 1
+        if self.capture:
+            with open(self.capture, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return web.json_response({'code': 0, 'msg': 'success'})
+
+    async def handle_webhooks(self, request):
+        return web.json_response(self.webhooks, dumps=lambda obj: json.dumps(obj, ensure_ascii=False))
+
+    async def handle_stats(self, request):
+        return web.json_response(dict(self.stats, speed=self.speed or 'max', frames_loaded=len(self.frames)))
+
+
+def parse_speed(value):
+    """'1'、'10'、'max' -> 倍速，最快速度为0"""
+    if value == 'max':
+        return 0.0
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("倍速必须大于0，或使用max")
+    return speed
+
+
+def record_frames(url, streams, output, seconds=None, count=None):
+    """订阅组合流，把收到的消息和接收时间写入JSON Lines文件"""
+    import websocket  # websocket-client，与ws_shards.py相同
+    ws = websocket.create_connection(f"{url}?streams={'/'.join(streams)}", timeout=10)
+    deadline = time.time() + seconds if seconds else None
+    recorded = 0
+    try:
+        with open(output, 'a', encoding='utf-8') as f:
+            while (deadline is None or time.time() < deadline) and (count is None or recorded < count):
+                try:
+                    frame = ws.recv()
+                except websocket.WebSocketTimeoutException:
+                    continue
+                f.write(json.dumps({'t': int(time.time() * 1000), 'frame': frame}) + '\n')
+                recorded += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ws.close()
+    logger.info(f"已录制 {recorded} 条消息到 {output}")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="币安/飞书/CoinGecko 本地回放服务")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record = commands.add_parser('record', help="录制WebSocket消息")
+    record.add_argument('--url', default=RECORD_URL, help="组合流地址")
+    record.add_argument('--streams', required=True, help="逗号分隔的stream，如 btcusdt@kline_1h,btcusdt@aggTrade")
+    record.add_argument('--seconds', type=float, help="录制时长（秒）")
+    record.add_argument('--count', type=int, help="录制消息数")
+    record.add_argument('-o', '--output', default='frames.jsonl')
+
+    serve = commands.add_parser('serve', help="启动回放服务")
+    serve.add_argument('--host', default=DEFAULT_HOST)
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.add_argument('--frames', help="录制的WebSocket消息文件")
+    serve.add_argument('--speed', type=parse_speed, default=1.0, help="回放倍速：1、10或max")
+    serve.add_argument('--repeat', type=int, default=1, help="每个连接回放的轮数")
+    serve.add_argument('--rest', help="录制的REST响应文件（--upstream时新录制的响应也追加到这里）")
+    serve.add_argument('--upstream', help="未录制的REST请求转发到该地址并录制，如 https://fapi.binance.com")
+    serve.add_argument('--latency', type=float, default=0.0, help="REST响应延迟（毫秒）")
+    serve.add_argument('--jitter', type=float, default=0.0, help="REST延迟的随机抖动（毫秒）")
+    serve.add_argument('--throttle-every', type=int, default=0, help="每N个REST请求返回一次429")
+    serve.add_argument('--throttle-rate', type=float, default=0.0, help="REST请求随机返回429的比例")
+    serve.add_argument('--retry-after', type=int, default=1, help="429响应的Retry-After（秒）")
+    serve.add_argument('--capture', help="收到的Webhook追加写入该JSON Lines文件")
+    serve.add_argument('--seed', type=int, default=0, help="延迟抖动和随机429的随机种子")
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        streams = [s.strip() for s in args.streams.split(',') if s.strip()]
+        record_frames(args.url, streams, args.output, seconds=args.seconds, count=args.count)
+        return
+
+    frames = load_frames(args.frames) if args.frames else []
+    logger.info(f"已加载 {len(frames)} 条WebSocket消息，回放速度: {args.speed or '最快'}")
+    server = ReplayServer(frames, speed=args.speed, repeat=args.repeat, rest=RestRecordings(args.rest),
+                          upstream=args.upstream, latency=args.latency, jitter=args.jitter,
+                          throttle_every=args.throttle_every, throttle_rate=args.throttle_rate,
+                          retry_after=args.retry_after, capture=args.capture, seed=args.seed)
+    web.run_app(server.build_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ema_engine import HOUR_MS, IncrementalEMA, TimeframeAggregator
+from kline_store import KlineStore
+
+PERIOD = 21
+
+
+def make_bars(n, seed=0, start=1712016000000):
+    """生成n根1小时K线，开盘时间从UTC 0点开始"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = np.concatenate([[100.0], close[:-1]])
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.005, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.005, n))
+    volume = rng.uniform(1, 10, n)
+    timestamps = start + np.arange(n, dtype=np.int64) * HOUR_MS
+    return timestamps, open_, high, low, close, volume
+
+
+def pandas_ema(closes):
+    return pd.Series(closes).ewm(span=PERIOD, adjust=False).mean().to_numpy()
+
+
+def feed_pushes(ema, store, symbol, bars, skip_close=()):
+    """按on_message的顺序推送K线：每根先推一次未收盘价格，再推收盘；skip_close中的K线不推收盘"""
+    timestamps, open_, high, low, close, volume = bars
+    for i in range(len(timestamps)):
+        pushes = [((open_[i] + close[i]) / 2, False), (close[i], False)]
+        if i not in skip_close:
+            pushes.append((close[i], True))
+        for price, closed in pushes:
+            if store.update_bar(symbol, timestamps[i], open_[i], high[i], low[i], price, volume[i]):
+                ema.roll()
+            ema.update(price, closed=closed)
+
+
+def test_from_closes_matches_pandas():
+    closes = make_bars(60)[4]
+    ema = IncrementalEMA.from_closes(closes, period=PERIOD, last_closed=True)
+    assert ema.value == pytest.approx(pandas_ema(closes)[-1])
+    assert ema.count == len(closes)
+
+    # 最后一根未收盘：实时值含最后价格，prev_ema为倒数第二根的EMA
+    live = IncrementalEMA.from_closes(closes, period=PERIOD)
+    assert live.value == pytest.approx(pandas_ema(closes)[-1])
+    assert live.prev_ema == pytest.approx(pandas_ema(closes[:-1])[-1])
+    assert live.has_live
+
+
+def test_update_matches_pandas_bar_by_bar():
+    closes = make_bars(40, seed=1)[4]
+    ema = IncrementalEMA(PERIOD)
+    expected = pandas_ema(closes)
+    for i, close in enumerate(closes):
+        ema.update(close * 1.01)
+        assert ema.peek(close) == pytest.approx(expected[i])
+        assert ema.update(close, closed=True) == pytest.approx(expected[i])
+
+
+@pytest.mark.parametrize('missed', [[5], [12, 13], [29]])
+def test_missed_close_push_rolls_on_next_bar(missed):
+    """漏掉收盘推送后，下一根K线开盘时按最后价格补滚，EMA不会落后一根"""
+    bars = make_bars(30, seed=2)
+    store = KlineStore(capacity=300)
+    store.add_symbol('BTCUSDT')
+    ema = IncrementalEMA(PERIOD)
+    feed_pushes(ema, store, 'BTCUSDT', bars, skip_close=set(missed))
+    expected = pandas_ema(bars[4])[-1]
+    assert ema.value == pytest.approx(expected)
+    assert ema.count + int(ema.has_live) == len(bars[0])
+
+
+def resampled_ema(bars, rule):
+    timestamps, _, _, _, close, _ = bars
+    series = pd.Series(close, index=pd.to_datetime(timestamps, unit='ms'))
+    return pandas_ema(series.resample(rule, label='left', closed='left').last().to_numpy())
+
+
+@pytest.mark.parametrize('rule', ['3h', '4h'])
+def test_aggregator_matches_resample(rule):
+    bars = make_bars(120, seed=3)
+    aggregator = TimeframeAggregator.from_bars(rule, *bars, period=PERIOD, last_closed=True)
+    assert aggregator.ema.value == pytest.approx(resampled_ema(bars, rule)[-1])
+
+    # 逐根推送（最后一根未收盘）与一次性初始化结果一致
+    incremental = TimeframeAggregator(rule, period=PERIOD)
+    for i in range(len(bars[0])):
+        incremental.update(*(b[i] for b in bars), closed=i < len(bars[0]) - 1)
+    assert incremental.ema.value == pytest.approx(resampled_ema(bars, rule)[-1])
+
+
+def test_aggregator_missed_close_push():
+    bars = make_bars(60, seed=4)
+    aggregator = TimeframeAggregator('3h', period=PERIOD)
+    for i in range(len(bars[0])):
+        values = [b[i] for b in bars]
+        aggregator.update(*values, closed=False)
+        if i not in (8, 20):  # 周期最后一根1小时K线漏掉收盘推送
+            aggregator.update(*values, closed=True)
+    assert aggregator.ema.value == pytest.approx(resampled_ema(bars, '3h')[-1])
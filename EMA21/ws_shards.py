@@ -0,0 +1,216 @@
+import json
+import logging
+import queue
+import random
+import socket
+import ssl
+import threading
+import time
+
+import websocket
+
+logger = logging.getLogger(__name__)
+
+MAX_STREAMS_PER_CONNECTION = 200  # 币安合约单连接订阅的stream上限
+SHARD_QUEUE_SIZE = 10000          # 每个分片待处理消息队列长度
+STALL_TIMEOUT = 90                # 超过该秒数没有收到消息视为连接卡死
+
+
+class WebSocketShard:
+    """单个WebSocket分片
+
+    读取线程只负责收消息入队，处理线程负责解析和业务逻辑；
+    每个分片独立重连和退避，一个分片卡死不会影响其他分片。
+    """
+
+    def __init__(self, shard_id, url, symbols, streams, handler,
+                 queue_size=SHARD_QUEUE_SIZE, stall_timeout=STALL_TIMEOUT):
+        self.shard_id = shard_id
+        self.url = url
+        self.symbols = symbols
+        self.streams = streams
+        self.handler = handler
+        self.stall_timeout = stall_timeout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.ws = None
+        self.connected = False
+        self.last_message_time = 0.0
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.reconnects = 0
+        self._stop_event = threading.Event()
+        self._reader = None
+        self._worker = None
+
+    def start(self):
+        self._reader = threading.Thread(target=self._run_reader, name=f"ws-shard-{self.shard_id}-reader", daemon=True)
+        self._worker = threading.Thread(target=self._run_worker, name=f"ws-shard-{self.shard_id}-worker", daemon=True)
+        self._worker.start()
+        self._reader.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.ws is not None:
+            self.ws.close()
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def _on_open(self, ws):
+        self.connected = True
+        self.last_message_time = time.time()
+        subscribe_message = {
+            "method": "SUBSCRIBE",
+            "params": self.streams,
+            "id": self.shard_id + 1
+        }
+        ws.send(json.dumps(subscribe_message))
+        logger.info(f"分片 {self.shard_id}: 连接建立，已订阅 {len(self.symbols)} 个币种 ({len(self.streams)} 个stream)")
+
+    def _on_message(self, ws, message):
+        self.received += 1
+        self.last_message_time = time.time()
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+
+    def _on_error(self, ws, error):
+        logger.error(f"分片 {self.shard_id}: WebSocket错误: {error}")
+
+    def _on_close(self, ws, close_status_code, close_msg):
+        self.connected = False
+        logger.info(f"分片 {self.shard_id}: WebSocket连接关闭")
+
+    def _run_reader(self):
+        """读取线程：连接断开后按指数退避独立重连"""
+        attempt = 0
+        while not self._stop_event.is_set():
+            self.ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+                on_close=self._on_close
+            )
+            started = time.time()
+            try:
+                self.ws.run_forever(
+                    ping_interval=20,
+                    ping_timeout=10,
+                    sslopt={"cert_reqs": ssl.CERT_NONE},
+                    sockopt=((socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),)
+                )
+            except Exception as e:
+                logger.error(f"分片 {self.shard_id}: 连接异常: {e}")
+            self.connected = False
+
+            if self._stop_event.is_set():
+                break
+
+            # 连接稳定运行过一段时间后重置退避
+            if time.time() - started > 60:
+                attempt = 0
+            attempt += 1
+            self.reconnects += 1
+            wait_time = min(2 ** attempt, 60) + random.uniform(0, 1)
+            logger.warning(f"分片 {self.shard_id}: 连接断开，{wait_time:.1f}秒后重连 (第 {attempt} 次)")
+            self._stop_event.wait(wait_time)
+
+    def _run_worker(self):
+        """处理线程：依次处理队列中的消息"""
+        while True:
+            message = self.queue.get()
+            if message is None:
+                break
+            try:
+                self.handler(self.ws, message)
+            except Exception as e:
+                logger.error(f"分片 {self.shard_id}: 处理消息失败: {e}")
+            self.processed += 1
+
+    def check_stall(self, now=None):
+        """连接卡死时主动断开，由读取线程重连"""
+        now = now or time.time()
+        if self.connected and now - self.last_message_time > self.stall_timeout:
+            logger.warning(f"分片 {self.shard_id}: {now - self.last_message_time:.0f}秒未收到消息，强制重连")
+            self.connected = False
+            if self.ws is not None:
+                self.ws.close()
+            return True
+        return False
+
+    def stats(self):
+        return {
+            'shard': self.shard_id,
+            'symbols': len(self.symbols),
+            'connected': self.connected,
+            'received': self.received,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'backlog': self.queue.qsize(),
+            'reconnects': self.reconnects
+        }
+
+
+class ShardedSubscriber:
+    """多连接分片订阅管理器
+
+    按单连接stream上限把币种拆分到多个WebSocketShard，同一币种的所有stream
+    都在同一分片中，因此每个币种的状态只会被一个处理线程修改。
+    """
+
+    def __init__(self, url, symbols, handler, streams_for,
+                 max_streams=MAX_STREAMS_PER_CONNECTION, stall_timeout=STALL_TIMEOUT):
+        self.url = url
+        self.handler = handler
+        self.shards = []
+        self._stop_event = threading.Event()
+        self._watchdog = None
+
+        shard_symbols, shard_streams = [], []
+        for symbol in symbols:
+            streams = streams_for(symbol)
+            if shard_streams and len(shard_streams) + len(streams) > max_streams:
+                self._add_shard(shard_symbols, shard_streams, stall_timeout)
+                shard_symbols, shard_streams = [], []
+            shard_symbols.append(symbol)
+            shard_streams.extend(streams)
+        if shard_symbols:
+            self._add_shard(shard_symbols, shard_streams, stall_timeout)
+
+    def _add_shard(self, symbols, streams, stall_timeout):
+        shard = WebSocketShard(len(self.shards), self.url, symbols, streams, self.handler,
+                               stall_timeout=stall_timeout)
+        self.shards.append(shard)
+
+    def start(self):
+        logger.info(f"启动 {len(self.shards)} 个WebSocket分片")
+        for shard in self.shards:
+            shard.start()
+        self._watchdog = threading.Thread(target=self._run_watchdog, name="ws-shard-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self._stop_event.set()
+        for shard in self.shards:
+            shard.stop()
+
+    def _run_watchdog(self):
+        while not self._stop_event.wait(10):
+            now = time.time()
+            for shard in self.shards:
+                shard.check_stall(now)
+
+    def stats(self):
+        return [shard.stats() for shard in self.shards]
+
+    def log_stats(self):
+        stats = self.stats()
+        connected = sum(1 for s in stats if s['connected'])
+        received = sum(s['received'] for s in stats)
+        dropped = sum(s['dropped'] for s in stats)
+        backlog = sum(s['backlog'] for s in stats)
+        logger.info(f"分片状态: 已连接 {connected}/{len(stats)}，累计收到 {received}，丢弃 {dropped}，积压 {backlog}")
@@ -0,0 +1,208 @@
+# 基于asyncio的K线并发获取引擎：单连接池 + 按币安请求权重自适应限流
+import asyncio  # 异步IO
+import logging  # 用于日志记录
+import time  # 用于令牌桶计时
+
+from tqdm import tqdm  # 用于显示进度条
+
+try:
+    import aiohttp  # 异步HTTP客户端（可选依赖）
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+AIOHTTP_AVAILABLE = aiohttp is not None
+WEIGHT_LIMIT_1M = 2400  # 币安合约REST每分钟权重上限
+
+
+def kline_weight(limit):
+    """K线接口按limit计算的请求权重"""
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+class BannedError(Exception):
+    """IP被币安封禁（HTTP 418）"""
+
+
+class WeightLimiter:
+    """
+    按请求权重限流的令牌桶，并根据 X-MBX-USED-WEIGHT-1M 自适应调整并发
+
+    - 令牌按 预算/60 每秒匀速补充，每个请求消耗其权重
+    - 每次响应后用服务端报告的已用权重校准剩余令牌
+    - 已用权重超过预算的80%时并发减半，低于50%时逐步增加并发
+    - 遇到429按Retry-After暂停所有请求
+    """
+
+    def __init__(self, weight_limit=WEIGHT_LIMIT_1M, safety=0.9, max_concurrency=20, min_concurrency=2):
+        self.budget = weight_limit * safety
+        self.rate = self.budget / 60.0
+        self.tokens = self.budget
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = max_concurrency
+        self.in_flight = 0
+        self.used_weight = 0
+        self.throttled = 0  # 收到429的次数
+        self._condition = asyncio.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.budget, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, weight):
+        """等待权重令牌和并发名额"""
+        async with self._condition:
+            while True:
+                self._refill()
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.in_flight >= self.concurrency:
+                    wait = None
+                elif self.tokens >= weight:
+                    self.tokens -= weight
+                    self.in_flight += 1
+                    return
+                else:
+                    wait = (weight - self.tokens) / self.rate
+                try:
+                    await asyncio.wait_for(self._condition.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, used_weight=None, retry_after=None):
+        """请求结束：归还并发名额，并根据响应头调整令牌和并发"""
+        async with self._condition:
+            self.in_flight -= 1
+            if used_weight is not None:
+                self.used_weight = used_weight
+                self._refill()
+                self.tokens = min(self.tokens, max(self.budget - used_weight, 0))
+                usage = used_weight / self.budget
+                if usage > 0.8:
+                    self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+                elif usage < 0.5 and self.concurrency < self.max_concurrency:
+                    self.concurrency += 1
+            if retry_after is not None:
+                self.throttled += 1
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+                self.concurrency = self.min_concurrency
+            self._condition.notify_all()
+
+
+class AsyncKlineFetcher:
+    """使用单个aiohttp连接池并发获取所有交易对的K线"""
+
+    def __init__(self, base_url, weight_limit=WEIGHT_LIMIT_1M, max_concurrency=20, timeout=30, retries=5):
+        if not AIOHTTP_AVAILABLE:
+            raise RuntimeError("未安装aiohttp，无法使用异步获取模式")
+        self.base_url = base_url.rstrip('/')
+        self.weight_limit = weight_limit
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.requests = 0
+        self.limiter = None
+
+    async def fetch_klines(self, session, symbol, interval, start_ms, end_ms, limit):
+        """获取一段K线，返回接口原始列表"""
+        params = {
+            'symbol': symbol,
+            'interval': interval,
+            'startTime': start_ms,
+            'endTime': end_ms,
+            'limit': limit
+        }
+        weight = kline_weight(limit)
+        for attempt in range(self.retries):
+            await self.limiter.acquire(weight)
+            used_weight, retry_after, backoff = None, None, 0
+            try:
+                async with session.get(f"{self.base_url}/fapi/v1/klines", params=params) as response:
+                    self.requests += 1
+                    header = response.headers.get('X-MBX-USED-WEIGHT-1M')
+                    used_weight = int(header) if header and header.isdigit() else None
+                    if response.status == 418:
+                        raise BannedError(f"IP已被封禁，Retry-After={response.headers.get('Retry-After')}")
+                    if response.status == 429:
+                        retry_after = float(response.headers.get('Retry-After') or 2 ** attempt)
+                        logger.warning(f"{symbol} 请求过于频繁(429)，暂停 {retry_after:.0f} 秒")
+                        continue
+                    if response.status < 500:
+                        response.raise_for_status()
+                        return await response.json(content_type=None)
+                    logger.warning(f"{symbol} 服务器错误 {response.status} (尝试 {attempt + 1}/{self.retries})")
+                    backoff = 2 ** attempt
+            except aiohttp.ClientResponseError:
+                raise  # 429以外的4xx（参数错误、交易对不存在等）重试也不会成功
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"{symbol} 请求出错 (尝试 {attempt + 1}/{self.retries}): {e}")
+                backoff = 2 ** attempt
+            finally:
+                await self.limiter.release(used_weight, retry_after)
+            # 先归还并发名额再退避，一个出错的请求不会占住并发池
+            if backoff and attempt < self.retries - 1:
+                await asyncio.sleep(backoff)
+        raise RuntimeError(f"{symbol} {interval} K线获取失败，已达到最大重试次数")
+
+    async def fetch_symbol(self, session, symbol, plan):
+        """按请求计划获取一个交易对的所有K线，返回 {K线周期: 原始K线列表}"""
+        data = {}
+        for interval, start_ms, end_ms, limit in plan:
+            klines = await self.fetch_klines(session, symbol, interval, start_ms, end_ms, limit)
+            data.setdefault(interval, []).extend(klines)
+        return data
+
+    async def _run(self, symbols, plan):
+        self.limiter = WeightLimiter(self.weight_limit, max_concurrency=self.max_concurrency)
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, ssl=False)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        results, errors = {}, {}
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, auto_decompress=True) as session:
+            async def run_one(symbol):
+                try:
+                    symbol_plan = plan[symbol] if isinstance(plan, dict) else plan
+                    return symbol, await self.fetch_symbol(session, symbol, symbol_plan), None
+                except BannedError:
+                    raise
+                except Exception as e:
+                    return symbol, None, e
+
+            tasks = [asyncio.ensure_future(run_one(symbol)) for symbol in symbols]
+            try:
+                for future in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="Fetching klines"):
+                    symbol, data, error = await future
+                    if error is None:
+                        results[symbol] = data
+                    else:
+                        errors[symbol] = error
+            finally:
+                for task in tasks:
+                    task.cancel()
+        return results, errors
+
+    def fetch_all(self, symbols, plan):
+        """
+        并发获取所有交易对的K线
+
+        plan: [(K线周期, 起始毫秒, 结束毫秒, limit)]，所有交易对共用；
+              也可以是 {交易对: 计划}，为每个交易对单独指定（如只补取缓存缺失部分）
+        返回 (成功结果 {交易对: {K线周期: 原始K线列表}}, 失败 {交易对: 异常})
+        """
+        start = time.time()
+        results, errors = asyncio.run(self._run(symbols, plan))
+        logger.info(f"异步获取完成: {len(results)} 成功，{len(errors)} 失败，请求 {self.requests} 次，"
+                    f"耗时 {time.time() - start:.1f} 秒，最后已用权重 {self.limiter.used_weight}，"
+                    f"429次数 {self.limiter.throttled}")
+        return results, errors
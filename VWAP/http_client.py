@@ -0,0 +1,119 @@
+# 币安REST接口共享HTTP客户端：所有线程复用同一个连接池
+import threading  # 用于保护统计数据
+import time  # 用于统计请求耗时
+from collections import deque  # 用于保存最近的耗时样本
+
+import requests  # 用于发送HTTP请求
+import urllib3  # HTTP客户端
+from requests.adapters import HTTPAdapter  # 连接池适配器
+from urllib3.util.retry import Retry  # 用于定义重试策略
+
+
+class BinanceHttpClient:
+    """
+    线程安全的共享HTTP客户端
+
+    - 连接池大小与并发线程数一致，保持长连接，避免每次请求重新握手
+    - 默认带gzip压缩和超时
+    - 对429/5xx自动重试，指数退避，遇到Retry-After时按其等待
+    - 统计连接复用率和请求耗时
+    """
+
+    def __init__(self, base_url, pool_size=10, timeout=(5, 30), retries=5, backoff_factor=1,
+                 status_forcelist=(429, 500, 502, 503, 504, 520, 524)):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        retry = Retry(
+            total=retries,  # 总重试次数
+            read=retries,  # 读取超时重试次数
+            connect=retries,  # 连接超时重试次数
+            backoff_factor=backoff_factor,  # 重试间隔的增长因子
+            status_forcelist=status_forcelist,  # 需要重试的HTTP状态码
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,  # 遵循Retry-After
+        )
+        self.adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=retry, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.session.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+        })
+        self.session.verify = False  # 禁用SSL证书验证
+        urllib3.disable_warnings()  # 禁用urllib3的警告
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self._latencies = deque(maxlen=2000)
+
+    def get(self, path, params=None, timeout=None):
+        """发送GET请求，path可以是完整URL或以/开头的接口路径"""
+        url = path if path.startswith('http') else f"{self.base_url}{path}"
+        start = time.perf_counter()
+        try:
+            return self.session.get(url, params=params, timeout=timeout or self.timeout)
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.requests += 1
+                self.total_latency += elapsed
+                self.max_latency = max(self.max_latency, elapsed)
+                self._latencies.append(elapsed)
+
+    def get_json(self, path, params=None, timeout=None):
+        """发送GET请求并返回JSON，HTTP错误时抛出异常"""
+        response = self.get(path, params=params, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def connection_stats(self):
+        """连接池统计：新建连接数和底层请求数"""
+        new_connections = 0
+        pool_requests = 0
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():  # keys()在连接池容器内部加锁，可以安全遍历
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            new_connections += pool.num_connections
+            pool_requests += pool.num_requests
+        return new_connections, pool_requests
+
+    def stats(self):
+        """请求统计：请求数、错误数、连接复用率、平均/P95/最大耗时（秒）"""
+        new_connections, pool_requests = self.connection_stats()
+        with self._lock:
+            latencies = sorted(self._latencies)
+            requests_count = self.requests
+            average = self.total_latency / requests_count if requests_count else 0.0
+            p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0
+            return {
+                'requests': requests_count,
+                'errors': self.errors,
+                'new_connections': new_connections,
+                'reuse_ratio': 1 - new_connections / pool_requests if pool_requests else 0.0,
+                'avg_latency': average,
+                'p95_latency': p95,
+                'max_latency': self.max_latency,
+            }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client(base_url, pool_size=10):
+    """获取进程内共享的客户端（首次调用时创建）"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = BinanceHttpClient(base_url, pool_size=pool_size)
+        return _client
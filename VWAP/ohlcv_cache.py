@@ -0,0 +1,247 @@
+# 本地OHLCV缓存：每个交易对/K线周期一个NumPy文件，只保存已收盘K线，下次只补取缺失的尾部
+import os  # 用于文件操作
+import sys  # 用于命令行参数
+import threading  # 用于保护统计数据
+import time  # 用于判断K线是否收盘
+
+import numpy as np  # 用于存储K线
+
+OHLCV_DTYPE = np.dtype([
+    ('timestamp', 'i8'),
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('volume', 'f8'),
+])
+INTERVAL_MS = {'1h': 3600 * 1000, '1d': 24 * 3600 * 1000}
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ohlcv_cache')
+
+
+def klines_to_array(klines):
+    """把K线接口返回的原始列表转换为结构化数组"""
+    arr = np.empty(len(klines), dtype=OHLCV_DTYPE)
+    for i, k in enumerate(klines):
+        arr[i] = (int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]))
+    return arr
+
+
+def merge_arrays(*arrays):
+    """合并多段K线，按时间排序去重（后出现的覆盖先出现的）"""
+    arrays = [a for a in arrays if a is not None and len(a)]
+    if not arrays:
+        return np.empty(0, dtype=OHLCV_DTYPE)
+    merged = np.concatenate(arrays)
+    # 反转后取首次出现，保留最后写入的版本
+    reversed_ts = merged['timestamp'][::-1]
+    _, first = np.unique(reversed_ts, return_index=True)
+    return merged[::-1][first]
+
+
+class OHLCVCache:
+    """
+    按 交易对/K线周期 存储的本地K线缓存
+
+    - 文件为 .npy 结构化数组，读取时使用内存映射
+    - 只保存已收盘K线，未收盘K线每次都从接口获取
+    - plan() 根据已缓存的最后一根收盘K线算出需要补取的尾部区间
+    - 完整获取过的区间起点记录在 .from 文件中：上市晚于区间起点的交易对，
+      接口在第一根K线之前没有数据，该起点之后也算已覆盖，不会每次都重新完整获取
+    - combine() 合并缓存和新获取的K线，并把新的已收盘K线写回缓存
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0          # 只需补取尾部的区间数
+        self.misses = 0        # 需要完整获取的区间数
+        self.bars_cached = 0   # 从缓存读取的K线数
+        self.bars_fetched = 0  # 从接口获取的K线数
+
+    def path(self, symbol, interval):
+        return os.path.join(self.root, f"{symbol}_{interval}.npy")
+
+    def from_path(self, symbol, interval):
+        return os.path.join(self.root, f"{symbol}_{interval}.from")
+
+    def covered_from(self, symbol, interval, cached=None):
+        """缓存覆盖的起点（毫秒）：记录的完整获取起点和第一根缓存K线中较早的一个，没有缓存时返回None"""
+        if cached is None:
+            cached = self.load(symbol, interval)
+        if cached is None or not len(cached):
+            return None
+        start = int(cached['timestamp'][0])
+        try:
+            with open(self.from_path(symbol, interval)) as f:
+                start = min(start, int(f.read()))
+        except (OSError, ValueError):
+            pass
+        return start
+
+    def save_covered_from(self, symbol, interval, start_ms):
+        path = self.from_path(symbol, interval)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(int(start_ms)))
+        os.replace(tmp_path, path)
+
+    def load(self, symbol, interval, mmap=True):
+        """读取缓存（默认内存映射），不存在时返回None"""
+        path = self.path(symbol, interval)
+        if not os.path.exists(path):
+            return None
+        try:
+            return np.load(path, mmap_mode='r' if mmap else None)
+        except (ValueError, OSError):
+            return None  # 文件损坏时当作未缓存
+
+    def save(self, symbol, interval, arr):
+        """原子写入缓存文件"""
+        path = self.path(symbol, interval)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(arr, dtype=OHLCV_DTYPE))
+        os.replace(tmp_path, path)
+
+    def plan(self, symbol, plan):
+        """
+        根据缓存缩小请求计划
+
+        plan: [(K线周期, 起始毫秒, 结束毫秒, limit)]
+        缓存覆盖区间起点时只请求最后一根已缓存K线之后的部分，否则请求完整区间。
+        """
+        tail_plan = []
+        for interval, start_ms, end_ms, limit in plan:
+            cached = self.load(symbol, interval)
+            step = INTERVAL_MS[interval]
+            covered_from = self.covered_from(symbol, interval, cached)
+            if covered_from is not None and covered_from <= start_ms:
+                fetch_start = max(start_ms, int(cached['timestamp'][-1]) + step)
+                with self._lock:
+                    self.hits += 1
+            else:
+                fetch_start = start_ms
+                with self._lock:
+                    self.misses += 1
+            if fetch_start <= end_ms:
+                tail_plan.append((interval, fetch_start, end_ms, (end_ms - fetch_start) // step + 1))
+        return tail_plan
+
+    def combine(self, symbol, plan, fetched, now_ms=None):
+        """
+        合并缓存和新获取的K线，返回 {K线周期: 覆盖原计划区间的结构化数组}
+
+        fetched: {K线周期: 新获取的原始K线列表或结构化数组}
+        """
+        now_ms = now_ms or int(time.time() * 1000)
+        ranges = {}
+        for interval, start_ms, end_ms, _ in plan:
+            lo, hi = ranges.get(interval, (start_ms, end_ms))
+            ranges[interval] = (min(lo, start_ms), max(hi, end_ms))
+
+        result = {}
+        for interval, (start_ms, end_ms) in ranges.items():
+            step = INTERVAL_MS[interval]
+            new = fetched.get(interval)
+            if new is not None and not isinstance(new, np.ndarray):
+                new = klines_to_array(new)
+            # 有新数据时会替换缓存文件，此时不使用内存映射，避免替换时文件仍被映射
+            cached = self.load(symbol, interval, mmap=new is None or not len(new))
+            covered_from = self.covered_from(symbol, interval, cached)
+            merged = merge_arrays(cached, new)
+
+            # 只把已收盘K线写回缓存
+            closed = merged[merged['timestamp'] + step <= now_ms]
+            if new is not None and len(new) and (cached is None or len(closed) != len(cached)):
+                self.save(symbol, interval, closed)
+            # 缓存未覆盖起点时plan()请求的是完整区间，接口在第一根K线之前没有数据（如新上市），
+            # 记录区间起点，下次不再当作未命中
+            if new is not None and len(new) and len(closed) and (covered_from is None or covered_from > start_ms):
+                self.save_covered_from(symbol, interval, start_ms)
+
+            mask = (merged['timestamp'] >= start_ms) & (merged['timestamp'] <= end_ms)
+            window = merged[mask]
+            n_new = 0 if new is None else len(new)
+            with self._lock:
+                self.bars_fetched += n_new
+                self.bars_cached += max(len(window) - n_new, 0)
+            result[interval] = window
+        return result
+
+    def stats(self):
+        """缓存统计：命中/未命中区间数、K线来源、文件数和占用空间"""
+        files = [f for f in os.listdir(self.root) if f.endswith('.npy')]
+        size = sum(os.path.getsize(os.path.join(self.root, f)) for f in files)
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+                'bars_cached': self.bars_cached,
+                'bars_fetched': self.bars_fetched,
+                'files': len(files),
+                'size_bytes': size,
+            }
+
+    def compact(self, retain_days=800, max_idle_days=30):
+        """
+        整理缓存
+
+        - 排序去重，删除早于retain_days的K线
+        - 删除超过max_idle_days未更新的文件（如已下架的交易对）
+        返回 (整理的文件数, 删除的文件数)
+        """
+        now = time.time()
+        cutoff_ms = int((now - retain_days * 86400) * 1000)
+        compacted, removed = 0, 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith('.tmp'):
+                os.remove(path)
+                continue
+            if not name.endswith('.npy'):
+                continue
+            symbol, interval = name[:-4].rsplit('_', 1)
+            from_path = self.from_path(symbol, interval)
+            if now - os.path.getmtime(path) > max_idle_days * 86400:
+                os.remove(path)
+                if os.path.exists(from_path):
+                    os.remove(from_path)
+                removed += 1
+                continue
+            try:
+                arr = np.load(path)
+            except (ValueError, OSError):
+                os.remove(path)
+                removed += 1
+                continue
+            arr = merge_arrays(arr)
+            kept = arr['timestamp'] >= cutoff_ms
+            if not kept.all() and os.path.exists(from_path):
+                os.remove(from_path)  # 删除了较早的K线，记录的覆盖起点不再成立
+            arr = arr[kept]
+            if len(arr) == 0:
+                os.remove(path)
+                removed += 1
+                continue
+            self.save(symbol, interval, arr)
+            compacted += 1
+        return compacted, removed
+
+
+def main():
+    """命令行: python ohlcv_cache.py [stats|compact] [缓存目录]"""
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    root = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_CACHE_DIR
+    cache = OHLCVCache(root)
+    if command == 'compact':
+        compacted, removed = cache.compact()
+        print(f"已整理 {compacted} 个文件，删除 {removed} 个文件")
+    stats = cache.stats()
+    print(f"缓存目录: {root}，文件 {stats['files']} 个，占用 {stats['size_bytes'] / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import numpy as np
+
+from ohlcv_cache import INTERVAL_MS, OHLCVCache
+
+HOUR = INTERVAL_MS['1h']
+START = 1735689600000  # 2025-01-01 00:00 UTC
+
+
+def klines(first, last):
+    """[first, last] 内每小时一根的原始K线"""
+    return [[t, '1', '2', '0.5', '1.5', '10'] for t in range(first, last + 1, HOUR)]
+
+
+def fetch(cache, symbol, plan, listed_at, now_ms):
+    """模拟接口：只返回上市时间之后的K线"""
+    fetched = {}
+    for interval, start_ms, end_ms, _ in cache.plan(symbol, plan):
+        fetched.setdefault(interval, []).extend(klines(max(start_ms, listed_at), end_ms))
+    return cache.combine(symbol, plan, fetched, now_ms=now_ms)
+
+
+def test_listed_after_window_start_is_cached(tmp_path):
+    cache = OHLCVCache(str(tmp_path))
+    end = START + 100 * HOUR
+    plan = [('1h', START, end, 101)]
+    listed_at = START + 40 * HOUR
+
+    first = fetch(cache, 'NEWUSDT', plan, listed_at, now_ms=end + HOUR)
+    assert first['1h']['timestamp'][0] == listed_at
+    assert cache.misses == 1
+
+    # 第二次只补取尾部：第一根K线晚于区间起点也算命中
+    later_end = end + 5 * HOUR
+    later_plan = [('1h', START + 5 * HOUR, later_end, 101)]
+    assert cache.plan('NEWUSDT', later_plan) == [('1h', end + HOUR, later_end, 5)]
+    second = fetch(cache, 'NEWUSDT', later_plan, listed_at, now_ms=later_end + HOUR)
+    assert cache.hits == 2 and cache.misses == 1
+    assert np.array_equal(second['1h']['timestamp'], np.arange(listed_at, later_end + 1, HOUR))
+
+    # 请求更早的区间起点时，记录的覆盖起点不成立，需要完整获取
+    earlier_plan = [('1h', START - 10 * HOUR, later_end, 200)]
+    assert cache.plan('NEWUSDT', earlier_plan)[0][1] == START - 10 * HOUR
+
+
+def test_compact_drops_coverage_when_old_bars_are_removed(tmp_path):
+    cache = OHLCVCache(str(tmp_path))
+    now_ms = START + 200 * HOUR
+    plan = [('1h', START, now_ms - HOUR, 200)]
+    fetch(cache, 'NEWUSDT', plan, START + 10 * HOUR, now_ms=now_ms)
+    assert cache.covered_from('NEWUSDT', '1h') == START
+
+    retain_days = (np.datetime64('now', 'ms').astype(np.int64) - (START + 100 * HOUR)) / 86400000
+    cache.compact(retain_days=retain_days, max_idle_days=10 ** 6)
+    assert cache.covered_from('NEWUSDT', '1h') == int(cache.load('NEWUSDT', '1h')['timestamp'][0])
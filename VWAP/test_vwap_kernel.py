@@ -0,0 +1,84 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import vwap_volatility_strategy as strategy
+from vwap_kernel import batch_vwap_bands, segment_offsets
+
+
+def random_frame(rng, start, periods, freq):
+    """以UTC时间为索引的随机K线，与frame_from_array的格式一致"""
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, periods)))
+    spread = rng.uniform(0, 0.02, periods)
+    df = pd.DataFrame({
+        'open': close * (1 + rng.normal(0, 0.005, periods)),
+        'high': close * (1 + spread),
+        'low': close * (1 - spread),
+        'close': close,
+        'volume': rng.uniform(0, 1000, periods),
+    }, index=pd.date_range(start, periods=periods, freq=freq, tz='UTC', unit='ms'))
+    df.index.name = 'timestamp'
+    return df
+
+
+def reference_bands(df):
+    vwap, stdev = strategy.calculate_vwap(df.copy())
+    vah, val = strategy.calculate_vah_val(df.assign(vwap=vwap), stdev)
+    return vwap, stdev, vah, val
+
+
+def test_batch_vwap_bands_matches_reference():
+    rng = np.random.default_rng(0)
+    lengths = [1, 5, 0, 200, 37, 0, 2]
+    frames = [random_frame(rng, '2024-01-01', n, 'h') for n in lengths]
+    hlc3 = np.concatenate([((df['high'] + df['low'] + df['close']) / 3).to_numpy() for df in frames])
+    volume = np.concatenate([df['volume'].to_numpy() for df in frames])
+
+    bands = batch_vwap_bands(hlc3, volume, segment_offsets(lengths))
+    assert len(bands) == len(lengths)
+    for df, band in zip(frames, bands):
+        if df.empty:
+            assert np.isnan(band['vwap'])
+            continue
+        vwap, stdev, vah, val = reference_bands(df)
+        assert np.allclose([band['vwap'], band['stdev'], band['vah'], band['val']], [vwap, stdev, vah, val])
+
+
+def test_batch_vwap_bands_rejects_bad_offsets():
+    with pytest.raises(ValueError):
+        batch_vwap_bands(np.ones(3), np.ones(3), np.array([0, 2]))
+
+
+@pytest.mark.parametrize('now', [
+    datetime(2025, 4, 1, 0, 30, tzinfo=timezone.utc),    # 月初、季初
+    datetime(2025, 3, 17, 0, 5, tzinfo=timezone.utc),    # 周一
+    datetime(2025, 2, 12, 13, 45, 7, 123456, tzinfo=timezone.utc),
+])
+def test_batch_metrics_matches_reference(now):
+    rng = np.random.default_rng(1)
+    windows = strategy.build_windows(now)
+    end = pd.Timestamp(now).floor('h')
+    data_by_symbol = {}
+    for i in range(5):
+        hours = 24 * 100 - 7 * i  # 不同交易对的历史长度不同，部分窗口不完整
+        days = 800 - 150 * i
+        data_by_symbol[f"S{i}USDT"] = {
+            '1h': random_frame(rng, end - pd.Timedelta(hours=hours - 1), hours, 'h'),
+            '1d': random_frame(rng, end.floor('D') - pd.Timedelta(days=days - 1), days, 'D'),
+        }
+
+    batch = strategy.batch_metrics(data_by_symbol, windows, now)
+    compared = 0
+    for symbol, data in data_by_symbol.items():
+        expected = strategy.metrics_from_data_reference(data, windows, now)
+        for actual_metrics, expected_metrics in zip(batch[symbol], expected):
+            assert actual_metrics.keys() == expected_metrics.keys()
+            for period, metrics in expected_metrics.items():
+                actual = actual_metrics[period]
+                assert actual['is_new_period'] == metrics['is_new_period']
+                assert np.allclose([actual[k] for k in ('vwap', 'vah', 'val')],
+                                   [metrics[k] for k in ('vwap', 'vah', 'val')], equal_nan=True)
+                compared += 1
+    assert compared >= len(data_by_symbol) * len(strategy.PERIOD_INTERVALS)
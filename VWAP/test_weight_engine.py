@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+import vwap_volatility_strategy as strategy
+import weight_engine
+
+
+def random_metrics(rng, price):
+    """随机生成一个交易对的指标，包含缺失周期、NaN价位、价格正好落在价位上和波动收敛的情况"""
+    metrics = {}
+    for period in weight_engine.PERIODS:
+        if rng.random() < 0.1:
+            continue  # 缺失的周期
+        vwap = price * rng.choice([1.0, rng.uniform(0.8, 1.2)])
+        width = price * rng.choice([0.002, rng.uniform(0.01, 0.2)])
+        levels = {'val': vwap - width, 'vwap': vwap, 'vah': vwap + width}
+        boundary = rng.random()
+        if boundary < 0.1:
+            levels['val'] = price  # 价格正好等于VAL
+        elif boundary < 0.2:
+            levels['vah'] = price  # 价格正好等于VAH
+        elif boundary < 0.25:
+            levels[rng.choice(list(levels))] = np.nan
+        metrics[period] = levels
+    return metrics
+
+
+def generate(n, seed):
+    rng = np.random.default_rng(seed)
+    prices = rng.choice([1.0, 10.0, 100.0], n) * rng.uniform(0.5, 2, n)
+    current = [random_metrics(rng, price) for price in prices]
+    previous = [random_metrics(rng, price * rng.uniform(0.7, 1.3)) for price in prices]
+    return prices, current, previous
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_score_matches_calculate_weight(seed):
+    prices, current, previous = generate(500, seed)
+    weights = weight_engine.score(weight_engine.bands_from_metrics(current),
+                                  weight_engine.bands_from_metrics(previous), prices)
+    for i, price in enumerate(prices):
+        expected = strategy.calculate_weight(None, current[i], previous[i], price)
+        assert tuple(weights[i]) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('top', [1, 10, 100, 1000])
+def test_rank_results_matches_sorted_reference(top):
+    prices, current, previous = generate(400, seed=7)
+    results = [strategy.build_result(f"S{i}USDT", price, current[i], previous[i]) for i, price in enumerate(prices)]
+    ranked = strategy.rank_results([dict(result) for result in results], top=top)
+
+    # 原实现：逐个计算权重后按总权重稳定降序排序
+    totals = [strategy.calculate_weight(r['symbol'], r['current_metrics'], r['previous_metrics'],
+                                        r['current_price'])[2] for r in results]
+    expected = [results[i]['symbol'] for i in sorted(range(len(results)), key=lambda i: totals[i], reverse=True)]
+    assert len(set(totals)) < len(totals)  # 存在并列的总权重
+    assert [r['symbol'] for r in ranked] == expected[:top]
+
+
+def test_top_k_keeps_original_order_for_ties():
+    values = np.array([3.0, 5.0, 3.0, 5.0, 1.0, 3.0, 3.0])
+    assert list(weight_engine.top_k(values, 3)) == [1, 3, 0]
+    assert list(weight_engine.top_k(values, 4)) == [1, 3, 0, 2]
+    assert list(weight_engine.top_k(values, 10)) == [1, 3, 0, 2, 5, 6, 4]
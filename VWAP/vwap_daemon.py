@@ -0,0 +1,467 @@
+# VWAP常驻扫描：启动时用REST补齐历史，之后由K线WebSocket在每根K线收盘时增量更新累加量，随时可重新排名
+import json  # 用于解析WebSocket消息
+import logging  # 用于日志记录
+import os  # 用于读取环境变量
+import signal  # 用于按需触发排名
+import threading  # 用于WebSocket连接线程
+import time  # 用于时间相关操作
+import traceback  # 用于异常追踪
+from datetime import datetime, timezone  # 用于处理日期和时间
+
+import numpy as np  # 用于数值计算
+import pandas as pd  # 用于处理K线数据
+
+try:
+    import websocket  # websocket-client（可选依赖，仅常驻模式需要）
+except ImportError:
+    websocket = None
+
+import weight_engine  # 表驱动的批量权重计算
+import vwap_volatility_strategy as strategy  # 复用单次扫描的获取和筛选逻辑
+from vwap_kernel import bands_from_sums  # 由累加量计算VWAP带
+
+logger = logging.getLogger(__name__)
+
+WS_URL = os.environ.get('BINANCE_WS_URL', "wss://fstream.binance.com") + "/stream"
+MAX_STREAMS_PER_CONNECTION = 200  # 币安合约单连接订阅的stream上限
+RANK_DELAY = 2.0  # 收到收盘K线后等待的秒数，让同一时刻收盘的其他交易对也到齐后再排名
+SEND_TO_FEISHU = True  # 每次收盘排名后是否发送到飞书
+RESEED_INTERVAL = 24 * 3600  # 定期用REST重新补齐一次，修正漏掉的消息
+GAP_RETRY_BASE = 5  # 补齐漏掉K线的交易对失败后的首次重试间隔（秒），之后每次翻倍
+GAP_RETRY_MAX = 600  # 重试间隔上限（秒）
+GAP_MAX_ATTEMPTS = 6  # 连续失败该次数后放弃补齐，该交易对不再参与排名，直到下次定期补齐成功
+
+PERIODS = weight_engine.PERIODS
+INTERVALS = tuple(sorted(set(strategy.PERIOD_INTERVALS.values())))
+EPOCH = pd.Timestamp(0, tz='UTC')
+
+
+def to_datetime(ms):
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+
+def period_start_ms(ms, period):
+    """毫秒时间戳所在周期的起点（与is_new_period的周期边界一致）"""
+    return int(strategy.period_start(to_datetime(ms), period).timestamp() * 1000)
+
+
+def previous_period_start_ms(ms, period):
+    return int(strategy.previous_period_start(to_datetime(ms), period).timestamp() * 1000)
+
+
+class VWAPAccumulators:
+    """
+    所有交易对 × 周期 的锚定VWAP累加量 Σv、Σ(v·p)、Σ(v·p²)
+
+    - 只累加已收盘K线；未收盘K线单独保存，排名时临时加上，与单次扫描的窗口一致
+    - 收到新周期的第一根收盘K线时，当前累加量转为上一周期，并清零重新累加
+    - 周期已切换但还没收到新K线的交易对，在bands()中按切换后的状态计算
+    """
+
+    def __init__(self, symbols):
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.period_interval = np.array([INTERVALS.index(strategy.PERIOD_INTERVALS[p]) for p in PERIODS])
+        n, n_periods = len(self.symbols), len(PERIODS)
+        self.sums = np.zeros((n, n_periods, 3))       # 当前周期
+        self.prev_sums = np.zeros((n, n_periods, 3))  # 上一周期
+        self.start = np.zeros((n, n_periods), dtype=np.int64)  # 当前累加量所属周期的起点
+        self.live = np.full((n, len(INTERVALS), 3), np.nan)    # 未收盘K线 (开盘时间, hlc3, 成交量)
+        self.last_closed = np.zeros((n, len(INTERVALS)), dtype=np.int64)  # 最后一根收盘K线的开盘时间
+        self.price = np.full(n, np.nan)
+        self.gaps = set()  # 检测到漏掉K线、需要重新补齐的交易对
+        self.dropped = set()  # 补齐多次失败、累加量不可信的交易对，不参与排名
+        self.pending = {}  # 正在后台补齐的交易对 -> 补齐期间收到的收盘K线，补齐后重放
+        self.closed_bars = 0
+        self._lock = threading.Lock()
+
+    def seed(self, symbol, data, now_ms):
+        """
+        用REST获取的K线初始化一个交易对
+
+        data: {K线周期: DataFrame}，需覆盖上一周期起点到现在
+        """
+        i = self.index[symbol]
+        sums = np.zeros((len(PERIODS), 3))
+        prev_sums = np.zeros((len(PERIODS), 3))
+        start = np.zeros(len(PERIODS), dtype=np.int64)
+        live = np.full((len(INTERVALS), 3), np.nan)
+        last_closed = np.zeros(len(INTERVALS), dtype=np.int64)
+        price = np.nan
+
+        for k, interval in enumerate(INTERVALS):
+            df = data.get(interval)
+            if df is None or df.empty:
+                continue
+            step = strategy.INTERVAL_MS[interval]
+            ts = np.asarray((df.index - EPOCH) // pd.Timedelta(milliseconds=1), dtype=np.int64)
+            hlc3 = (df['high'].to_numpy() + df['low'].to_numpy() + df['close'].to_numpy()) / 3
+            volume = df['volume'].to_numpy()
+            closed = ts + step <= now_ms
+            price = float(df['close'].iloc[-1])
+            if not closed[-1]:
+                live[k] = (ts[-1], hlc3[-1], volume[-1])
+            if closed.any():
+                last_closed[k] = ts[closed][-1]
+            for j in np.flatnonzero(self.period_interval == k):
+                current_start = period_start_ms(now_ms, PERIODS[j])
+                previous_start = previous_period_start_ms(now_ms, PERIODS[j])
+                cur = closed & (ts >= current_start)
+                prev = (ts >= previous_start) & (ts < current_start)
+                sums[j] = accumulate(hlc3[cur], volume[cur])
+                prev_sums[j] = accumulate(hlc3[prev], volume[prev])
+                start[j] = current_start
+
+        with self._lock:
+            self.sums[i] = sums
+            self.prev_sums[i] = prev_sums
+            self.start[i] = start
+            self.live[i] = live
+            self.last_closed[i] = last_closed
+            if not np.isnan(price):
+                self.price[i] = price
+            self.gaps.discard(symbol)
+            self.dropped.discard(symbol)
+            # REST获取期间由WebSocket收到的收盘K线不在获取结果中，按顺序重放（已包含的会被去重）
+            for bar in self.pending.pop(symbol, ()):
+                self._update(*bar)
+
+    def begin_seed(self, symbols):
+        """开始补齐：记录之后收到的收盘K线，补齐完成后重放"""
+        with self._lock:
+            for symbol in symbols:
+                self.pending.setdefault(symbol, [])
+
+    def end_seed(self, symbols):
+        """补齐结束，丢弃没有获取到数据的交易对的记录"""
+        with self._lock:
+            for symbol in symbols:
+                self.pending.pop(symbol, None)
+
+    def pending_gaps(self):
+        with self._lock:
+            return set(self.gaps)
+
+    def drop(self, symbol):
+        """放弃补齐：不再重试，排名时跳过该交易对"""
+        with self._lock:
+            self.gaps.discard(symbol)
+            self.dropped.add(symbol)
+
+    def update(self, symbol, interval, open_time, high, low, close, volume, closed):
+        """处理一条K线推送，收盘K线返回True"""
+        if symbol not in self.index or interval not in INTERVALS:
+            return False
+        with self._lock:
+            if closed and symbol in self.pending:
+                self.pending[symbol].append((symbol, interval, open_time, high, low, close, volume, closed))
+            return self._update(symbol, interval, open_time, high, low, close, volume, closed)
+
+    def _update(self, symbol, interval, open_time, high, low, close, volume, closed):
+        """update的实现，调用方持有锁"""
+        i = self.index[symbol]
+        k = INTERVALS.index(interval)
+        hlc3 = (high + low + close) / 3
+        self.price[i] = close
+        if not closed:
+            self.live[i, k] = (open_time, hlc3, volume)
+            return False
+        if open_time <= self.last_closed[i, k]:
+            return False  # 重连后重复推送的K线
+        step = strategy.INTERVAL_MS[interval]
+        if self.last_closed[i, k] and open_time > self.last_closed[i, k] + step and symbol not in self.dropped:
+            self.gaps.add(symbol)  # 中间漏掉了K线，累加量需要重新补齐
+        self.last_closed[i, k] = open_time
+        if self.live[i, k, 0] == open_time:
+            self.live[i, k] = np.nan
+
+        for j in np.flatnonzero(self.period_interval == k):
+            start = period_start_ms(open_time, PERIODS[j])
+            if start > self.start[i, j]:
+                # 新周期的第一根K线：当前累加量转为上一周期
+                if previous_period_start_ms(open_time, PERIODS[j]) == self.start[i, j]:
+                    self.prev_sums[i, j] = self.sums[i, j]
+                else:
+                    self.prev_sums[i, j] = 0
+                self.sums[i, j] = 0
+                self.start[i, j] = start
+            if start == self.start[i, j]:
+                self.sums[i, j] += (volume, volume * hlc3, volume * hlc3 * hlc3)
+        self.closed_bars += 1
+        return True
+
+    def bands(self, now_ms=None):
+        """
+        计算所有交易对的当前/上一周期VWAP带
+
+        返回 (current_bands, previous_bands, prices)，
+        bands形状为 (交易对数, 周期数, 价位数)，价位顺序同weight_engine.LEVELS
+        """
+        now_ms = now_ms or int(time.time() * 1000)
+        current_start = np.array([period_start_ms(now_ms, p) for p in PERIODS])
+        previous_start = np.array([previous_period_start_ms(now_ms, p) for p in PERIODS])
+        with self._lock:
+            sums = self.sums.copy()
+            prev_sums = self.prev_sums.copy()
+            start = self.start.copy()
+            live = self.live[:, self.period_interval].copy()
+            prices = self.price.copy()
+            prices[[self.index[symbol] for symbol in self.dropped]] = np.nan  # 不参与排名
+
+        # 周期已切换但该交易对还没收到新周期的收盘K线
+        stale = (start < current_start)[..., None]
+        rolled = (start == previous_start)[..., None]
+        prev_sums = np.where(stale, np.where(rolled, sums, 0), prev_sums)
+        sums = np.where(stale, 0, sums)
+
+        # 加上未收盘K线
+        open_time, hlc3, volume = live[..., 0], live[..., 1], live[..., 2]
+        include = (open_time >= current_start)[..., None]  # NaN比较结果为False
+        sums = sums + np.where(include, np.stack([volume, volume * hlc3, volume * hlc3 * hlc3], axis=-1), 0)
+
+        return to_levels(bands_from_sums(*np.moveaxis(sums, -1, 0))), \
+            to_levels(bands_from_sums(*np.moveaxis(prev_sums, -1, 0))), prices
+
+    def rank(self, table=None, top=strategy.TOP_N, now_ms=None):
+        """按当前累加量为所有交易对打分，返回总权重最高的top个结果（降序）"""
+        table = table or strategy.WEIGHT_TABLE
+        current_bands, previous_bands, prices = self.bands(now_ms)
+        valid = ~np.isnan(prices)
+        weights = weight_engine.score(current_bands[valid], previous_bands[valid], prices[valid], table)
+        rows = np.flatnonzero(valid)
+        results = []
+        for r in weight_engine.top_k(weights['total_weight'], top):
+            i = rows[r]
+            results.append({
+                'symbol': self.symbols[i],
+                'current_price': float(prices[i]),
+                'current_weight': float(weights['current_weight'][r]),
+                'previous_weight': float(weights['previous_weight'][r]),
+                'total_weight': float(weights['total_weight'][r]),
+                'current_metrics': levels_to_metrics(current_bands[i]),
+                'previous_month_metrics': levels_to_metrics(previous_bands[i]).get('month', {}),
+            })
+        return results
+
+
+def accumulate(hlc3, volume):
+    return volume.sum(), (volume * hlc3).sum(), (volume * hlc3 * hlc3).sum()
+
+
+def to_levels(bands):
+    """BAND_DTYPE数组 -> (..., 价位数)，价位顺序同weight_engine.LEVELS"""
+    return np.stack([bands[level] for level in weight_engine.LEVELS], axis=-1)
+
+
+def levels_to_metrics(levels):
+    """(周期数, 价位数) -> {周期: {价位: 值}}，跳过没有数据的周期"""
+    return {
+        period: {level: float(levels[j, k]) for k, level in enumerate(weight_engine.LEVELS)}
+        for j, period in enumerate(PERIODS)
+        if not np.isnan(levels[j]).all()
+    }
+
+
+class KlineStream:
+    """
+    K线组合流订阅：每个连接最多MAX_STREAMS_PER_CONNECTION个stream，断线自动重连
+
+    handler(symbol, interval, open_time, high, low, close, volume, closed)
+    """
+
+    def __init__(self, symbols, intervals, handler, url=WS_URL, max_streams=MAX_STREAMS_PER_CONNECTION):
+        if websocket is None:
+            raise RuntimeError("未安装websocket-client，无法使用常驻模式")
+        streams = [f"{symbol.lower()}@kline_{interval}" for symbol in symbols for interval in intervals]
+        self.groups = [streams[i:i + max_streams] for i in range(0, len(streams), max_streams)]
+        self.handler = handler
+        self.url = url
+        self.connections = [None] * len(self.groups)
+        self.received = 0
+        self.reconnects = 0
+        self._stop_event = threading.Event()
+
+    def start(self):
+        for n in range(len(self.groups)):
+            threading.Thread(target=self._run, args=(n,), name=f"kline-stream-{n}", daemon=True).start()
+
+    def stop(self):
+        self._stop_event.set()
+        for ws in self.connections:
+            if ws is not None:
+                ws.close()
+
+    def _on_message(self, ws, message):
+        self.received += 1
+        try:
+            data = json.loads(message).get('data', {})
+            k = data.get('k')
+            if data.get('e') != 'kline' or not k:
+                return
+            self.handler(data['s'], k['i'], int(k['t']), float(k['h']), float(k['l']), float(k['c']),
+                         float(k['v']), bool(k['x']))
+        except Exception as e:
+            logger.error(f"处理K线消息出错: {e}")
+            logger.debug(f"错误详情: {traceback.format_exc()}")
+
+    def _run(self, n):
+        url = f"{self.url}?streams={'/'.join(self.groups[n])}"
+        backoff = 1
+        while not self._stop_event.is_set():
+            ws = websocket.WebSocketApp(url, on_message=self._on_message)
+            self.connections[n] = ws
+            started = time.time()
+            ws.run_forever(ping_interval=60, ping_timeout=20)
+            if self._stop_event.is_set():
+                break
+            self.reconnects += 1
+            backoff = 1 if time.time() - started > 60 else min(backoff * 2, 60)
+            logger.warning(f"K线连接 {n} 断开，{backoff} 秒后重连")
+            self._stop_event.wait(backoff)
+
+
+class VWAPDaemon:
+    """常驻扫描：REST补齐 + WebSocket增量更新 + 收盘后自动排名，也可以随时调用rank()"""
+
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.accumulators = VWAPAccumulators(symbols)
+        self.stream = None
+        self.last_seed = 0.0
+        self.gap_attempts = {}  # 漏掉K线的交易对 -> 连续补齐失败次数
+        self.gap_retry_at = {}  # 漏掉K线的交易对 -> 下次允许重试的时间
+        self._seed_thread = None
+        self._rank_at = None
+        self._rank_lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def seed(self, symbols=None):
+        """用REST获取上一周期起点到现在的K线，初始化累加量"""
+        full = symbols is None
+        symbols = list(symbols or self.symbols)
+        now = datetime.now(timezone.utc)
+        windows = strategy.build_windows(now)
+        self.accumulators.begin_seed(symbols)
+        try:
+            data_by_symbol = strategy.fetch_all_frames(symbols, strategy.plan_fetches(windows))
+            now_ms = int(now.timestamp() * 1000)
+            for symbol, data in data_by_symbol.items():
+                self.accumulators.seed(symbol, data, now_ms)
+        except Exception as e:
+            logger.error(f"补齐VWAP累加量出错: {e}")
+            logger.debug(f"错误详情: {traceback.format_exc()}")
+            data_by_symbol = {}
+        finally:
+            self.accumulators.end_seed(symbols)
+        logger.info(f"已补齐 {len(data_by_symbol)}/{len(symbols)} 个交易对的VWAP累加量")
+        self.record_gap_results(symbols, data_by_symbol)
+        if full:
+            self.last_seed = time.time()
+
+    def record_gap_results(self, symbols, data_by_symbol):
+        """更新漏掉K线的交易对的重试状态：成功则清除，失败则指数退避，多次失败后放弃"""
+        now = time.time()
+        gaps = self.accumulators.pending_gaps()
+        for symbol in symbols:
+            if symbol in data_by_symbol:
+                self.gap_attempts.pop(symbol, None)
+                self.gap_retry_at.pop(symbol, None)
+                continue
+            if symbol not in gaps:
+                continue  # 定期补齐失败但累加量仍连续，保留原有数据
+            attempts = self.gap_attempts.get(symbol, 0) + 1
+            if attempts >= GAP_MAX_ATTEMPTS:
+                logger.error(f"{symbol} 连续 {attempts} 次补齐失败，放弃补齐，暂不参与排名")
+                self.accumulators.drop(symbol)
+                self.gap_attempts.pop(symbol, None)
+                self.gap_retry_at.pop(symbol, None)
+                continue
+            delay = min(GAP_RETRY_BASE * 2 ** (attempts - 1), GAP_RETRY_MAX)
+            logger.warning(f"{symbol} 补齐失败 (第 {attempts} 次)，{delay} 秒后重试")
+            self.gap_attempts[symbol] = attempts
+            self.gap_retry_at[symbol] = now + delay
+
+    def due_gaps(self):
+        """漏掉K线且已到重试时间的交易对"""
+        now = time.time()
+        return [symbol for symbol in self.accumulators.pending_gaps() if self.gap_retry_at.get(symbol, 0) <= now]
+
+    def seed_in_background(self, symbols=None):
+        """在工作线程中补齐，不阻塞排名；已有补齐在进行时返回False"""
+        if self._seed_thread is not None and self._seed_thread.is_alive():
+            return False
+        self._seed_thread = threading.Thread(target=self.seed, args=(symbols,), name="vwap-seed", daemon=True)
+        self._seed_thread.start()
+        return True
+
+    def on_kline(self, symbol, interval, open_time, high, low, close, volume, closed):
+        if self.accumulators.update(symbol, interval, open_time, high, low, close, volume, closed):
+            with self._rank_lock:
+                if self._rank_at is None:
+                    self._rank_at = time.time() + RANK_DELAY
+
+    def request_rank(self, *args):
+        """按需排名（也用作SIGUSR1处理函数）"""
+        with self._rank_lock:
+            self._rank_at = time.time()
+
+    def rank(self, top=strategy.TOP_N, send=False):
+        start = time.perf_counter()
+        results = self.accumulators.rank(top=top)
+        elapsed = (time.perf_counter() - start) * 1000
+        logger.info(f"排名完成，耗时 {elapsed:.1f}ms，已处理收盘K线 {self.accumulators.closed_bars} 根")
+        for i, result in enumerate(results, 1):
+            logger.info(f"{i}. {result['symbol']} - 总权重: {result['total_weight']:.2f}")
+        if send and results:
+            strategy.send_to_feishu(results)
+        return results
+
+    def run(self):
+        self.seed()
+        self.stream = KlineStream(self.symbols, INTERVALS, self.on_kline)
+        self.stream.start()
+        self.rank()
+        while not self._stop_event.wait(0.5):
+            with self._rank_lock:
+                due = self._rank_at is not None and time.time() >= self._rank_at
+                if due:
+                    self._rank_at = None
+            if due:
+                try:
+                    self.rank(send=SEND_TO_FEISHU)
+                except Exception as e:
+                    logger.error(f"排名出错: {e}")
+                    logger.debug(f"错误详情: {traceback.format_exc()}")
+            # 补齐在工作线程中进行，排名不受REST获取耗时影响
+            if time.time() - self.last_seed > RESEED_INTERVAL:
+                if self.seed_in_background():
+                    logger.info("开始定期补齐所有交易对")
+            else:
+                gaps = self.due_gaps()
+                if gaps and self.seed_in_background(gaps):
+                    logger.warning(f"{len(gaps)} 个交易对漏掉了K线，重新补齐")
+
+    def stop(self):
+        self._stop_event.set()
+        if self.stream is not None:
+            self.stream.stop()
+
+
+def main():
+    all_prices = strategy.get_all_symbol_prices()
+    tickers_24h = strategy.get_all_24h_tickers()
+    symbols = strategy.select_symbols(all_prices, tickers_24h)
+
+    daemon = VWAPDaemon(symbols)
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, daemon.request_rank)  # kill -USR1 <pid> 立即重新排名
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        logger.info("正在停止...")
+    finally:
+        daemon.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# 批量VWAP计算：把多个交易对、多个周期窗口的K线堆叠为连续数组，一次算出全部VWAP/标准差/VAH/VAL
+import numpy as np  # 用于数值计算
+
+BAND_DTYPE = np.dtype([
+    ('vwap', 'f8'),
+    ('stdev', 'f8'),
+    ('vah', 'f8'),
+    ('val', 'f8'),
+])
+
+
+def segment_offsets(lengths):
+    """由各段长度计算段偏移：第i段为 [offsets[i], offsets[i+1])"""
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def bands_from_sums(sum_v, sum_pv, sum_pv2, stdev_multiplier=1.0):
+    """
+    由累加量 Σv、Σ(p·v)、Σ(p²·v) 计算VWAP/标准差/VAH/VAL
+
+    输入可以是任意形状的数组，返回同形状的BAND_DTYPE结构化数组；Σv为0时为NaN。
+    """
+    sum_v = np.asarray(sum_v, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vwap = np.where(sum_v > 0, sum_pv / sum_v, np.nan)
+        variance = np.maximum(sum_pv2 / sum_v - vwap ** 2, 0)
+    stdev = np.sqrt(variance)
+
+    result = np.empty(sum_v.shape, dtype=BAND_DTYPE)
+    result['vwap'] = vwap
+    result['stdev'] = stdev
+    result['vah'] = vwap + stdev * stdev_multiplier
+    result['val'] = vwap - stdev * stdev_multiplier
+    return result
+
+
+def batch_vwap_bands(hlc3, volume, offsets, stdev_multiplier=1.0):
+    """
+    按段计算锚定VWAP、成交量加权标准差和VAH/VAL
+
+    hlc3, volume: 所有窗口首尾相接的一维数组
+    offsets: 段偏移，长度为窗口数+1
+    返回长度为窗口数的BAND_DTYPE结构化数组；空窗口或成交量为0的窗口为NaN。
+
+    与calculate_vwap逐行累加后取最后一行的结果一致：
+    VWAP = Σ(p·v)/Σv，方差 = Σ(p²·v)/Σv - VWAP²（负值截为0）。
+    每段单独求和（np.add.reduceat），不同交易对之间不会因全局累加产生精度损失。
+    """
+    hlc3 = np.asarray(hlc3, dtype=np.float64)
+    volume = np.asarray(volume, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if len(hlc3) != len(volume) or offsets[-1] != len(hlc3):
+        raise ValueError("hlc3、volume长度与段偏移不一致")
+
+    result = np.full(len(offsets) - 1, np.nan, dtype=BAND_DTYPE)
+    nonempty = np.diff(offsets) > 0
+    if not nonempty.any():
+        return result
+
+    # 段是连续的，空段起点与下一段相同，因此只用非空段起点做reduceat即可得到各段之和
+    starts = offsets[:-1][nonempty]
+    pv = hlc3 * volume
+    sum_v = np.add.reduceat(volume, starts)
+    sum_pv = np.add.reduceat(pv, starts)
+    sum_pv2 = np.add.reduceat(pv * hlc3, starts)
+
+    result[nonempty] = bands_from_sums(sum_v, sum_pv, sum_pv2, stdev_multiplier)
+    return result
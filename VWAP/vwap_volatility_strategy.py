@@ -2,15 +2,20 @@
 from datetime import datetime, timedelta, timezone  # 用于处理日期和时间
 import requests  # 用于发送HTTP请求
 import numpy as np  # 用于科学计算
+import pandas as pd  # 用于处理K线数据
 from tqdm import tqdm  # 用于显示进度条
 import time  # 用于时间相关操作
 import concurrent.futures  # 用于并行处理
-from requests.adapters import HTTPAdapter  # 用于HTTP请求的重试机制
-from requests.packages.urllib3.util.retry import Retry  # 用于定义重试策略
 import logging  # 用于日志记录
 import urllib3  # HTTP客户端
 import certifi  # 提供Mozilla的根证书包
 import traceback  # 用于异常追踪
+import os  # 用于读取环境变量
+from http_client import get_client  # 共享的HTTP连接池客户端
+from async_fetch import AIOHTTP_AVAILABLE, AsyncKlineFetcher  # 异步K线获取引擎
+from ohlcv_cache import OHLCVCache, klines_to_array  # 本地K线缓存
+from vwap_kernel import batch_vwap_bands, segment_offsets  # 批量VWAP计算
+import weight_engine  # 表驱动的批量权重计算
 
 # 设置SSL证书
 urllib3.util.ssl_.DEFAULT_CERTS = certifi.where()
@@ -19,57 +24,51 @@ urllib3.util.ssl_.DEFAULT_CERTS = certifi.where()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 设置Binance API的基础URL
-BASE_URL = "https://fapi.binance.com"
+# 设置Binance API的基础URL，可用环境变量指向本地回放服务（EMA21/replay_server.py）
+BASE_URL = os.environ.get('BINANCE_REST_URL', "https://fapi.binance.com")
+# 飞书机器人Webhook
+FEISHU_WEBHOOK = os.environ.get('FEISHU_WEBHOOK', "https://www.feishu.cn/flow/api/trigger-webhook/e8dcc2688bf699aef589e722e8ade93b")
 
-# 定义一个函数，用于创建一个带有重试机制的请求会话
-def requests_retry_session(
-    retries=10,  # 重试次数
-    backoff_factor=1,  # 重试间隔的增长因子
-    status_forcelist=(500, 502, 504, 520, 524, 429),  # 需要重试的HTTP状态码
-    session=None,  # 可选的会话对象
-):
-    """
-    创建一个带有重试机制的requests会话
-    
-    参数:
-    retries: 最大重试次数
-    backoff_factor: 重试之间的延迟时间
-    status_forcelist: 需要重试的HTTP状态码列表
-    session: 现有的session对象（如果没有则创建新的）
-    
-    返回:
-    配置了重试机制的requests.Session对象
-    """
-    session = session or requests.Session()  # 如果没有提供会话对象，则创建一个新的会话
-    retry = Retry(
-        total=retries,  # 总重试次数
-        read=retries,  # 读取超时重试次数
-        connect=retries,  # 连接超时重试次数
-        backoff_factor=backoff_factor,  # 重试间隔的增长因子
-        status_forcelist=status_forcelist,  # 需要重试的HTTP状态码
-    )
-    adapter = HTTPAdapter(max_retries=retry)  # 创建一个带有重试策略的HTTP适配器
-    session.mount('http://', adapter)  # 将HTTP适配器挂载到会话上
-    session.mount('https://', adapter)  # 将HTTPS适配器挂载到会话上
-    session.verify = False  # 禁用SSL证书验证
-    requests.packages.urllib3.disable_warnings()  # 禁用urllib3的警告
-    return session  # 返回配置好的会话对象
+# 各时间维度使用的K线周期
+PERIOD_INTERVALS = {'week': '1h', 'month': '1d', 'quarter': '1d', 'year': '1d'}
+INTERVAL_MS = {'1h': 3600 * 1000, '1d': 24 * 3600 * 1000}
+MAX_KLINE_LIMIT = 1500  # 单次K线请求的最大数量
+MAX_WORKERS = 10  # 并行处理交易对的线程数
+MAX_SYMBOLS = 300  # 最大交易对数量
+
+# K线获取模式：'async' 使用asyncio引擎按请求权重自适应并发，'threaded' 使用线程池
+# 未安装aiohttp时自动回退到 'threaded'
+FETCH_MODE = 'async'
+ASYNC_MAX_CONCURRENCY = 20  # 异步模式的最大并发请求数
+
+# 权重计算：可替换为其他weight_engine.WeightTable
+WEIGHT_TABLE = weight_engine.DEFAULT_TABLE
+TOP_N = 100  # 发送到飞书的交易对数量
+
+# 本地K线缓存：只保存已收盘K线，重复扫描时只补取缺失的尾部
+CACHE_ENABLED = True
+CACHE_DIR = None  # None表示使用脚本目录下的ohlcv_cache
+_ohlcv_cache = None
+
+# 共享HTTP客户端：连接池大小与线程数一致，所有请求复用连接
+def get_http_client():
+    """获取扫描器共享的HTTP客户端"""
+    return get_client(BASE_URL, pool_size=MAX_WORKERS)
 
 # 定义一个函数，用于获取交易所信息
 def get_exchange_info():
     """获取交易所信息"""
-    response = requests_retry_session().get(f"{BASE_URL}/fapi/v1/exchangeInfo")  # 发送GET请求获取交易所信息
+    response = get_http_client().get("/fapi/v1/exchangeInfo")  # 发送GET请求获取交易所信息
     return response.json()  # 返回JSON格式的响应
 
 # 定义一个函数，用于获取所有交易对的当前价格
 def get_all_symbol_prices():
     """获取所有交易对的当前价格"""
-    response = requests_retry_session().get(f"{BASE_URL}/fapi/v2/ticker/price")  # 发送GET请求获取所有交易对的当前价格
+    response = get_http_client().get("/fapi/v2/ticker/price")  # 发送GET请求获取所有交易对的当前价格
     return {item['symbol']: float(item['price']) for item in response.json()}  # 返回一个字典，键是交易对名称，值是当前价格
 
 # 定义一个函数，用于获取OHLCV数据
-def fetch_ohlcv(symbol, interval, limit):
+def fetch_ohlcv(symbol, interval, limit, start_time=None, end_time=None):
     """
     获取OHLCV（开盘价、最高价、最低价、收盘价、成交量）数据
     
@@ -77,6 +76,8 @@ def fetch_ohlcv(symbol, interval, limit):
     symbol: 交易对符号
     interval: 时间间隔
     limit: 获取的数据点数量
+    start_time: 可选，起始时间（毫秒时间戳）
+    end_time: 可选，结束时间（毫秒时间戳）
     
     返回:
     包含OHLCV数据的DataFrame
@@ -86,8 +87,27 @@ def fetch_ohlcv(symbol, interval, limit):
         "interval": interval,  # 时间间隔
         "limit": limit  # 数据点数量限制
     }
-    response = requests_retry_session().get(f"{BASE_URL}/fapi/v1/klines", params=params)  # 发送GET请求获取OHLCV数据
+    if start_time is not None:
+        params["startTime"] = int(start_time)
+    if end_time is not None:
+        params["endTime"] = int(end_time)
+    response = get_http_client().get("/fapi/v1/klines", params=params)  # 发送GET请求获取OHLCV数据
     klines = response.json()  # 获取JSON格式的响应
+    return klines_to_dataframe(klines)
+
+def fetch_klines(symbol, interval, limit, start_time, end_time):
+    """获取一段K线，返回接口原始列表"""
+    params = {
+        "symbol": symbol,
+        "interval": interval,
+        "limit": limit,
+        "startTime": int(start_time),
+        "endTime": int(end_time)
+    }
+    return get_http_client().get_json("/fapi/v1/klines", params=params)
+
+def klines_to_dataframe(klines):
+    """将K线接口返回的列表转换为以时间为索引的DataFrame"""
     df = pd.DataFrame(klines, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_asset_volume', 'number_of_trades', 'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'])  # 创建一个DataFrame
     df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms', utc=True)  # 将时间戳转换为日期时间格式
     df = df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].copy()  # 使用copy()避免SettingWithCopyWarning
@@ -95,9 +115,28 @@ def fetch_ohlcv(symbol, interval, limit):
     df.set_index('timestamp', inplace=True)  # 将时间戳设置为索引
     return df  # 返回DataFrame
 
+def frame_from_array(arr):
+    """将K线结构化数组转换为以时间为索引的DataFrame"""
+    df = pd.DataFrame({
+        'open': arr['open'],
+        'high': arr['high'],
+        'low': arr['low'],
+        'close': arr['close'],
+        'volume': arr['volume']
+    }, index=pd.to_datetime(arr['timestamp'], unit='ms', utc=True))
+    df.index.name = 'timestamp'
+    return df
+
+def get_ohlcv_cache():
+    """获取本地K线缓存，未启用时返回None"""
+    global _ohlcv_cache
+    if CACHE_ENABLED and _ohlcv_cache is None:
+        _ohlcv_cache = OHLCVCache(CACHE_DIR) if CACHE_DIR else OHLCVCache()
+    return _ohlcv_cache if CACHE_ENABLED else None
+
 # 定义一个函数，用于计算VWAP和标准差
 def calculate_vwap(df):
-    """计算VWAP和标准差"""
+    """计算VWAP和标准差（逐DataFrame的参考实现，扫描使用vwap_kernel.batch_vwap_bands）"""
     df.loc[:, 'hlc3'] = (df['high'] + df['low'] + df['close']) / 3  # 计算HLC3
     df.loc[:, 'vwap'] = (df['hlc3'] * df['volume']).cumsum() / df['volume'].cumsum()  # 计算VWAP
     df.loc[:, 'sumSrcSrcVol'] = (df['volume'] * df['hlc3'] ** 2).cumsum()  # 计算成交量的平方和
@@ -126,49 +165,165 @@ def is_new_period(now, period):
         return now.month == 1 and now.day == 1 and now.hour == 0
     return False
 
-def calculate_metrics(symbol, current_period=True):
-    """计算各个时间维度的指标"""
-    now = datetime.now(timezone.utc)
-    if current_period:
-        start_of_week = now - timedelta(days=now.weekday())
-        start_of_month = now.replace(day=1)
-        start_of_quarter = now.replace(month=((now.month - 1) // 3) * 3 + 1, day=1)
-        start_of_year = now.replace(month=1, day=1)
-        timeframes = {
-            'week': ('1h', 168),
-            'month': ('1d', 30),
-            'quarter': ('1d', 90),
-            'year': ('1d', 365)
-        }
-        start_times = {
-            'week': start_of_week,
-            'month': start_of_month,
-            'quarter': start_of_quarter,
-            'year': start_of_year
-        }
+def period_start(now, period):
+    """当前时间所在周期的起始时间（UTC零点）"""
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == 'week':
+        return today - timedelta(days=now.weekday())
+    elif period == 'month':
+        return today.replace(day=1)
+    elif period == 'quarter':
+        return today.replace(month=((now.month - 1) // 3) * 3 + 1, day=1)
+    elif period == 'year':
+        return today.replace(month=1, day=1)
+    raise ValueError(f"未知周期: {period}")
+
+def previous_period_start(now, period):
+    """上一个周期的起始时间"""
+    start = period_start(now, period)
+    if period == 'week':
+        return start - timedelta(weeks=1)
+    elif period == 'month':
+        return (start - timedelta(days=1)).replace(day=1)
+    elif period == 'quarter':
+        return period_start(start - timedelta(days=1), 'quarter')
+    return start.replace(year=start.year - 1)
+
+def build_windows(now, current_period=None):
+    """
+    列出所有需要计算的时间窗口
+    
+    返回 {(周期, 是否当前周期): (K线周期, 起始时间, 结束时间)}；
+    当前周期为 [本周期起点, now]，上一周期为 [上周期起点, 本周期起点)
+    """
+    windows = {}
+    for period, interval in PERIOD_INTERVALS.items():
+        start = period_start(now, period)
+        if current_period in (None, True):
+            windows[(period, True)] = (interval, start, now)
+        if current_period in (None, False):
+            windows[(period, False)] = (interval, previous_period_start(now, period), start)
+    return windows
+
+def plan_fetches(windows):
+    """
+    计算覆盖所有窗口所需的最少K线请求
+    
+    同一K线周期的窗口合并为一个区间，超过单次请求上限时再按上限拆分；
+    limit取区间内实际的K线数量，以降低请求权重。
+    返回 [(K线周期, 起始毫秒, 结束毫秒, limit)]
+    """
+    ranges = {}
+    for interval, start, end in windows.values():
+        lo, hi = ranges.get(interval, (start, end))
+        ranges[interval] = (min(lo, start), max(hi, end))
+    
+    plan = []
+    for interval, (start, end) in ranges.items():
+        step = INTERVAL_MS[interval] * MAX_KLINE_LIMIT
+        start_ms = int(start.timestamp() * 1000)
+        end_ms = int(end.timestamp() * 1000)
+        while start_ms <= end_ms:
+            chunk_end = min(start_ms + step - 1, end_ms)
+            limit = (chunk_end - start_ms) // INTERVAL_MS[interval] + 1
+            plan.append((interval, start_ms, chunk_end, limit))
+            start_ms = chunk_end + 1
+    return plan
+
+def plan_for_symbol(symbol, plan):
+    """启用缓存时只请求缓存中缺失的尾部"""
+    cache = get_ohlcv_cache()
+    return cache.plan(symbol, plan) if cache else plan
+
+def frames_from_klines(symbol, plan, klines):
+    """
+    把获取到的原始K线（启用缓存时与缓存合并）转换为DataFrame
+    
+    klines: {K线周期: 原始K线列表}
+    返回 {K线周期: DataFrame}
+    """
+    cache = get_ohlcv_cache()
+    if cache:
+        arrays = cache.combine(symbol, plan, klines)
     else:
-        start_of_week = now - timedelta(days=now.weekday(), weeks=1)
-        start_of_month = (now.replace(day=1) - timedelta(days=1)).replace(day=1)
-        start_of_quarter = (now.replace(month=((now.month - 1) // 3) * 3 + 1, day=1) - timedelta(days=1)).replace(month=((now.month - 1) // 3) * 3 + 1, day=1)
-        start_of_year = (now.replace(month=1, day=1) - timedelta(days=1)).replace(month=1, day=1)
-        timeframes = {
-            'week': ('1h', 168),
-            'month': ('1d', 30),
-            'quarter': ('1d', 90),
-            'year': ('1d', 365)
-        }
-        start_times = {
-            'week': start_of_week,
-            'month': start_of_month,
-            'quarter': start_of_quarter,
-            'year': start_of_year
-        }
+        arrays = {interval: klines_to_array(rows) for interval, rows in klines.items()}
+    return {interval: frame_from_array(arr) for interval, arr in arrays.items()}
+
+def fetch_plan(symbol, plan):
+    """按请求计划获取K线，返回 {K线周期: DataFrame}"""
+    klines = {}
+    for interval, start_ms, end_ms, limit in plan_for_symbol(symbol, plan):
+        klines.setdefault(interval, []).extend(fetch_klines(symbol, interval, limit, start_ms, end_ms))
+    return frames_from_klines(symbol, plan, klines)
+
+def slice_window(df, start, end, include_end=True):
+    """从已获取的K线中截取窗口"""
+    if include_end:
+        return df[(df.index >= start) & (df.index <= end)].copy()
+    return df[(df.index >= start) & (df.index < end)].copy()
+
+def collect_segments(data_by_symbol, windows):
+    """
+    把所有交易对所有窗口的K线堆叠为连续数组
     
-    metrics = {}
+    data_by_symbol: {交易对: {K线周期: DataFrame}}
+    返回 (hlc3, volume, offsets, keys)，keys[i] = (交易对, (周期, 是否当前周期)) 对应第i段
+    """
+    hlc3_parts, volume_parts, lengths, keys = [], [], [], []
+    for symbol, data in data_by_symbol.items():
+        arrays = {}
+        for key, (interval, start, end) in windows.items():
+            df = data.get(interval)
+            if df is None or df.empty:
+                continue
+            if interval not in arrays:
+                hlc3 = (df['high'].to_numpy() + df['low'].to_numpy() + df['close'].to_numpy()) / 3
+                arrays[interval] = (hlc3, df['volume'].to_numpy())
+            hlc3, volume = arrays[interval]
+            # 当前周期包含结束时间，上一周期不包含（结束时间即本周期起点）；
+            # K线时间戳为整毫秒，边界取整到毫秒后比较结果不变
+            lo = df.index.searchsorted(pd.Timestamp(start).ceil('ms'), side='left')
+            hi = df.index.searchsorted(pd.Timestamp(end).floor('ms'), side='right' if key[1] else 'left')
+            if hi <= lo:
+                continue
+            hlc3_parts.append(hlc3[lo:hi])
+            volume_parts.append(volume[lo:hi])
+            lengths.append(hi - lo)
+            keys.append((symbol, key))
+    if not keys:
+        return np.empty(0), np.empty(0), np.zeros(1, dtype=np.int64), keys
+    return np.concatenate(hlc3_parts), np.concatenate(volume_parts), segment_offsets(lengths), keys
+
+def batch_metrics(data_by_symbol, windows, now):
+    """批量计算所有交易对所有窗口的指标，返回 {交易对: (当前周期指标, 上一周期指标)}"""
+    hlc3, volume, offsets, keys = collect_segments(data_by_symbol, windows)
+    bands = batch_vwap_bands(hlc3, volume, offsets)
+    new_period = {period: is_new_period(now, period) for period in PERIOD_INTERVALS}
     
-    for period, (interval, limit) in timeframes.items():
-        df = fetch_ohlcv(symbol, interval, limit)
-        df = df[df.index >= start_times[period]].copy()  # 明确创建一个副本
+    metrics = {symbol: ({}, {}) for symbol in data_by_symbol}
+    for (symbol, (period, current)), band in zip(keys, bands):
+        current_metrics, previous_metrics = metrics[symbol]
+        target = current_metrics if current else previous_metrics
+        target[period] = {
+            'vwap': float(band['vwap']),
+            'vah': float(band['vah']),
+            'val': float(band['val']),
+            'is_new_period': new_period[period] if current else False
+        }
+    return metrics
+
+def metrics_from_data(data, windows, now):
+    """根据已获取的K线计算所有窗口的指标，返回 (当前周期指标, 上一周期指标)"""
+    return batch_metrics({None: data}, windows, now)[None]
+
+def metrics_from_data_reference(data, windows, now):
+    """metrics_from_data的逐DataFrame参考实现，用于核对批量计算结果"""
+    current_metrics, previous_metrics = {}, {}
+    for (period, current), (interval, start, end) in windows.items():
+        df = data.get(interval)
+        if df is None:
+            continue
+        df = slice_window(df, start, end, include_end=current)
         
         if df.empty:
             continue
@@ -176,17 +331,32 @@ def calculate_metrics(symbol, current_period=True):
         vwap, stDev = calculate_vwap(df)
         vah, val = calculate_vah_val(df, stDev)
         
+        metrics = current_metrics if current else previous_metrics
         metrics[period] = {
             'vwap': vwap,
             'vah': vah,
             'val': val,
-            'is_new_period': is_new_period(now, period) if current_period else False
+            'is_new_period': is_new_period(now, period) if current else False
         }
-    
-    return metrics
+    return current_metrics, previous_metrics
+
+def calculate_all_metrics(symbol, now=None):
+    """一次获取K线，计算当前周期和上一周期的全部指标"""
+    now = now or datetime.now(timezone.utc)
+    windows = build_windows(now)
+    data = fetch_plan(symbol, plan_fetches(windows))
+    return metrics_from_data(data, windows, now)
+
+def calculate_metrics(symbol, current_period=True):
+    """计算各个时间维度的指标"""
+    now = datetime.now(timezone.utc)
+    windows = build_windows(now, current_period)
+    data = fetch_plan(symbol, plan_fetches(windows))
+    current_metrics, previous_metrics = metrics_from_data(data, windows, now)
+    return current_metrics if current_period else previous_metrics
 
 def calculate_weight(symbol, current_metrics, previous_metrics, current_price):
-    """计算权重"""
+    """计算权重（单个交易对的参考实现，扫描使用rank_results批量计算）"""
     current_weight = 0
     previous_weight = 0
     
@@ -250,7 +420,7 @@ def calculate_weight(symbol, current_metrics, previous_metrics, current_price):
 
 def send_to_feishu(results):
     """发送结果到飞书"""
-    webhook_url = "https://www.feishu.cn/flow/api/trigger-webhook/e8dcc2688bf699aef589e722e8ade93b"
+    webhook_url = FEISHU_WEBHOOK
     headers = {
         "Content-Type": "application/json"
     }
@@ -277,12 +447,28 @@ def send_to_feishu(results):
     else:
         print(f"发送到飞书失败，状态码：{response.status_code}")
 
+def get_all_24h_tickers():
+    """一次获取所有交易对的24小时行情，返回 {交易对: {'volume': 成交量, 'quote_volume': 成交额}}"""
+    try:
+        tickers = get_http_client().get_json("/fapi/v1/ticker/24hr")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.error(f"获取24小时行情失败: {e}")
+        logger.debug(f"错误详情: {traceback.format_exc()}")
+        return {}
+    return {
+        item['symbol']: {
+            'volume': float(item['volume']),
+            'quote_volume': float(item['quoteVolume'])
+        }
+        for item in tickers
+    }
+
 def get_24h_volume(symbol):
     """获取交易对24小时成交量"""
     max_retries = 5
     for attempt in range(max_retries):
         try:
-            response = requests_retry_session().get(f"{BASE_URL}/fapi/v1/ticker/24hr", params={'symbol': symbol}, timeout=30)
+            response = get_http_client().get("/fapi/v1/ticker/24hr", params={'symbol': symbol})
             response.raise_for_status()
             return float(response.json()['volume'])
         except requests.exceptions.RequestException as e:
@@ -295,76 +481,188 @@ def get_24h_volume(symbol):
         time.sleep(2 ** attempt)
     return 0
 
+def build_result(symbol, current_price, current_metrics, previous_metrics):
+    """组装单个交易对的结果，权重由rank_results统一计算"""
+    return {
+        'symbol': symbol,
+        'current_price': current_price,
+        'current_metrics': current_metrics,
+        'previous_metrics': previous_metrics,
+        'previous_month_metrics': previous_metrics.get('month', {})
+    }
+
+def rank_results(results, table=None, top=TOP_N):
+    """
+    批量计算所有交易对的权重并排名
+    
+    为每个结果写入current_weight/previous_weight/total_weight，
+    返回总权重最高的top个结果（降序）
+    """
+    if not results:
+        return []
+    table = table or WEIGHT_TABLE
+    prices = np.array([result['current_price'] for result in results], dtype=np.float64)
+    current_bands = weight_engine.bands_from_metrics([result['current_metrics'] for result in results])
+    previous_bands = weight_engine.bands_from_metrics([result['previous_metrics'] for result in results])
+    weights = weight_engine.score(current_bands, previous_bands, prices, table)
+    
+    for result, row in zip(results, weights):
+        result['current_weight'] = float(row['current_weight'])
+        result['previous_weight'] = float(row['previous_weight'])
+        result['total_weight'] = float(row['total_weight'])
+    return [results[i] for i in weight_engine.top_k(weights['total_weight'], top)]
+
 def process_symbol(symbol, current_price):
     try:
-        current_metrics = calculate_metrics(symbol, current_period=True)
-        previous_metrics = calculate_metrics(symbol, current_period=False)
-        
-        current_weight, previous_weight, total_weight = calculate_weight(symbol, current_metrics, previous_metrics, current_price)
-        
-        result = {
-            'symbol': symbol,
-            'current_price': current_price,
-            'current_weight': current_weight,
-            'previous_weight': previous_weight,
-            'total_weight': total_weight,
-            'current_metrics': current_metrics,
-            'previous_month_metrics': previous_metrics.get('month', {})
-        }
-        
-        return result
+        # 一次获取1h和1d两段K线，当前和上一周期的所有窗口都从中截取
+        current_metrics, previous_metrics = calculate_all_metrics(symbol)
+        return build_result(symbol, current_price, current_metrics, previous_metrics)
     except Exception as e:
         logger.error(f"处理交易对 {symbol} 时出错: {e}")
         logger.debug(f"错误详情: {traceback.format_exc()}")
         return None
 
+def scan_threaded(all_symbols, all_prices):
+    """线程池模式：每个线程获取并计算一个交易对"""
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {executor.submit(process_symbol, symbol, all_prices[symbol]): symbol for symbol in all_symbols}
+        for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Processing symbols"):
+            result = future.result()
+            if result:
+                results.append(result)
+    return results
+
+def fetch_frames_async(all_symbols, plan):
+    """用asyncio引擎获取所有交易对的K线，返回 {交易对: {K线周期: DataFrame}}"""
+    fetcher = AsyncKlineFetcher(BASE_URL, max_concurrency=ASYNC_MAX_CONCURRENCY)
+    symbol_plans = {symbol: plan_for_symbol(symbol, plan) for symbol in all_symbols}
+    klines_by_symbol, errors = fetcher.fetch_all(all_symbols, symbol_plans)
+    for symbol, error in errors.items():
+        logger.error(f"获取交易对 {symbol} K线时出错: {error}")
+    
+    data_by_symbol = {}
+    for symbol, klines in klines_by_symbol.items():
+        try:
+            data_by_symbol[symbol] = frames_from_klines(symbol, plan, klines)
+        except Exception as e:
+            logger.error(f"处理交易对 {symbol} 时出错: {e}")
+            logger.debug(f"错误详情: {traceback.format_exc()}")
+    return data_by_symbol
+
+def fetch_frames_threaded(all_symbols, plan):
+    """用线程池获取所有交易对的K线，返回 {交易对: {K线周期: DataFrame}}"""
+    data_by_symbol = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {executor.submit(fetch_plan, symbol, plan): symbol for symbol in all_symbols}
+        for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Fetching klines"):
+            symbol = futures[future]
+            try:
+                data_by_symbol[symbol] = future.result()
+            except Exception as e:
+                logger.error(f"获取交易对 {symbol} K线时出错: {e}")
+    return data_by_symbol
+
+def fetch_all_frames(all_symbols, plan):
+    """按FETCH_MODE获取所有交易对的K线，未安装aiohttp时使用线程池"""
+    if FETCH_MODE == 'async' and AIOHTTP_AVAILABLE:
+        return fetch_frames_async(all_symbols, plan)
+    return fetch_frames_threaded(all_symbols, plan)
+
+def scan_async(all_symbols, all_prices):
+    """异步模式：先用asyncio引擎获取所有K线，再一次性计算所有指标"""
+    now = datetime.now(timezone.utc)
+    windows = build_windows(now)
+    data_by_symbol = fetch_frames_async(all_symbols, plan_fetches(windows))
+    
+    # 所有交易对所有窗口一次性计算
+    metrics = batch_metrics(data_by_symbol, windows, now)
+    results = []
+    for symbol, (current_metrics, previous_metrics) in metrics.items():
+        try:
+            results.append(build_result(symbol, all_prices[symbol], current_metrics, previous_metrics))
+        except Exception as e:
+            logger.error(f"处理交易对 {symbol} 时出错: {e}")
+            logger.debug(f"错误详情: {traceback.format_exc()}")
+    return results
+
+def select_symbols(all_prices, tickers_24h):
+    """筛选参与计算的交易对：USDT本位永续合约、有成交量、最多MAX_SYMBOLS个"""
+    # 筛选USDT本位永续合约
+    all_symbols = [
+        symbol for symbol in all_prices.keys() 
+        if symbol.endswith('USDT') 
+        and not symbol.startswith('DEFI')
+    ]
+    
+    # 提交任务前排除没有成交量的交易对
+    if tickers_24h:
+        all_symbols = [
+            symbol for symbol in all_symbols
+            if tickers_24h.get(symbol, {}).get('volume', 0) > 0
+        ]
+    else:
+        logger.warning("未获取到24小时行情，不按成交量过滤交易对")
+    
+    # 设置最大交易对数量阈值
+    if len(all_symbols) > MAX_SYMBOLS:
+        logger.warning(f"获取到的交易对数量 ({len(all_symbols)}) 超过预期。将限制为前 {MAX_SYMBOLS} 个。")
+        all_symbols = all_symbols[:MAX_SYMBOLS]
+    
+    # 打印获取到的交易对列表
+    logger.info(f"获取到 {len(all_symbols)} 个交易对：{', '.join(all_symbols)}")
+    return all_symbols
+
 def main():
     try:
         # 获取所有交易对价格
         all_prices = get_all_symbol_prices()
         
-        # 筛选USDT本位永续合约
-        all_symbols = [
-            symbol for symbol in all_prices.keys() 
-            if symbol.endswith('USDT') 
-            and not symbol.startswith('DEFI')
-        ]
-        
-        # 设置最大交易对数量阈值
-        MAX_SYMBOLS = 300
-        if len(all_symbols) > MAX_SYMBOLS:
-            logger.warning(f"获取到的交易对数量 ({len(all_symbols)}) 超过预期。将限制为前 {MAX_SYMBOLS} 个。")
-            all_symbols = all_symbols[:MAX_SYMBOLS]
-        
-        # 打印获取到的交易对列表
-        logger.info(f"获取到 {len(all_symbols)} 个交易对：{', '.join(all_symbols)}")
+        # 一次获取所有交易对的24小时成交量
+        tickers_24h = get_all_24h_tickers()
+        all_symbols = select_symbols(all_prices, tickers_24h)
         
         logger.info(f"开始处理所有交易对")
         
-        results = []
+        if FETCH_MODE == 'async' and AIOHTTP_AVAILABLE:
+            results = scan_async(all_symbols, all_prices)
+        else:
+            if FETCH_MODE == 'async':
+                logger.warning("未安装aiohttp，回退到线程池模式")
+            # 使用多线程并行处理交易对
+            results = scan_threaded(all_symbols, all_prices)
         
-        # 使用多线程并行处理交易对
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-            futures = {executor.submit(process_symbol, symbol, all_prices[symbol]): symbol for symbol in all_symbols}
-            for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Processing symbols"):
-                result = future.result()
-                if result:
-                    # 排除没有成交量的交易对
-                    if get_24h_volume(result['symbol']) > 0:
-                        results.append(result)
+        for result in results:
+            ticker = tickers_24h.get(result['symbol'], {})
+            result['volume_24h'] = ticker.get('volume', 0)
+            result['quote_volume_24h'] = ticker.get('quote_volume', 0)
         
         if results:
-            # 按总权重排序
-            sorted_results = sorted(results, key=lambda x: x['total_weight'], reverse=True)
+            # 批量计算权重，取总权重排名前TOP_N的交易对
+            top_results = rank_results(results)
             
-            # 发送权重排名前100名的交易对到飞书
-            send_to_feishu(sorted_results[:100])
+            # 发送到飞书
+            send_to_feishu(top_results)
             
-            # 打印前100个结果到控制台
-            for i, result in enumerate(sorted_results[:100], 1):
+            # 打印结果到控制台
+            for i, result in enumerate(top_results, 1):
                 logger.info(f"{i}. {result['symbol']} - 总权重: {result['total_weight']:.2f}")
         else:
             logger.warning("没有成功处理任何交易对，不发送结果到飞书")
+        
+        # 打印缓存统计
+        cache = get_ohlcv_cache()
+        if cache:
+            stats = cache.stats()
+            logger.info(f"K线缓存: 命中 {stats['hits']}，未命中 {stats['misses']}（命中率 {stats['hit_ratio']:.1%}），"
+                        f"缓存读取 {stats['bars_cached']} 根，接口获取 {stats['bars_fetched']} 根，"
+                        f"{stats['files']} 个文件共 {stats['size_bytes'] / 1024 / 1024:.1f} MB")
+        
+        # 打印HTTP客户端统计
+        stats = get_http_client().stats()
+        logger.info(f"HTTP请求 {stats['requests']} 次，错误 {stats['errors']} 次，新建连接 {stats['new_connections']} 个，"
+                    f"连接复用率 {stats['reuse_ratio']:.1%}，平均耗时 {stats['avg_latency'] * 1000:.0f}ms，"
+                    f"P95 {stats['p95_latency'] * 1000:.0f}ms，最大 {stats['max_latency'] * 1000:.0f}ms")
     except Exception as e:
         logger.error(f"主函数执行出错: {e}")
         logger.debug(f"错误详情: {traceback.format_exc()}")
@@ -0,0 +1,127 @@
+# 表驱动的权重计算：所有交易对 × 周期 × 价位一次性用NumPy广播计算，权重表可替换
+import numpy as np  # 用于数值计算
+
+PERIODS = ('week', 'month', 'quarter', 'year')
+LEVELS = ('val', 'vwap', 'vah')
+
+# 价格所在区间编号
+ZONE_NONE = 0         # 价位缺失或价格正好落在价位上
+ZONE_BELOW_VAL = 1    # 低于VAL
+ZONE_VAL_VWAP = 2     # VAL ~ VWAP
+ZONE_VWAP_VAH = 3     # VWAP ~ VAH
+ZONE_ABOVE_VAH = 4    # 高于VAH
+
+
+class WeightTable:
+    """
+    权重表
+
+    period_weights: 各周期的时间权重，顺序同PERIODS
+    zone_scores: 各区间编号（0~4）对应的得分
+    proximity: 价格距价位的相对距离小于该值时算一次接近
+    proximity_score: 每次接近的得分（只用于当前周期）
+    alpha, beta: 当前周期/上一周期权重在总权重中的系数
+    squeeze_period, squeeze_threshold: 该周期 (VAH-VAL)/价格 小于阈值时视为波动收敛，
+                                      直接使用squeeze_weights（当前, 上一, 总）
+    """
+
+    def __init__(self, period_weights=(1, 2, 3, 4), zone_scores=(0, 1, 2, 3, 4), proximity=0.01,
+                 proximity_score=1, alpha=0.6, beta=0.4, squeeze_period='month', squeeze_threshold=0.01,
+                 squeeze_weights=(1, 1, 2)):
+        self.period_weights = np.asarray(period_weights, dtype=np.float64)
+        self.zone_scores = np.asarray(zone_scores, dtype=np.float64)
+        self.proximity = proximity
+        self.proximity_score = proximity_score
+        self.alpha = alpha
+        self.beta = beta
+        self.squeeze_period = squeeze_period
+        self.squeeze_threshold = squeeze_threshold
+        self.squeeze_weights = squeeze_weights
+        if len(self.period_weights) != len(PERIODS) or len(self.zone_scores) != 5:
+            raise ValueError("权重表维度与PERIODS/区间数不一致")
+
+
+DEFAULT_TABLE = WeightTable()
+
+WEIGHT_DTYPE = np.dtype([
+    ('current_weight', 'f8'),
+    ('previous_weight', 'f8'),
+    ('total_weight', 'f8'),
+])
+
+
+def bands_from_metrics(metrics_list):
+    """
+    把每个交易对的指标字典转换为 (交易对数, 周期数, 价位数) 数组
+
+    metrics_list: [{周期: {'val': .., 'vwap': .., 'vah': ..}}]，缺失的周期/价位为NaN
+    """
+    bands = np.full((len(metrics_list), len(PERIODS), len(LEVELS)), np.nan)
+    for i, metrics in enumerate(metrics_list):
+        for j, period in enumerate(PERIODS):
+            values = metrics.get(period)
+            if values:
+                for k, level in enumerate(LEVELS):
+                    bands[i, j, k] = values.get(level, np.nan)
+    return bands
+
+
+def zone_codes(bands, prices):
+    """计算价格相对每个周期VAL/VWAP/VAH的区间编号，返回 (交易对数, 周期数) 的整数数组"""
+    p = prices[:, None]
+    val, vwap, vah = bands[..., 0], bands[..., 1], bands[..., 2]
+    complete = ~np.isnan(bands).any(axis=-1)
+    codes = np.select(
+        [p < val, (vwap > p) & (p > val), (vah > p) & (p > vwap), p > vah],
+        [ZONE_BELOW_VAL, ZONE_VAL_VWAP, ZONE_VWAP_VAH, ZONE_ABOVE_VAH],
+        default=ZONE_NONE,
+    )
+    return np.where(complete, codes, ZONE_NONE)
+
+
+def proximity_hits(bands, prices, proximity):
+    """每个周期中价格接近的价位个数，返回 (交易对数, 周期数)"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        near = np.abs(prices[:, None, None] - bands) / bands < proximity
+    return near.sum(axis=-1)  # NaN比较结果为False，缺失价位不计数
+
+
+def score(current_bands, previous_bands, prices, table=DEFAULT_TABLE):
+    """
+    计算所有交易对的权重
+
+    current_bands, previous_bands: (交易对数, 周期数, 价位数)
+    prices: (交易对数,)
+    返回WEIGHT_DTYPE结构化数组
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    current_score = (proximity_hits(current_bands, prices, table.proximity) * table.proximity_score
+                     + table.zone_scores[zone_codes(current_bands, prices)])
+    previous_score = table.zone_scores[zone_codes(previous_bands, prices)]
+
+    result = np.empty(len(prices), dtype=WEIGHT_DTYPE)
+    result['current_weight'] = current_score @ table.period_weights
+    result['previous_weight'] = previous_score @ table.period_weights
+    result['total_weight'] = table.alpha * result['current_weight'] + table.beta * result['previous_weight']
+
+    # 波动收敛的交易对直接使用固定权重
+    if table.squeeze_period in PERIODS:
+        j = PERIODS.index(table.squeeze_period)
+        val, vah = current_bands[:, j, 0], current_bands[:, j, 2]
+        with np.errstate(invalid='ignore'):
+            squeezed = (vah - val) / prices < table.squeeze_threshold
+        result[squeezed] = table.squeeze_weights
+    return result
+
+
+def top_k(values, k):
+    """返回values中最大的k个元素的下标（降序，相同值保持原顺序）"""
+    n = len(values)
+    if k < n:
+        candidates = np.argpartition(-values, k - 1)[:k]
+        # 边界上相同值的元素可能被argpartition任意取舍，补齐后再按原顺序稳定排序
+        candidates = np.union1d(candidates, np.flatnonzero(values == values[candidates].min()))
+    else:
+        candidates = np.arange(n)
+    order = np.lexsort((candidates, -values[candidates]))
+    return candidates[order][:k]
@@ -0,0 +1,132 @@
+import json
+import os
+import re
+import time
+
+from price_cache import DEFAULT_CACHE_DIR
+
+UNIVERSE_CACHE_FILE = os.path.join(DEFAULT_CACHE_DIR, 'universe.json')
+UNIVERSE_TTL = 6 * 3600  # 币种列表缓存有效期（秒）
+PER_PAGE = 250  # markets接口每页最多250个
+
+# 需要排除的代币符号：衍生代币和稳定币及其变体
+EXCLUDED_SYMBOLS = frozenset([
+    # 衍生代币
+    'BNSOL', 'WSOL', 'STSOL', 'MSOL',
+    'WBTC', 'SBTC', 'HBTC', 'BTCB', 'SOLVBTC',
+    'WETH', 'SETH', 'STETH', 'BETH',
+    # 稳定币及其变体
+    'USDT', 'USDC', 'BUSD', 'DAI', 'TUSD', 'UST', 'USDP', 'USDD', 'GUSD', 'FRAX',
+    'FDUSDT', 'USDE', 'USD0', 'USDB', 'USDX', 'USDJ', 'USDN', 'USDH',
+    'USDK', 'USDL', 'USDM', 'USDR', 'USDS', 'USDY', 'USDV', 'USDW', 'USDZ',
+    'SAI', 'RAI', 'VAI', 'MAI', 'HAI', 'PAI', 'TAI', 'KAI',
+    'SUSD', 'NUSD', 'MUSD', 'LUSD', 'HUSD', 'FUSD', 'EUSD', 'DUSD',
+    'CUSD', 'AUSD', 'RUSD', 'PUSD', 'OUSD', 'IUSD', 'YUSD',
+    'ZUSD', 'XUSD', 'WUSD', 'VUSD', 'QUSD',
+])
+
+# 代币ID中的排除关键词
+EXCLUDED_ID_PATTERN = re.compile(
+    'wrapped|staked|synthetic|leveraged|stable|usd|dollar|peg|fixed|dai|tether|usdt|usdc'
+)
+# 代币符号中的排除关键词
+EXCLUDED_SYMBOL_PATTERN = re.compile('USD|DAI|STABLE')
+# 代币名称中的稳定币关键词
+STABLE_NAME_PATTERN = re.compile('usd|stable|dollar|peg|dai|tether')
+
+
+def is_derivative_token(symbol, id):
+    """判断是否为衍生代币或稳定币"""
+    symbol = symbol.upper()
+    return (
+        symbol in EXCLUDED_SYMBOLS
+        or EXCLUDED_ID_PATTERN.search(id.lower()) is not None
+        or EXCLUDED_SYMBOL_PATTERN.search(symbol) is not None
+    )
+
+
+def filter_coins(markets, size):
+    """
+    按市值顺序筛选有效币种，返回前size个 [(币种ID, 符号)]
+
+    跳过衍生代币、稳定币和名称+符号重复的币种
+    """
+    valid_coins = []
+    unique_tokens = set()
+    for coin in markets:
+        symbol = coin['symbol'].upper()
+        name = coin['name'].lower()
+        token_key = f"{name}_{symbol}"
+        if token_key in unique_tokens or is_derivative_token(symbol, coin['id']):
+            continue
+        if STABLE_NAME_PATTERN.search(name):
+            continue
+        unique_tokens.add(token_key)
+        valid_coins.append((coin['id'], symbol))
+    return valid_coins[:size]
+
+
+def load_cached_universe(size, ttl=UNIVERSE_TTL, path=UNIVERSE_CACHE_FILE):
+    """读取缓存的币种列表，过期或数量不足时返回None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - cached.get('created', 0) > ttl:
+        return None
+    coins = [tuple(coin) for coin in cached.get('coins', [])]
+    # 缓存的是更大范围的列表时，前size个就是所需结果
+    if len(coins) < size and not cached.get('complete'):
+        return None
+    return coins[:size]
+
+
+def save_universe(coins, complete, path=UNIVERSE_CACHE_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'created': time.time(), 'complete': complete, 'coins': coins}, f)
+    os.replace(tmp_path, path)
+
+
+def resolve_universe(size, fetcher, ttl=UNIVERSE_TTL, path=UNIVERSE_CACHE_FILE, refresh=False):
+    """
+    获取市值前size个有效币种 [(币种ID, 符号)]
+
+    优先使用未过期的磁盘缓存；否则通过fetcher（CoinGeckoFetcher，共用其速率限制）
+    分页获取markets，直到筛选出足够的币种
+    """
+    if not refresh:
+        coins = load_cached_universe(size, ttl, path)
+        if coins is not None:
+            print(f"使用缓存的币种列表: {len(coins)} 个有效币种")
+            return coins
+
+    markets = []
+    page = 1
+    complete = False
+    while True:
+        try:
+            coins = fetcher.get('/coins/markets', {
+                'vs_currency': 'usd',
+                'order': 'market_cap_desc',
+                'per_page': PER_PAGE,
+                'page': page,
+            })
+        except Exception as e:
+            print(f"获取币种列表时出错: {str(e)}")
+            break
+        if not coins:  # 如果没有更多数据了
+            complete = True
+            break
+        markets.extend(coins)
+        page += 1
+        if len(filter_coins(markets, size)) >= size:
+            break
+
+    valid_coins = filter_coins(markets, size)
+    print(f"共处理了 {len(markets)} 个币种，获取到 {len(valid_coins)} 个有效币种")
+    if len(valid_coins) >= size or complete:
+        save_universe(valid_coins, complete, path)
+    return valid_coins
@@ -0,0 +1,178 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import requests
+
+from price_cache import split_range
+
+# CoinGecko各套餐的接口地址、每分钟请求上限和API Key请求头
+TIERS = {
+    'free': {
+        'base_url': 'https://api.coingecko.com/api/v3',
+        'rate_per_minute': 30,
+        'key_header': 'x-cg-demo-api-key',
+        'workers': 3,
+    },
+    'pro': {
+        'base_url': 'https://pro-api.coingecko.com/api/v3',
+        'rate_per_minute': 500,
+        'key_header': 'x-cg-pro-api-key',
+        'workers': 12,
+    },
+}
+
+
+class TokenBucket:
+    """线程安全的令牌桶：按固定速率补充令牌，所有工作线程共用"""
+
+    def __init__(self, rate_per_minute, burst=1):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，没有令牌时阻塞等待"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """收到429后暂停所有请求，并清空令牌"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+            self.updated = self.paused_until
+
+
+class CoinGeckoFetcher:
+    """
+    并发获取CoinGecko价格历史
+
+    所有请求先从同一个令牌桶取令牌，少量工作线程并发发送，
+    使请求速率始终贴近套餐上限；遇到429按Retry-After（或指数退避）暂停后重试。
+    base_url: 替换套餐的接口地址，如指向本地回放服务
+    """
+
+    def __init__(self, tier='free', api_key=None, workers=None, rate_per_minute=None, max_retries=5, timeout=30,
+                 base_url=None):
+        if tier not in TIERS:
+            raise ValueError(f"未知的CoinGecko套餐: {tier}")
+        config = TIERS[tier]
+        self.base_url = (base_url or config['base_url']).rstrip('/')
+        self.bucket = TokenBucket(rate_per_minute or config['rate_per_minute'])
+        self.workers = workers or config['workers']
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({'Accept': 'application/json', 'Accept-Encoding': 'gzip, deflate'})
+        if api_key:
+            self.session.headers[config['key_header']] = api_key
+        self.requests = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    def get(self, path, params):
+        """按速率限制发送GET请求，返回JSON"""
+        for attempt in range(self.max_retries):
+            self.bucket.acquire()
+            try:
+                response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                print(f"请求 {path} 出错 (尝试 {attempt + 1}/{self.max_retries}): {str(e)}")
+                time.sleep(2 ** attempt)
+                continue
+            with self.lock:
+                self.requests += 1
+            if response.status_code == 429:
+                retry_after = response.headers.get('Retry-After')
+                wait = float(retry_after) if retry_after and retry_after.isdigit() else 2 ** (attempt + 2)
+                with self.lock:
+                    self.throttled += 1
+                print(f"请求过于频繁(429)，暂停 {wait:.0f} 秒")
+                self.bucket.pause(wait)
+                continue
+            if response.status_code >= 500:
+                time.sleep(2 ** attempt)
+                continue
+            response.raise_for_status()
+            return response.json()
+        raise RuntimeError(f"请求 {path} 失败，已达到最大重试次数")
+
+    def get_market_chart_range(self, coin_id, start_timestamp, end_timestamp):
+        """获取币种在指定时间段（秒级时间戳）的价格数据，返回 [[毫秒时间戳, 价格], ...]"""
+        data = self.get(f"/coins/{coin_id}/market_chart/range", {
+            'vs_currency': 'usd',
+            'from': start_timestamp,
+            'to': end_timestamp,
+        })
+        return data.get('prices', [])
+
+    def fetch_prices(self, coin_ids, start_timestamp, end_timestamp, cache=None):
+        """
+        并发获取多个币种的价格数据
+
+        cache: PriceHistoryCache，提供时只请求缓存未覆盖的区间
+        返回 {币种ID: DataFrame(timestamp, price)}，获取失败或没有数据的币种不在结果中
+        """
+        coin_ids = list(dict.fromkeys(coin_ids))
+        if cache is None:
+            tasks = [(coin_id, start_timestamp, end_timestamp) for coin_id in coin_ids]
+        else:
+            tasks = [
+                (coin_id, lo, hi)
+                for coin_id in coin_ids
+                for gap_start, gap_end in cache.gaps(coin_id, start_timestamp, end_timestamp)
+                for lo, hi in split_range(gap_start, gap_end)
+            ]
+
+        fetched = {}
+        failed = set()
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.get_market_chart_range, *task): task for task in tasks}
+            for done, future in enumerate(as_completed(futures), 1):
+                coin_id, lo, hi = futures[future]
+                try:
+                    prices = future.result()
+                except Exception as e:
+                    print(f"获取 {coin_id} 数据时出错: {str(e)}")
+                    failed.add(coin_id)
+                    continue
+                if cache is not None:
+                    cache.store(coin_id, lo, hi, prices)  # 在主线程写入，同一币种的多段不会并发写文件
+                else:
+                    fetched[coin_id] = prices
+                print(f"已获取 {coin_id} ({done}/{len(tasks)})")
+
+        frames = {}
+        for coin_id in coin_ids:
+            if cache is not None:
+                df = None if coin_id in failed else cache.get(coin_id, start_timestamp, end_timestamp)
+            elif fetched.get(coin_id):
+                df = pd.DataFrame(fetched[coin_id], columns=['timestamp', 'price'])
+                df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+            else:
+                df = None
+            if df is not None:
+                frames[coin_id] = df
+
+        elapsed = time.time() - start
+        minimum = max(len(tasks) - self.bucket.capacity, 0) / self.bucket.rate
+        print(f"获取完成: {len(frames)}/{len(coin_ids)} 个币种，请求 {self.requests} 次，429 {self.throttled} 次，"
+              f"耗时 {elapsed:.1f} 秒（速率限制下最短约 {minimum:.1f} 秒）")
+        return frames
@@ -1,136 +1,37 @@
+import numpy as np
 import pandas as pd
-from pycoingecko import CoinGeckoAPI
 from datetime import datetime, timedelta
-import time
+import os
 import pytz
+from coingecko_fetcher import CoinGeckoFetcher
+from price_cache import PriceHistoryCache, print_stats
+from rebound_kernel import batch_rebound, stack_series
+from coin_universe import resolve_universe
+from report_writer import ReportWriter
 
-def is_derivative_token(symbol, id):
-    """判断是否为衍生代币或稳定币"""
-    # 转换为大写进行比较
-    symbol = symbol.upper()
-    id = id.lower()
-    
-    # 需要排除的代币类型列表
-    exclude_tokens = {
-        # 衍生代币
-        'SOL': ['BNSOL', 'WSOL', 'STSOL', 'MSOL'],
-        'BTC': ['WBTC', 'SBTC', 'HBTC', 'BTCB', 'SOLVBTC'],
-        'ETH': ['WETH', 'SETH', 'STETH', 'BETH'],
-        
-        # 稳定币及其变体
-        'STABLE': [
-            'USDT', 'USDC', 'BUSD', 'DAI', 'TUSD', 'UST', 'USDP', 'USDD', 'GUSD', 'FRAX',
-            'FDUSDT', 'USDE', 'USD0', 'USDB', 'USDX', 'USDD', 'USDJ', 'USDN', 'USDH',
-            'USDK', 'USDL', 'USDM', 'USDR', 'USDS', 'USDY', 'USDV', 'USDW', 'USDZ',
-            'DAI', 'SAI', 'RAI', 'VAI', 'MAI', 'HAI', 'PAI', 'TAI', 'KAI',
-            'SUSD', 'NUSD', 'MUSD', 'LUSD', 'HUSD', 'FUSD', 'EUSD', 'DUSD',
-            'CUSD', 'BUSD', 'AUSD', 'RUSD', 'PUSD', 'OUSD', 'IUSD', 'YUSD',
-            'TUSD', 'ZUSD', 'XUSD', 'WUSD', 'VUSD', 'QUSD'
-        ]
-    }
-    
-    # 检查是否在排除列表中
-    for _, tokens in exclude_tokens.items():
-        if symbol in tokens:
-            return True
-    
-    # 检查代币ID中的关键词
-    exclude_keywords = [
-        'wrapped', 'staked', 'synthetic', 'leveraged',
-        'stable', 'usd', 'dollar', 'peg', 'fixed',
-        'dai', 'tether', 'usdt', 'usdc'
-    ]
-    
-    if any(keyword in id for keyword in exclude_keywords):
-        return True
-        
-    # 检查代币符号是否包含USD或稳定币相关关键词
-    if 'USD' in symbol or 'DAI' in symbol or 'STABLE' in symbol:
-        return True
-        
-    return False
+# CoinGecko套餐：'free' 或 'pro'，API Key从环境变量读取
+COINGECKO_TIER = os.environ.get('COINGECKO_TIER', 'free')
+COINGECKO_API_KEY = os.environ.get('COINGECKO_API_KEY')
+COINGECKO_BASE_URL = os.environ.get('COINGECKO_BASE_URL')  # 替换接口地址，如指向本地回放服务
+FETCH_WORKERS = None  # 并发线程数，None表示使用套餐默认值
+PRICE_CACHE_ENABLED = True  # 缓存价格历史，重复分析时只补取缺失的区间
+UNIVERSE_SIZE = 200  # 分析市值前多少个有效币种
+UNIVERSE_REFRESH = False  # True时忽略缓存，重新获取币种列表
+REBOUND_AFTER_LOW = False  # True时最高点只取最低点之后的价格（低点后反弹）
+REPORT_FORMATS = ('xlsx',)  # 报表格式：'xlsx'、'csv'、'parquet'（需要pyarrow）的任意组合
+XLSX_ENGINE = 'auto'  # 'xlsxwriter'（constant_memory）、'openpyxl'（write-only）或 'auto'
+BTC_ID = 'bitcoin'  # 计算相对倍数的基准币种
 
-def get_coins_until_200_valid():
-    """获取足够数量的非衍生代币，扩展到前200名"""
-    cg = CoinGeckoAPI()
-    valid_coins = []
-    page = 1
-    per_page = 250  # 每页获取更多数据以提高效率
-    processed_count = 0
-    
-    # 用于检测重复币种的集合，基于代币名称和符号
-    unique_tokens = set()
-    
-    while len(valid_coins) < 200:
-        try:
-            coins = cg.get_coins_markets(
-                vs_currency='usd',
-                order='market_cap_desc',
-                per_page=per_page,
-                page=page
-            )
-            
-            if not coins:  # 如果没有更多数据了
-                break
-                
-            for coin in coins:
-                processed_count += 1
-                symbol = coin['symbol'].upper()
-                name = coin['name'].lower()
-                
-                print(f"正在检查第 {processed_count} 个币种: {symbol}")
-                
-                # 更严格的重复检测
-                token_key = f"{name}_{symbol}"
-                if token_key in unique_tokens:
-                    continue
-                
-                if not is_derivative_token(symbol, coin['id']):
-                    # 额外检查名称中是否包含稳定币关键词
-                    stable_keywords = ['usd', 'stable', 'dollar', 'peg', 'dai', 'tether']
-                    if any(keyword in name for keyword in stable_keywords):
-                        continue
-                        
-                    unique_tokens.add(token_key)
-                    
-                    if symbol in ['BTC', 'ETH', 'SOL']:
-                        valid_coins.append((coin['id'], symbol))
-                    elif len(valid_coins) < 200:  # 只有在还没收集够200个时才添加其他币种
-                        valid_coins.append((coin['id'], symbol))
-            
-            page += 1
-            time.sleep(1)  # 轻微延迟，确保不超过API限制
-            
-        except Exception as e:
-            print(f"获取币种列表时出错: {str(e)}")
-            time.sleep(5)  # 出错时等待更长时间
-            continue
-    
-    print(f"共处理了 {processed_count} 个币种，获取到 {len(valid_coins)} 个有效币种")
-    return valid_coins[:200]  # 返回前200个有效币种
-
-def get_coin_data(coin_id, start_timestamp, end_timestamp):
-    """获取币种在指定时间段的价格数据"""
-    cg = CoinGeckoAPI()
-    try:
-        # CoinGecko API要求时间戳为秒
-        prices = cg.get_coin_market_chart_range_by_id(
-            id=coin_id,
-            vs_currency='usd',
-            from_timestamp=start_timestamp,
-            to_timestamp=end_timestamp
-        )
-        
-        if not prices['prices']:
-            return None
-            
-        df = pd.DataFrame(prices['prices'], columns=['timestamp', 'price'])
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        return df
-        
-    except Exception as e:
-        print(f"获取 {coin_id} 数据时出错: {str(e)}")
-        return None
+# 报表列和列宽
+COLUMNS = ['币种', '最低点($)', '最高点($)', '最高点反弹(%)', 'BTC反弹(%)', '相对BTC倍数']
+COLUMN_WIDTHS = {
+    '币种': 10,
+    '最低点($)': 15,
+    '最高点($)': 15,
+    '最高点反弹(%)': 15,
+    'BTC反弹(%)': 15,
+    '相对BTC倍数': 15,
+}
 
 def convert_to_utc(beijing_time_str):
     """将北京时间转换为UTC时间"""
@@ -150,7 +51,7 @@ def get_current_valid_time():
     return valid_start_time, valid_end_time
 
 def calculate_rebound_strength(df, start_time, end_time=None):
-    """计算指定时间范围内的反弹强度"""
+    """计算指定时间范围内的反弹强度（单个币种的参考实现，分析时使用rebound_kernel.batch_rebound）"""
     if df is None or df.empty:
         return None, None, None, None, None, None
     
@@ -205,189 +106,184 @@ def format_price(price):
     formatted = f"{price:.8f}".rstrip('0').rstrip('.')
     return formatted
 
-def analyze_market_rebound(period_start, period_end):
-    """分析指定时间段的市场反弹情况"""
-    start_timestamp = int(period_start.timestamp())
-    end_timestamp = int(period_end.timestamp())
+def rebound_rows(price_data, unique_coins, period_start, period_end, btc_id='bitcoin'):
+    """
+    根据已获取的价格数据计算一个时间区间的反弹结果
+    
+    按相对BTC倍数从高到低逐行生成，供报表流式写出
+    """
+    # 所有币种拼接为一个数组，一次计算最低/最高点、反弹幅度和相对BTC的倍数
+    start_ms = int(period_start.timestamp() * 1000)
+    end_ms = int(period_end.timestamp() * 1000)
+    timestamps, prices, offsets, keys = stack_series(price_data, start_ms, end_ms)
+    if btc_id not in keys:
+        print("BTC数据计算失败，无法计算相对涨幅")
+        return
+    rebounds = batch_rebound(timestamps, prices, offsets, btc_index=keys.index(btc_id))
+    index = {coin_id: i for i, coin_id in enumerate(keys)}
+    
+    rebound_field = 'rebound_after_low' if REBOUND_AFTER_LOW else 'max_rebound'
+    high_field = 'high_after_low' if REBOUND_AFTER_LOW else 'high'
+    relative_field = 'relative_after_low' if REBOUND_AFTER_LOW else 'relative_multiple'
+    btc_max_rebound = round(float(rebounds[index[btc_id]][rebound_field]), 2)
+    
+    # 先在数组上排序，再逐行生成
+    coins = [(index[btc_id if symbol == 'BTC' else coin_id], symbol) for coin_id, symbol in unique_coins
+             if (btc_id if symbol == 'BTC' else coin_id) in index]
+    if not coins:
+        return
+    rows = np.array([i for i, _ in coins])
+    relative = np.round(rebounds[relative_field][rows], 2)
+    for j in np.argsort(-relative, kind='stable'):
+        result = rebounds[rows[j]]
+        yield {
+            '币种': coins[j][1],
+            '最低点($)': format_price(float(result['low'])),
+            '最高点($)': format_price(float(result[high_field])),
+            '最高点反弹(%)': round(float(result[rebound_field]), 2),
+            'BTC反弹(%)': btc_max_rebound,
+            '相对BTC倍数': float(relative[j])
+        }
+
+def rebound_table(price_data, unique_coins, period_start, period_end, btc_id='bitcoin'):
+    """根据已获取的价格数据计算一个时间区间的反弹结果表"""
+    return pd.DataFrame(list(rebound_rows(price_data, unique_coins, period_start, period_end, btc_id)))
+
+def load_price_data(windows):
+    """
+    获取币种列表，并按所有区间的并集一次性获取价格数据
+    
+    windows: [(名称, 开始时间, 结束时间)]，时间为带时区的datetime
+    返回 (价格数据, 去重后的币种列表)，无法获取BTC基准时价格数据为None
+    """
+    union_start = min(start for _, start, _ in windows)
+    union_end = max(end for _, _, end in windows)
+    start_timestamp = int(union_start.timestamp())
+    end_timestamp = int(union_end.timestamp())
     
-    results = []
     print("正在获取币种数据...")
-    coins = get_coins_until_200_valid()  # 使用新函数获取200个币种
+    fetcher = CoinGeckoFetcher(COINGECKO_TIER, api_key=COINGECKO_API_KEY, workers=FETCH_WORKERS,
+                               base_url=COINGECKO_BASE_URL)
+    coins = resolve_universe(UNIVERSE_SIZE, fetcher, refresh=UNIVERSE_REFRESH)
     
     # 创建已处理币种集合，用于去重
     processed_symbols = set()
     total_coins = len(coins)
     print(f"成功获取 {total_coins} 个有效币种")
     
-    # 先获取BTC数据作为基准
-    btc_id = 'bitcoin'
-    btc_df = get_coin_data(btc_id, start_timestamp, end_timestamp)
-    if btc_df is None:
-        print("无法获取BTC数据，无法计算相对涨幅")
-        return pd.DataFrame()
-    
-    btc_result = calculate_rebound_strength(btc_df.copy(), period_start, period_end)
+    # 去重后一次性并发获取所有币种（含BTC基准）的价格数据
+    unique_coins = []
+    for coin_id, symbol in coins:
+        if symbol not in processed_symbols:
+            processed_symbols.add(symbol)
+            unique_coins.append((coin_id, symbol))
     
-    if btc_result[0] is None:
-        print("BTC数据计算失败，无法计算相对涨幅")
-        return pd.DataFrame()
-    
-    btc_max_rebound = btc_result[2]
-    
-    # 优化：预先创建CoinGeckoAPI实例，避免重复创建
-    cg = CoinGeckoAPI()
-    
-    # 处理其他币种
-    request_count = 0
-    start_time = time.time()
+    cache = PriceHistoryCache() if PRICE_CACHE_ENABLED else None
+    price_data = fetcher.fetch_prices([BTC_ID] + [coin_id for coin_id, _ in unique_coins],
+                                      start_timestamp, end_timestamp, cache=cache)
+    if cache is not None:
+        print_stats(cache)
     
-    for idx, (coin_id, symbol) in enumerate(coins, 1):
-        # 跳过重复的币种
-        if symbol in processed_symbols:
-            continue
-        processed_symbols.add(symbol)
-        
-        print(f"正在处理 {symbol}... ({idx}/{total_coins})")
-        
-        try:
-            # 如果是BTC，直接使用已获取的数据
-            if symbol == 'BTC':
-                df = btc_df
-            else:
-                # 控制API请求速度，确保每分钟不超过30次
-                request_count += 1
-                elapsed = time.time() - start_time
-                
-                # 如果接近每分钟30次请求的限制，等待适当时间
-                if request_count >= 30 and elapsed < 60:
-                    wait_time = 60 - elapsed
-                    print(f"接近API限制，等待 {wait_time:.1f} 秒...")
-                    time.sleep(wait_time)
-                    # 重置计数器和时间
-                    request_count = 0
-                    start_time = time.time()
-                
-                # 使用预先创建的API实例
-                try:
-                    prices = cg.get_coin_market_chart_range_by_id(
-                        id=coin_id,
-                        vs_currency='usd',
-                        from_timestamp=start_timestamp,
-                        to_timestamp=end_timestamp
-                    )
-                    
-                    if not prices['prices']:
-                        continue
-                        
-                    df = pd.DataFrame(prices['prices'], columns=['timestamp', 'price'])
-                    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-                except Exception as e:
-                    print(f"获取 {coin_id} 数据时出错: {str(e)}")
-                    continue
-            
-            if df is not None:
-                result = calculate_rebound_strength(df.copy(), period_start, period_end)
-                
-                if result[0] is not None:
-                    # 计算相对BTC涨幅的倍数
-                    if btc_max_rebound > 0:  # 避免除以零或负数
-                        relative_multiple = round(result[2] / btc_max_rebound, 2)
-                    else:
-                        relative_multiple = 0
-                    
-                    results.append({
-                        '币种': symbol,
-                        '最低点($)': format_price(result[0]),
-                        '最高点($)': format_price(result[1]),
-                        '最高点反弹(%)': round(result[2], 2),
-                        'BTC反弹(%)': round(btc_max_rebound, 2),
-                        '相对BTC倍数': relative_multiple
-                    })
-        except Exception as e:
-            print(f"处理 {symbol} 时出错: {str(e)}")
-            continue
-    
-    df_results = pd.DataFrame(results)
-    if not df_results.empty:
-        df_results = df_results.sort_values('相对BTC倍数', ascending=False)
+    if BTC_ID not in price_data:
+        print("无法获取BTC数据，无法计算相对涨幅")
+        return None, unique_coins
+    return price_data, unique_coins
+
+def analyze_market_rebound(windows, period_end=None):
+    """
+    分析多个时间区间的市场反弹情况
     
-    return df_results
+    windows: [(名称, 开始时间, 结束时间)]，所有币种只按区间并集获取一次数据，再分别计算每个区间，
+    返回 {名称: 结果表}；兼容旧的 analyze_market_rebound(开始时间, 结束时间) 调用，返回单个结果表
+    """
+    if period_end is not None:
+        return analyze_period(windows, period_end)
+    price_data, unique_coins = load_price_data(windows)
+    if price_data is None:
+        return {name: pd.DataFrame() for name, _, _ in windows}
+    return {
+        name: rebound_table(price_data, unique_coins, start, end, BTC_ID)
+        for name, start, end in windows
+    }
+
+def analyze_period(period_start, period_end):
+    """分析指定时间段的市场反弹情况"""
+    return analyze_market_rebound([('反弹分析', period_start, period_end)])['反弹分析']
+
+def rolling_windows(end_time, spans):
+    """以end_time为结束时间的滚动区间，spans如 ['24h', '72h', '7d']"""
+    return [(f"最近{span}", end_time - pd.Timedelta(span).to_pytimedelta(), end_time) for span in spans]
+
+def open_report(filename, formats=None, single_sheet=False):
+    """创建流式报表，列宽和条件格式与原Excel报表一致"""
+    return ReportWriter(filename, formats=formats or REPORT_FORMATS, xlsx_engine=XLSX_ENGINE,
+                        column_widths=COLUMN_WIDTHS, highlight_column='相对BTC倍数', single_sheet=single_sheet)
+
+def export_report(windows, price_data, unique_coins, filename, formats=None):
+    """逐个区间计算并逐行写出报表，不构建完整的结果表"""
+    with open_report(filename, formats=formats, single_sheet=len(windows) == 1) as report:
+        for name, start, end in windows:
+            report.add_sheet(name, COLUMNS)
+            for row in rebound_rows(price_data, unique_coins, start, end, BTC_ID):
+                report.write(row)
+    print(f"数据已导出到 {filename}")
 
-def export_to_excel(df, filename):
-    """导出到Excel并设置条件格式"""
+def export_to_excel(sheets, filename):
+    """
+    导出到Excel并设置条件格式
+    
+    sheets: 结果表，或 {工作表名: 结果表}（每个时间区间一个工作表）
+    """
+    if isinstance(sheets, pd.DataFrame):
+        sheets = {'反弹分析': sheets}
     try:
-        # 导入openpyxl的样式模块
-        from openpyxl.styles import PatternFill
-        from openpyxl.formatting.rule import CellIsRule
-        
-        writer = pd.ExcelWriter(filename, engine='openpyxl')
-        df.to_excel(writer, index=False, sheet_name='反弹分析')
-        
-        # 获取工作表
-        workbook = writer.book
-        worksheet = writer.sheets['反弹分析']
-        
-        # 更新列宽以适应新的表头
-        column_widths = {
-            'A': 10,  # 币种
-            'B': 15,  # 最低点
-            'C': 15,  # 最高点
-            'D': 15,  # 最高点反弹
-            'E': 15,  # BTC反弹
-            'F': 15,  # 相对BTC倍数
-        }
-        
-        for col, width in column_widths.items():
-            worksheet.column_dimensions[col].width = width
-        
-        # 定义填充颜色
-        yellow_fill = PatternFill(start_color='FFFF00', end_color='FFFF00', fill_type='solid')
-        red_fill = PatternFill(start_color='FF0000', end_color='FF0000', fill_type='solid')
-        
-        # 获取相对BTC倍数列的位置
-        relative_btc_col = 'F'  # 相对BTC倍数列
-        
-        # 设置条件格式规则
-        # 超过3倍为黄色
-        worksheet.conditional_formatting.add(
-            f'{relative_btc_col}2:{relative_btc_col}{len(df)+1}',
-            CellIsRule(operator='greaterThan', formula=['3'], fill=yellow_fill)
-        )
-        
-        # 超过5倍为红色
-        worksheet.conditional_formatting.add(
-            f'{relative_btc_col}2:{relative_btc_col}{len(df)+1}',
-            CellIsRule(operator='greaterThan', formula=['5'], fill=red_fill)
-        )
-        
-        writer.close()
+        with open_report(filename, formats=('xlsx',)) as report:
+            for name, df in sheets.items():
+                report.add_sheet(name, list(df.columns) or COLUMNS)
+                for row in df.to_dict('records'):
+                    report.write(row)
         print(f"数据已导出到 {filename}")
         
     except Exception as e:
         print(f"导出Excel时出错: {str(e)}")
-        csv_filename = filename.replace('.xlsx', '.csv')
-        df.to_csv(csv_filename, index=False)
-        print(f"已将数据导出为CSV格式: {csv_filename}")
+        for name, df in sheets.items():
+            suffix = '' if len(sheets) == 1 else f'_{name}'
+            csv_filename = filename.replace('.xlsx', f'{suffix}.csv')
+            df.to_csv(csv_filename, index=False)
+            print(f"已将数据导出为CSV格式: {csv_filename}")
 
 def main():
-    # 定义时间区间
-    period_start_bj = '2025-03-19 00:00:00'  # 区间开始时间
-    period_end_bj = '2025-04-01 08:30:00'    # 区间结束时间
+    # 定义时间区间（北京时间）：(名称, 开始时间, 结束时间)，可以同时分析多个区间
+    windows_bj = [
+        ('反弹分析', '2025-03-19 00:00:00', '2025-04-01 08:30:00'),
+    ]
+    # 额外分析以某个时间为结束的滚动区间，如 ['24h', '72h', '7d']
+    rolling_spans = []
+    rolling_end_bj = '2025-04-01 08:30:00'
     
     # 转换为UTC时间
-    period_start_utc = convert_to_utc(period_start_bj)
-    period_end_utc = convert_to_utc(period_end_bj)
+    windows = [(name, convert_to_utc(start), convert_to_utc(end)) for name, start, end in windows_bj]
+    if rolling_spans:
+        windows += rolling_windows(convert_to_utc(rolling_end_bj), rolling_spans)
     
-    print(f"分析时间区间: {period_start_bj} 到 {period_end_bj} (北京时间)")
+    for name, start, end in windows:
+        print(f"分析时间区间 {name}: {start.astimezone(pytz.timezone('Asia/Shanghai')):%Y-%m-%d %H:%M:%S} 到 "
+              f"{end.astimezone(pytz.timezone('Asia/Shanghai')):%Y-%m-%d %H:%M:%S} (北京时间)")
     
     print("开始获取数据...")
-    results_df = analyze_market_rebound(period_start_utc, period_end_utc)
+    price_data, unique_coins = load_price_data(windows)
+    if price_data is None:
+        price_data = {}  # 没有BTC基准时仍写出空的工作表，输出文件照常生成
     
-    # 导出结果
+    # 导出结果：每个区间一个工作表，逐行写出
     current_time = datetime.now()
     filename = f'加密货币反弹分析_{current_time.strftime("%Y%m%d_%H%M%S")}.xlsx'
-    export_to_excel(results_df, filename)
+    try:
+        export_report(windows, price_data, unique_coins, filename)
+    except Exception as e:
+        print(f"导出报表时出错: {str(e)}，改为导出CSV")
+        export_report(windows, price_data, unique_coins, filename.replace('.xlsx', '.csv'), formats=('csv',))
     print("分析完成！")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
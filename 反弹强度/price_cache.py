@@ -0,0 +1,164 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'price_cache')
+FRESH_SECONDS = 3600  # 最近一小时的数据可能还会变化，不计入已覆盖区间
+MIN_FETCH_SECONDS = 2 * 86400  # 单次请求的最短区间：CoinGecko对1天以内的区间返回5分钟粒度，补取时统一扩到小时粒度
+MAX_FETCH_SECONDS = 90 * 86400  # 单次请求的最长区间：超过90天CoinGecko返回日线粒度
+
+
+def merge_ranges(ranges):
+    """合并重叠或相邻的区间，返回按起点排序的 (n, 2) 数组"""
+    if len(ranges) == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    ranges = np.asarray(sorted(map(tuple, ranges)), dtype=np.int64)
+    merged = [list(ranges[0])]
+    for lo, hi in ranges[1:]:
+        if lo <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return np.asarray(merged, dtype=np.int64)
+
+
+def split_range(start, end, max_span=MAX_FETCH_SECONDS, min_span=MIN_FETCH_SECONDS):
+    """把需要补取的区间拆成单次请求，每段不超过max_span，过短的区间向前扩到min_span"""
+    pieces = []
+    while start <= end:
+        piece_end = min(start + max_span - 1, end)
+        pieces.append((min(start, piece_end - min_span), piece_end))
+        start = piece_end + 1
+    return pieces
+
+
+class PriceHistoryCache:
+    """
+    CoinGecko价格历史的本地缓存
+
+    每个币种一个 .npz 文件，按列保存 timestamp(毫秒)/price 两个数组，
+    以及已覆盖的时间区间（秒）。再次请求时只补取未覆盖的部分。
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.hits = 0      # 完全命中的币种数
+        self.partial = 0   # 需要补取部分区间的币种数
+        self.misses = 0    # 没有缓存的币种数
+
+    def path(self, coin_id):
+        return os.path.join(self.root, f"{coin_id}.npz")
+
+    def load(self, coin_id):
+        """读取缓存，返回 (timestamp, price, ranges)，不存在时为空数组"""
+        path = self.path(coin_id)
+        if os.path.exists(path):
+            try:
+                with np.load(path) as data:
+                    return data['timestamp'], data['price'], data['ranges']
+            except (ValueError, OSError, KeyError):
+                pass  # 文件损坏时当作未缓存
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty((0, 2), dtype=np.int64)
+
+    def save(self, coin_id, timestamp, price, ranges):
+        path = self.path(coin_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, timestamp=timestamp, price=price, ranges=ranges)
+        os.replace(tmp_path, path)
+
+    def gaps(self, coin_id, start, end):
+        """返回 [start, end]（秒）中未被缓存覆盖的区间，并记录命中统计"""
+        _, _, ranges = self.load(coin_id)
+        gaps = []
+        cursor = start
+        for lo, hi in ranges:
+            if hi < cursor:
+                continue
+            if lo > end:
+                break
+            if lo > cursor:
+                gaps.append((cursor, lo - 1))
+            cursor = max(cursor, hi + 1)
+        if cursor <= end:
+            gaps.append((cursor, end))
+
+        if not gaps:
+            self.hits += 1
+        elif len(ranges):
+            self.partial += 1
+        else:
+            self.misses += 1
+        return gaps
+
+    def store(self, coin_id, start, end, prices):
+        """
+        写入一段新获取的数据
+
+        prices: CoinGecko返回的 [[毫秒时间戳, 价格], ...]，对应请求区间 [start, end]（秒）
+        """
+        timestamp, price, ranges = self.load(coin_id)
+        new = np.asarray(prices, dtype=np.float64).reshape(-1, 2)
+        # 区间内的旧数据（包括之前未定型的最新数据）整体替换为新数据
+        keep = (timestamp < start * 1000) | (timestamp > end * 1000)
+        timestamp = np.concatenate([timestamp[keep], new[:, 0].astype(np.int64)])
+        price = np.concatenate([price[keep], new[:, 1]])
+        order = np.argsort(timestamp, kind='stable')
+        timestamp, price = timestamp[order], price[order]
+
+        covered_end = min(end, int(time.time()) - FRESH_SECONDS)
+        if covered_end >= start:
+            ranges = merge_ranges(list(map(tuple, ranges)) + [(start, covered_end)])
+        self.save(coin_id, timestamp, price, ranges)
+
+    def get(self, coin_id, start, end):
+        """读取 [start, end]（秒）内的价格，返回DataFrame(timestamp, price)，没有数据时返回None"""
+        timestamp, price, _ = self.load(coin_id)
+        lo = np.searchsorted(timestamp, start * 1000, side='left')
+        hi = np.searchsorted(timestamp, end * 1000, side='right')
+        if hi <= lo:
+            return None
+        return pd.DataFrame({
+            'timestamp': pd.to_datetime(timestamp[lo:hi], unit='ms'),
+            'price': price[lo:hi],
+        })
+
+    def stats(self):
+        """缓存统计：币种数、数据点数、覆盖天数、占用空间、本次运行的命中情况"""
+        files = [name for name in os.listdir(self.root) if name.endswith('.npz')]
+        points, covered = 0, 0
+        for name in files:
+            timestamp, _, ranges = self.load(name[:-4])
+            points += len(timestamp)
+            covered += int((ranges[:, 1] - ranges[:, 0] + 1).sum()) if len(ranges) else 0
+        return {
+            'coins': len(files),
+            'points': points,
+            'covered_days': covered / 86400,
+            'size_bytes': sum(os.path.getsize(os.path.join(self.root, name)) for name in files),
+            'hits': self.hits,
+            'partial': self.partial,
+            'misses': self.misses,
+        }
+
+
+def print_stats(cache):
+    stats = cache.stats()
+    print(f"价格缓存: {stats['coins']} 个币种，{stats['points']} 个数据点，"
+          f"平均覆盖 {stats['covered_days'] / max(stats['coins'], 1):.1f} 天，"
+          f"占用 {stats['size_bytes'] / 1024 / 1024:.2f} MB；"
+          f"本次完全命中 {stats['hits']}，部分命中 {stats['partial']}，未命中 {stats['misses']}")
+
+
+def main():
+    """命令行: python price_cache.py [缓存目录]，打印缓存覆盖情况和大小"""
+    cache = PriceHistoryCache(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CACHE_DIR)
+    print_stats(cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import numpy as np
+
+# 每个币种的计算结果
+REBOUND_DTYPE = np.dtype([
+    ('low', 'f8'),                  # 区间最低价
+    ('high', 'f8'),                 # 区间最高价
+    ('last', 'f8'),                 # 区间最后价格
+    ('low_time', 'i8'),             # 最低价首次出现的时间（毫秒）
+    ('high_time', 'i8'),            # 最高价首次出现的时间（毫秒）
+    ('max_rebound', 'f8'),          # (最高-最低)/最低 * 100
+    ('current_rebound', 'f8'),      # (最后-最低)/最低 * 100
+    ('high_after_low', 'f8'),       # 最低点之后（含）的最高价
+    ('high_after_low_time', 'i8'),
+    ('rebound_after_low', 'f8'),    # (最低点之后的最高-最低)/最低 * 100
+    ('relative_multiple', 'f8'),    # 最高点反弹相对BTC的倍数
+    ('relative_after_low', 'f8'),   # 低点后反弹相对BTC的倍数
+])
+
+
+def stack_series(frames, start_ms, end_ms):
+    """
+    把多个币种的价格序列截取到 [start_ms, end_ms] 后首尾相接
+
+    frames: {币种ID: DataFrame(timestamp, price)}，timestamp为不带时区的UTC时间且已排序
+    返回 (timestamps毫秒, prices, offsets, 币种ID列表)，第i个币种为 [offsets[i], offsets[i+1])
+    NaN/inf价格会被丢弃（与pandas的min/max一致），否则会经reduceat传播到整段结果
+    """
+    ts_parts, price_parts, keys = [], [], []
+    for coin_id, df in frames.items():
+        if df is None or df.empty:
+            continue
+        ts = df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+        lo = np.searchsorted(ts, start_ms, side='left')
+        hi = np.searchsorted(ts, end_ms, side='right')
+        ts, price = ts[lo:hi], df['price'].to_numpy(dtype=np.float64)[lo:hi]
+        finite = np.isfinite(price)
+        if not finite.any():
+            continue
+        if not finite.all():
+            ts, price = ts[finite], price[finite]
+        ts_parts.append(ts)
+        price_parts.append(price)
+        keys.append(coin_id)
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum([len(part) for part in ts_parts], out=offsets[1:])
+    if not keys:
+        return np.empty(0, dtype=np.int64), np.empty(0), offsets, keys
+    return np.concatenate(ts_parts), np.concatenate(price_parts), offsets, keys
+
+
+def first_match(mask, starts):
+    """每段中第一个为True的位置（调用方保证每段至少有一个）"""
+    hits = np.flatnonzero(mask)
+    return hits[np.searchsorted(hits, starts)]
+
+
+def batch_rebound(timestamps, prices, offsets, btc_index=None):
+    """
+    一次计算所有币种的反弹强度
+
+    timestamps, prices: 所有币种首尾相接的一维数组；offsets: 段偏移，每段不能为空
+    btc_index: BTC在段中的序号，提供时计算相对BTC的倍数（BTC反弹不大于0时为0）
+    返回长度为币种数的REBOUND_DTYPE结构化数组
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    starts, ends = offsets[:-1], offsets[1:]
+    lengths = ends - starts
+    if (lengths <= 0).any():
+        raise ValueError("每个币种至少需要一个价格")
+    result = np.zeros(len(starts), dtype=REBOUND_DTYPE)
+    if len(starts) == 0:
+        return result
+
+    low = np.minimum.reduceat(prices, starts)
+    high = np.maximum.reduceat(prices, starts)
+    low_pos = first_match(prices == np.repeat(low, lengths), starts)
+    high_pos = first_match(prices == np.repeat(high, lengths), starts)
+
+    # 低点之后的最高价：低点之前的价格屏蔽为 -inf 后再取每段最大值
+    after_low = np.arange(len(prices)) >= np.repeat(low_pos, lengths)
+    masked = np.where(after_low, prices, -np.inf)
+    high_after = np.maximum.reduceat(masked, starts)
+    high_after_pos = first_match(after_low & (prices == np.repeat(high_after, lengths)), starts)
+
+    result['low'] = low
+    result['high'] = high
+    result['last'] = prices[ends - 1]
+    result['low_time'] = timestamps[low_pos]
+    result['high_time'] = timestamps[high_pos]
+    result['high_after_low'] = high_after
+    result['high_after_low_time'] = timestamps[high_after_pos]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result['max_rebound'] = (high - low) / low * 100
+        result['current_rebound'] = (result['last'] - low) / low * 100
+        result['rebound_after_low'] = (high_after - low) / low * 100
+
+    if btc_index is not None:
+        for field, base_field in (('relative_multiple', 'max_rebound'), ('relative_after_low', 'rebound_after_low')):
+            base = result[base_field][btc_index]
+            result[field] = result[base_field] / base if base > 0 else 0
+    return result
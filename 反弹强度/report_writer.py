@@ -0,0 +1,251 @@
+import csv
+import os
+import re
+
+try:
+    import xlsxwriter  # 可选：constant_memory模式写xlsx
+except ImportError:
+    xlsxwriter = None
+
+try:
+    import pyarrow as pa  # 可选：输出Parquet
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+PARQUET_BATCH_ROWS = 1000  # Parquet每积累多少行写出一个row group
+
+# 相对BTC倍数的高亮规则：(大于该值, 填充颜色)，顺序同原报表
+HIGHLIGHT_RULES = ((3, 'FFFF00'), (5, 'FF0000'))
+
+
+def sheet_name(name, used):
+    """Excel工作表名：去掉非法字符，最长31个字符，重名时加序号"""
+    name = re.sub(r'[\[\]:*?/\\]', '-', str(name))[:31] or 'Sheet'
+    candidate, n = name, 2
+    while candidate in used:
+        suffix = f"_{n}"
+        candidate = name[:31 - len(suffix)] + suffix
+        n += 1
+    used.add(candidate)
+    return candidate
+
+
+def column_letter(index):
+    """从0开始的列序号 -> Excel列名"""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+class XlsxWriterBackend:
+    """xlsxwriter constant_memory模式：每写一行就刷到临时文件，内存占用不随行数增长；NaN/inf写成Excel错误值"""
+
+    def __init__(self, filename):
+        self.workbook = xlsxwriter.Workbook(filename, {'constant_memory': True, 'nan_inf_to_errors': True})
+        self.fills = {color: self.workbook.add_format({'bg_color': f'#{color}'}) for _, color in HIGHLIGHT_RULES}
+
+    def add_sheet(self, name, columns, widths):
+        worksheet = self.workbook.add_worksheet(name)
+        for i, width in enumerate(widths):
+            worksheet.set_column(i, i, width)
+        worksheet.write_row(0, 0, columns)
+        return worksheet
+
+    def write(self, worksheet, row_index, values):
+        worksheet.write_row(row_index, 0, values)
+
+    def finish_sheet(self, worksheet, highlight_col, rows):
+        if highlight_col is None or rows == 0:
+            return
+        for threshold, color in HIGHLIGHT_RULES:
+            worksheet.conditional_format(1, highlight_col, rows, highlight_col, {
+                'type': 'cell', 'criteria': '>', 'value': threshold, 'format': self.fills[color]
+            })
+
+    def close(self):
+        self.workbook.close()
+
+
+class OpenpyxlBackend:
+    """openpyxl write-only模式：行直接序列化，不在内存中保留单元格对象"""
+
+    def __init__(self, filename):
+        from openpyxl import Workbook
+        self.filename = filename
+        self.workbook = Workbook(write_only=True)
+
+    def add_sheet(self, name, columns, widths):
+        worksheet = self.workbook.create_sheet(name)
+        for i, width in enumerate(widths):
+            worksheet.column_dimensions[column_letter(i)].width = width
+        worksheet.append(columns)
+        return worksheet
+
+    def write(self, worksheet, row_index, values):
+        worksheet.append(values)
+
+    def finish_sheet(self, worksheet, highlight_col, rows):
+        if highlight_col is None or rows == 0:
+            return
+        from openpyxl.formatting.rule import CellIsRule
+        from openpyxl.styles import PatternFill
+        col = column_letter(highlight_col)
+        for threshold, color in HIGHLIGHT_RULES:
+            fill = PatternFill(start_color=color, end_color=color, fill_type='solid')
+            worksheet.conditional_formatting.add(
+                f'{col}2:{col}{rows + 1}',
+                CellIsRule(operator='greaterThan', formula=[str(threshold)], fill=fill)
+            )
+
+    def close(self):
+        self.workbook.save(self.filename)
+
+
+class CsvBackend:
+    """每个工作表一个CSV文件，逐行写入"""
+
+    def __init__(self, base, single):
+        self.base = base
+        self.single = single
+        self.files = []
+
+    def add_sheet(self, name, columns, widths):
+        path = f"{self.base}.csv" if self.single else f"{self.base}_{name}.csv"
+        f = open(path, 'w', newline='', encoding='utf-8-sig')
+        self.files.append((path, f))
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        return writer
+
+    def write(self, writer, row_index, values):
+        writer.writerow(values)
+
+    def finish_sheet(self, writer, highlight_col, rows):
+        pass
+
+    def close(self):
+        for _, f in self.files:
+            f.close()
+
+
+class ParquetBackend:
+    """每个工作表一个Parquet文件，每PARQUET_BATCH_ROWS行写一个row group"""
+
+    def __init__(self, base, single):
+        self.base = base
+        self.single = single
+        self.sheets = []
+
+    def add_sheet(self, name, columns, widths):
+        path = f"{self.base}.parquet" if self.single else f"{self.base}_{name}.parquet"
+        sheet = {'path': path, 'columns': columns, 'rows': [], 'writer': None}
+        self.sheets.append(sheet)
+        return sheet
+
+    def write(self, sheet, row_index, values):
+        sheet['rows'].append(values)
+        if len(sheet['rows']) >= PARQUET_BATCH_ROWS:
+            self._flush(sheet)
+
+    def _flush(self, sheet):
+        if not sheet['rows']:
+            return
+        data = {column: [row[i] for row in sheet['rows']] for i, column in enumerate(sheet['columns'])}
+        if sheet['writer'] is None:
+            table = pa.table(data)
+            sheet['writer'] = pq.ParquetWriter(sheet['path'], table.schema)
+        else:
+            table = pa.table(data, schema=sheet['writer'].schema)
+        sheet['writer'].write_table(table)
+        sheet['rows'] = []
+
+    def finish_sheet(self, sheet, highlight_col, rows):
+        self._flush(sheet)
+
+    def close(self):
+        for sheet in self.sheets:
+            self._flush(sheet)
+            if sheet['writer'] is not None:
+                sheet['writer'].close()
+
+
+class ReportWriter:
+    """
+    流式报表：结果逐行写出，不在内存中构建完整的结果表
+
+    formats: 'xlsx'、'csv'、'parquet' 的任意组合
+    xlsx_engine: 'xlsxwriter'（constant_memory）、'openpyxl'（write-only）或 'auto'（优先xlsxwriter）
+    用法:
+        with ReportWriter('报表.xlsx', column_widths=..., highlight_column='相对BTC倍数') as report:
+            report.add_sheet('区间1', columns)
+            for row in rows:
+                report.write(row)
+    """
+
+    def __init__(self, filename, formats=('xlsx',), xlsx_engine='auto', column_widths=None,
+                 highlight_column=None, single_sheet=False):
+        self.filename = filename
+        self.column_widths = column_widths or {}
+        self.highlight_column = highlight_column
+        self.backends = []
+        self.used_names = set()
+        self.current = None
+        base = os.path.splitext(filename)[0]
+
+        if 'xlsx' in formats:
+            if xlsx_engine == 'xlsxwriter' or (xlsx_engine == 'auto' and xlsxwriter is not None):
+                if xlsxwriter is None:
+                    raise RuntimeError("未安装xlsxwriter")
+                self.backends.append(XlsxWriterBackend(filename))
+            else:
+                self.backends.append(OpenpyxlBackend(filename))
+        if 'csv' in formats:
+            self.backends.append(CsvBackend(base, single_sheet))
+        if 'parquet' in formats:
+            if pa is None:
+                print("未安装pyarrow，跳过Parquet输出")
+            else:
+                self.backends.append(ParquetBackend(base, single_sheet))
+
+    def add_sheet(self, name, columns):
+        """结束上一个工作表，开始写新的工作表"""
+        self._finish_sheet()
+        name = sheet_name(name, self.used_names)
+        widths = [self.column_widths.get(column, 10) for column in columns]
+        handles = [backend.add_sheet(name, columns, widths) for backend in self.backends]
+        highlight = columns.index(self.highlight_column) if self.highlight_column in columns else None
+        self.current = {'name': name, 'columns': columns, 'handles': handles, 'rows': 0, 'highlight': highlight}
+        return name
+
+    def write(self, row):
+        """写一行，row为 {列名: 值}"""
+        sheet = self.current
+        values = [row.get(column) for column in sheet['columns']]
+        sheet['rows'] += 1
+        for backend, handle in zip(self.backends, sheet['handles']):
+            backend.write(handle, sheet['rows'], values)
+
+    def _finish_sheet(self):
+        sheet = self.current
+        if sheet is None:
+            return
+        for backend, handle in zip(self.backends, sheet['handles']):
+            backend.finish_sheet(handle, sheet['highlight'], sheet['rows'])
+        self.current = None
+
+    def close(self):
+        self._finish_sheet()
+        for backend in self.backends:
+            backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from market_rebound import calculate_rebound_strength
+from rebound_kernel import batch_rebound, stack_series
+
+START = pd.Timestamp('2025-03-19 00:00:00')
+END = pd.Timestamp('2025-03-25 00:00:00')
+
+
+def frame(prices, start='2025-03-18 20:00:00'):
+    return pd.DataFrame({
+        'timestamp': pd.date_range(start, periods=len(prices), freq='h'),
+        'price': np.asarray(prices, dtype=np.float64),
+    })
+
+
+def make_frames():
+    rng = np.random.default_rng(0)
+    n = 24 * 8
+    frames = {
+        'bitcoin': frame(100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))),
+        'normal': frame(5 * np.exp(np.cumsum(rng.normal(0, 0.03, n)))),
+        'ties': frame(np.round(rng.uniform(1, 3, n), 1)),  # 最低/最高价多次出现
+        'flat': frame(np.full(n, 2.5)),
+        'short': frame([3.0], start='2025-03-20 00:00:00'),
+    }
+    # 先涨后跌，最低点是区间内最后一个价格（之后的数据在区间外）
+    prices = np.concatenate([np.linspace(4, 12, 60), np.linspace(11, 0.5, 61), [0.1, 20.0]])
+    frames['low_last'] = frame(prices, start='2025-03-20 00:00:00')
+    return frames
+
+
+def run_kernel(frames, btc='bitcoin'):
+    start_ms = int(START.tz_localize('UTC').timestamp() * 1000)
+    end_ms = int(END.tz_localize('UTC').timestamp() * 1000)
+    timestamps, prices, offsets, keys = stack_series(frames, start_ms, end_ms)
+    return dict(zip(keys, batch_rebound(timestamps, prices, offsets, btc_index=keys.index(btc))))
+
+
+def test_batch_rebound_matches_reference():
+    frames = make_frames()
+    results = run_kernel(frames)
+    assert set(results) == set(frames)
+    for coin_id, df in frames.items():
+        low, high, max_rebound, current_rebound, low_time, high_time = \
+            calculate_rebound_strength(df.copy(), START, END)
+        result = results[coin_id]
+        assert result['low'] == low
+        assert result['high'] == high
+        assert result['max_rebound'] == pytest.approx(max_rebound)
+        assert result['current_rebound'] == pytest.approx(current_rebound)
+        assert result['low_time'] == low_time.value // 10 ** 6
+        assert result['high_time'] == high_time.value // 10 ** 6
+
+
+def test_low_at_last_point_and_flat_series():
+    results = run_kernel(make_frames())
+    low_last = results['low_last']
+    assert low_last['last'] == low_last['low']
+    assert low_last['current_rebound'] == 0
+    assert low_last['high_after_low'] == low_last['low']  # 低点之后只有低点本身
+    assert low_last['rebound_after_low'] == 0
+    assert low_last['high_after_low_time'] == low_last['low_time']
+    flat = results['flat']
+    assert flat['max_rebound'] == 0 and flat['rebound_after_low'] == 0
+    assert flat['low_time'] == flat['high_time']
+
+
+def test_high_after_low_matches_pandas():
+    frames = make_frames()
+    results = run_kernel(frames)
+    for coin_id, df in frames.items():
+        window = df[(df['timestamp'] >= START) & (df['timestamp'] <= END)]
+        after = window.loc[window['price'].idxmin():]
+        assert results[coin_id]['high_after_low'] == after['price'].max()
+
+
+def test_relative_to_btc():
+    frames = make_frames()
+    results = run_kernel(frames)
+    btc_rebound = results['bitcoin']['max_rebound']
+    for result in results.values():
+        assert result['relative_multiple'] == pytest.approx(result['max_rebound'] / btc_rebound)
+        assert result['relative_after_low'] == pytest.approx(
+            result['rebound_after_low'] / results['bitcoin']['rebound_after_low'])
+    assert results['bitcoin']['relative_multiple'] == pytest.approx(1)
+
+    # 基准没有反弹时相对倍数为0
+    flat_base = run_kernel(frames, btc='flat')
+    assert all(result['relative_multiple'] == 0 for result in flat_base.values())
+
+
+def test_nan_prices_are_skipped():
+    frames = {
+        'bitcoin': frame([1.0, np.nan, 2.0], start='2025-03-20 00:00:00'),
+        'next': frame([5.0, 4.0, 6.0], start='2025-03-20 00:00:00'),
+        'all_nan': frame([np.nan, np.nan], start='2025-03-20 00:00:00'),
+    }
+    results = run_kernel(frames)
+    assert set(results) == {'bitcoin', 'next'}
+    for coin_id in results:
+        low, high, max_rebound, current_rebound, low_time, high_time = \
+            calculate_rebound_strength(frames[coin_id].copy(), START, END)
+        result = results[coin_id]
+        assert (result['low'], result['high']) == (low, high)
+        assert result['max_rebound'] == pytest.approx(max_rebound)
+        assert result['current_rebound'] == pytest.approx(current_rebound)
+        assert result['low_time'] == low_time.value // 10 ** 6
+        assert result['high_time'] == high_time.value // 10 ** 6
+
+
+def test_empty_segment_is_rejected():
+    with pytest.raises(ValueError):
+        batch_rebound(np.arange(3), np.ones(3), np.array([0, 0, 3]))